@@ -0,0 +1,81 @@
+"""In-process and on-disk cache of aggregation results, keyed on the content hash of their inputs"""
+
+import glob
+import hashlib
+import json
+import os
+from typing import Callable
+
+CACHE_DIR = "Data/.cache"
+# results kept on disk for each cached name, the least recently written are removed first
+MAX_ENTRIES = 8
+
+_memory = {}
+
+
+def content_hash(paths: list[str], *extra) -> str:
+    """SHA-256 of the content of the given files and of any extra JSON serializable parameters"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    digest.update(json.dumps(extra, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def stat_hash(paths: list[str], *extra) -> str:
+    """SHA-256 of the path, size and modification time of the given files and of any extra parameters.
+
+    Does not read the files, for inputs too large to hash on every lookup that are only ever rewritten whole.
+    """
+    stats = []
+    for path in paths:
+        stat = os.stat(path)
+        stats.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha256(
+        json.dumps([stats, extra], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def evict(name: str, cache_dir: str = CACHE_DIR, keep: int = MAX_ENTRIES) -> None:
+    """Remove the oldest results of a cached name beyond the keep most recent ones"""
+    # the key is the name and 16 hex digits, longer names sharing the prefix are not ours
+    paths = sorted(
+        glob.glob(
+            os.path.join(cache_dir, f"{glob.escape(name)}_{"[0-9a-f]" * 16}.json")
+        ),
+        key=os.path.getmtime,
+        reverse=True,
+    )
+    for path in paths[keep:]:
+        key = os.path.basename(path)[: -len(".json")]
+        _memory.pop(key, None)
+        os.remove(path)
+
+
+def cached(
+    name: str,
+    input_paths: list[str],
+    compute: Callable[[], dict],
+    *params,
+    cache_dir: str = CACHE_DIR,
+    fingerprint: Callable[..., str] = content_hash,
+) -> dict:
+    """Return compute() from memory or disk if the inputs did not change, otherwise compute and store it"""
+    key = f"{name}_{fingerprint(input_paths, name, *params)[:16]}"
+    if key in _memory:
+        return _memory[key]
+
+    cache_path = os.path.join(cache_dir, f"{key}.json")
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            result = json.load(f)
+    else:
+        result = compute()
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump(result, f)
+        evict(name, cache_dir)
+    _memory[key] = result
+    return result
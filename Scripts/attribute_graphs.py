@@ -1,5 +1,7 @@
-import matplotlib.pyplot as plt
-import json
+from matplotlib.figure import Figure
+
+from rendering import FigureJob, render, render_all
+from records import load_records
 
 CONVERSATIONAL_AGENTS_KEYWORDS = [
     "assistant",
@@ -148,15 +150,14 @@ CATEGORY_KEYWORDS = {
 }
 
 
-def category_llm_proportion_graph(data_path: str, language: str):
-    """Compute proportions of GitHub repos per LLM usage category and plot a bar chart with unclassified repos"""
+def category_llm_proportion_job(data_path: str, language: str) -> FigureJob:
+    """Compute proportions of GitHub repos per LLM usage category, including unclassified repos"""
     category_counts = {cat: 0 for cat in CATEGORY_KEYWORDS.keys()}
     total_repos = 0
     unclassified_count = 0
 
     # Load repo metadata
-    with open(data_path, "r") as f:
-        data_dicts = json.load(f)
+    data_dicts = load_records(data_path)
 
     total_repos = len(data_dicts)
 
@@ -164,9 +165,9 @@ def category_llm_proportion_graph(data_path: str, language: str):
     for repo in data_dicts:
         repo_text = " ".join(
             [
-                (repo.get("name") or "").lower(),
-                (repo.get("description") or "").lower(),
-                " ".join(repo.get("topics") or []).lower(),
+                (repo.name or "").lower(),
+                (repo.description or "").lower(),
+                " ".join(repo.topics or []).lower(),
             ]
         )
         matched = False
@@ -183,19 +184,32 @@ def category_llm_proportion_graph(data_path: str, language: str):
     categories.append("Unclassified")
     proportions.append(unclassified_count / total_repos)
 
+    return FigureJob(
+        draw_category_llm_proportion,
+        {"language": language, "categories": categories, "proportions": proportions},
+        f"../Figures/{language.lower()}_llm_category_proportions.png",
+    )
+
+
+def draw_category_llm_proportion(
+    language: str, categories: list[str], proportions: list[float]
+) -> Figure:
     # Plot bar chart
-    plt.figure(figsize=(12, 6))
-    bars = plt.bar(categories, proportions, color="skyblue")
-    plt.xlabel("LLM Usage Category")
-    plt.ylabel("Proportion of Repositories")
-    plt.title(
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    bars = ax.bar(categories, proportions, color="skyblue")
+    ax.set_xlabel("LLM Usage Category")
+    ax.set_ylabel("Proportion of Repositories")
+    ax.set_title(
         f"Proportion of LLM-Related GitHub Repositories by Category in {language}"
     )
-    plt.xticks(rotation=45, ha="right")
+    ax.tick_params(axis="x", labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment("right")
 
     # Annotate bars
     for bar, prop in zip(bars, proportions):
-        plt.text(
+        ax.text(
             bar.get_x() + bar.get_width() / 2,
             bar.get_height(),
             f"{prop:.2f}",
@@ -203,13 +217,21 @@ def category_llm_proportion_graph(data_path: str, language: str):
             va="bottom",
         )
 
-    plt.ylim(0, 1)
-    plt.tight_layout()
-    plt.savefig(f"../Figures/{language.lower()}_llm_category_proportions.png")
-    plt.close()
+    ax.set_ylim(0, 1)
+    fig.tight_layout()
+    return fig
+
+
+def category_llm_proportion_graph(data_path: str, language: str):
+    """Compute proportions of GitHub repos per LLM usage category and plot a bar chart with unclassified repos"""
+    render(category_llm_proportion_job(data_path, language))
 
 
 if __name__ == "__main__":
-    category_llm_proportion_graph("Data/sampled_repo_python.json", "python")
-    category_llm_proportion_graph("Data/sampled_repo_go.json", "go")
-    category_llm_proportion_graph("Data/sampled_repo_java.json", "java")
+    render_all(
+        [
+            category_llm_proportion_job("Data/sampled_repo_python.json", "python"),
+            category_llm_proportion_job("Data/sampled_repo_go.json", "go"),
+            category_llm_proportion_job("Data/sampled_repo_java.json", "java"),
+        ]
+    )
@@ -1,10 +1,14 @@
 import json
 import os
 import time
-import requests
 import random
 
-REPOSITORY_URL = "https://api.github.com/repos"
+from github_metrics import METRICS
+from records import RepoMetadata, dump_records
+from snapshot_store import record_crawl
+
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+REPOSITORY_URL = f"{GITHUB_API_URL}/repos"
 HEADERS = {
     "Accept": "application/vnd.github+json",
     "Authorization": f"Bearer {os.getenv('GITHUB_TOKEN')}",
@@ -14,7 +18,7 @@ HEADERS = {
 def github_get(url, headers):
     """GET request to GitHub with intelligent rate limit handling."""
     while True:
-        response = requests.get(url, headers=headers)
+        response = METRICS.get("repos", url, headers=headers)
         if response.status_code == 401:
             raise Exception(
                 "Unauthorized: Check your GITHUB_TOKEN environment variable."
@@ -25,7 +29,8 @@ def github_get(url, headers):
                 current_time = int(time.time())
                 wait_time = reset_time - current_time + 1
                 print(f"Rate limit exceeded, sleeping {wait_time} seconds...")
-                time.sleep(wait_time)
+                METRICS.sleep(wait_time, "rate_limit")
+                METRICS.record_event("retry")
                 print("Resuming requests...")
                 continue
             else:
@@ -35,23 +40,25 @@ def github_get(url, headers):
                 if response.status_code == 404:
                     return None
                 print(response)
-                time.sleep(3)
+                METRICS.sleep(3, "backoff")
+                METRICS.record_event("retry")
                 continue
         else:
-            time.sleep(0.25)
+            METRICS.sleep(0.25, "throttle")
             return response
 
 
 def attribute_searching(data_file: str, suffix: str):
     print("starting " + suffix + "\n")
+    METRICS.reset()
     with open(data_file, "r") as f:
         data_dicts = json.load(f)
     repeat = True
-    responses = []
     while repeat:
         print("taking a new sample...\n")
         repeat=False
-        sampled_dicts = random.sample(data_dicts, 500)
+        responses = []
+        sampled_dicts = random.sample(data_dicts, min(500, len(data_dicts)))
         for repo in sampled_dicts:
             response = github_get(
                 f"{REPOSITORY_URL}/{repo["fullname"]}", headers=HEADERS
@@ -59,42 +66,20 @@ def attribute_searching(data_file: str, suffix: str):
             if response:
                 item = response.json()
 
-                responses.append(
-                    {
-                        "id": item.get("id"),
-                        "full_name": item.get("full_name"),
-                        "html_url": item.get("html_url"),
-                        "description": item.get("description"),
-                        "language": item.get("language"),
-                        "created_at": item.get("created_at"),
-                        "stargazers_count": item.get("stargazers_count"),
-                        "open_issues_count": item.get("open_issues_count"),
-                        "size": item.get("size") / 1000,
-                        "topics": item.get("topics", []),
-                        "license": (
-                            item.get("license", {}).get("key")
-                            if item.get("license")
-                            else None
-                        ),
-                        "owner_login": (
-                            item["owner"]["login"] if item.get("owner") else None
-                        ),
-                        "owner_type": (
-                            item["owner"]["type"] if item.get("owner") else None
-                        ),
-                        "archived": item.get("archived"),
-                        "subscribers_count": item.get("subscribers_count"),
-                        "network_count": item.get("network_count"),
-                    }
-                )
+                responses.append(RepoMetadata.from_api(item))
+                METRICS.record_results("repos")
                 print(
                     f"appended repo {item.get("full_name")} created at {item.get("created_at")}"
                 )
             else:
+                METRICS.record_event("resample")
+                # a sample can hold every repo, the missing one must not be drawn again
+                data_dicts.remove(repo)
                 repeat = True
                 break
-    with open(f"Data/sampled_repo_{suffix.lower()}.json", "w") as f:
-        json.dump(responses, f, ensure_ascii=False, indent=2)
+    dump_records(responses, f"Data/sampled_repo_{suffix.lower()}.json", indent=True)
+    record_crawl(responses)
+    METRICS.write_report(f"Data/metrics_{suffix.lower()}_attributes")
     print("ended " + suffix + "\n")
     return
 
@@ -0,0 +1,423 @@
+"""Benchmark the analysis scripts on synthetic datasets of growing size, against stored baselines"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+import numpy as np
+
+import aggregate_cache
+import attribute_graphs
+import combine
+import keyword_graphs
+import library_model_search_graphs
+import rendering
+import warehouse
+from library_model_search import repo
+from records import RepoMetadata, dump_records
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+
+# machine specific, not committed: --save creates it on the machine the benchmarks run on
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "benchmark_baselines.json")
+
+# a slowdown is only reported beyond the tolerance plus this many baseline standard deviations,
+# and when it is larger than the floor, sub-100 ms runs being dominated by noise
+NOISE_STDDEVS = 3
+MIN_TIME_DELTA_S = 0.05
+MIN_MEMORY_DELTA_MB = 1.0
+
+LANGUAGE = "Python"
+
+STARTING_DATE = date(2022, 1, 1)
+ENDING_DATE = date(2025, 10, 1)
+
+# models of the synthetic collections, the first ones of each provider being the most used
+PROVIDER_MODELS = {
+    "OpenAI": [
+        "gpt-4o",
+        "gpt-4o-mini",
+        "gpt-3.5-turbo",
+        "gpt-4.1",
+        "gpt-4.1-mini",
+        "gpt-4-turbo",
+        "gpt-5",
+        "gpt-5-mini",
+        "o3-mini",
+        "o1",
+    ],
+    "Anthropic": [
+        "claude-3-5-sonnet-latest",
+        "claude-3-5-haiku-latest",
+        "claude-3-opus-20240229",
+        "claude-sonnet-4-0",
+        "claude-opus-4-1",
+    ],
+    "Google": ["gemini-2.5-flash", "gemini-2.5-pro", "gemini-1.5-pro"],
+    "Mistral": ["mistral-large-latest", "mistral-medium-2508", "codestral-latest"],
+    "xAI": ["grok-3", "grok-4-0709", "grok-code-fast-1"],
+}
+
+# share of the repos found by the library search, by the model search, and by both
+LIBRARY_HIT_RATIO = 0.2
+MODEL_HIT_RATIO = 0.2
+BOTH_HIT_RATIO = 0.6
+
+# share of the repos whose topics or description mention an LLM keyword
+LLM_REPO_RATIO = 0.08
+
+
+class SyntheticDataset:
+    """Repo metadata, code search collections and model dict of n_repos synthetic repos.
+
+    Stars and sizes are log-normal, model usage follows a Zipf law, and the LLM related repos
+    use the keywords of keyword_graphs and attribute_graphs, so every analysis has work to do.
+    """
+
+    def __init__(self, n_repos: int, seed: int = 0):
+        self.n_repos = n_repos
+        self.rng = np.random.default_rng(seed)
+        self.models = [model for models in PROVIDER_MODELS.values() for model in models]
+        self.model_providers = {
+            model: [provider]
+            for provider, models in PROVIDER_MODELS.items()
+            for model in models
+        }
+
+    def metadata(self) -> list[RepoMetadata]:
+        rng = self.rng
+        n = self.n_repos
+        days = (ENDING_DATE - STARTING_DATE).days
+        # plain lists, indexing numpy arrays element by element is slow at 1M repos
+        created = (
+            (np.datetime64(STARTING_DATE) + rng.integers(0, days, n))
+            .astype(str)
+            .tolist()
+        )
+        stars = rng.lognormal(1.5, 2.0, n).astype(int).tolist()
+        sizes = rng.lognormal(0, 2, n).tolist()
+        is_llm = (rng.random(n) < LLM_REPO_RATIO).tolist()
+        has_details = (rng.random(n) < 0.9).tolist()
+        words = [
+            keyword
+            for keywords in attribute_graphs.CATEGORY_KEYWORDS.values()
+            for keyword in keywords
+        ]
+        llm_topics = rng.choice(keyword_graphs.KEYWORD_LIST, n).tolist()
+        llm_words = rng.choice(words, n).tolist()
+        return [
+            RepoMetadata(
+                id=i,
+                name=f"repo{i}",
+                full_name=f"owner{i % 9973}/repo{i}",
+                html_url=f"https://github.com/owner{i % 9973}/repo{i}",
+                description=(
+                    f"A {llm_words[i]} tool" if is_llm[i] else "A command line tool"
+                ),
+                language=LANGUAGE,
+                created_at=f"{created[i]}T12:00:00Z",
+                stargazers_count=stars[i],
+                open_issues_count=stars[i] // 20,
+                size=sizes[i],
+                topics=[llm_topics[i]] if is_llm[i] else [],
+                license="mit",
+                owner_login=f"owner{i % 9973}",
+                owner_type="User",
+                archived=False,
+                subscribers_count=stars[i] // 10 if has_details[i] else None,
+                network_count=stars[i] // 5 if has_details[i] else None,
+            )
+            for i in range(n)
+        ]
+
+    def collections(self) -> tuple[list[dict], list[dict]]:
+        """Library and model code search collections, in the format of library_model_search"""
+        rng = self.rng
+        n = self.n_repos
+        n_both = int(n * min(LIBRARY_HIT_RATIO, MODEL_HIT_RATIO) * BOTH_HIT_RATIO)
+        n_library = int(n * LIBRARY_HIT_RATIO) - n_both
+        n_model = int(n * MODEL_HIT_RATIO) - n_both
+        ids = rng.permutation(n)[: n_both + n_library + n_model]
+        library_ids = ids[: n_both + n_library]
+        model_ids = np.concatenate([ids[:n_both], ids[n_both + n_library :]])
+
+        ranks = np.arange(1, len(self.models) + 1)
+        model_weights = 1 / ranks**1.2
+        model_weights /= model_weights.sum()
+        providers = list(PROVIDER_MODELS)
+
+        library_repos = []
+        for i in library_ids:
+            library_repo = repo(
+                f"owner{i % 9973}/repo{i}",
+                f"https://github.com/owner{i % 9973}/repo{i}",
+            )
+            for provider in rng.choice(providers, rng.integers(1, 3)):
+                library_repo.add_file_label(str(provider), f"src/client_{i}.py")
+            library_repos.append(library_repo.to_dict())
+        model_repos = []
+        for i in model_ids:
+            model_repo = repo(
+                f"owner{i % 9973}/repo{i}",
+                f"https://github.com/owner{i % 9973}/repo{i}",
+            )
+            for model in rng.choice(self.models, rng.integers(1, 4), p=model_weights):
+                # the model file is often the file importing the SDK
+                path = f"src/client_{i}.py" if rng.random() < 0.7 else "src/config.py"
+                model_repo.add_file_label(str(model), path)
+            model_repos.append(model_repo.to_dict())
+        return library_repos, model_repos
+
+    def write(self, scripts_dir: str) -> None:
+        """Write the dataset where the analysis scripts expect it, relative to scripts_dir"""
+        data_dir = os.path.join(scripts_dir, "Data")
+        os.makedirs(data_dir, exist_ok=True)
+        os.makedirs(os.path.join(scripts_dir, "..", "Figures"), exist_ok=True)
+        dump_records(
+            self.metadata(),
+            os.path.join(data_dir, f"{LANGUAGE.lower()}_repo_metadata.json"),
+        )
+        library_repos, model_repos = self.collections()
+        for kind, repos in [("library", library_repos), ("model", model_repos)]:
+            with open(
+                os.path.join(
+                    data_dir, f"collected_repos_{LANGUAGE.lower()}_{kind}.json"
+                ),
+                "w",
+            ) as f:
+                json.dump(repos, f)
+        with open(os.path.join(scripts_dir, "model_provider_dict.json"), "w") as f:
+            json.dump(self.model_providers, f)
+
+
+def run_combine() -> None:
+    with open("model_provider_dict.json", "r") as f:
+        model_library_map = json.load(f)
+    combine.combine(
+        library_data_path=f"Data/collected_repos_{LANGUAGE.lower()}_library.json",
+        model_data_path=f"Data/collected_repos_{LANGUAGE.lower()}_model.json",
+        output_path=f"Data/collected_repos_{LANGUAGE.lower()}.json",
+        model_library_map=model_library_map,
+    )
+
+
+def run_show_model_frequency() -> None:
+    library_model_search_graphs.show_model_frequency(
+        f"Data/collected_repos_{LANGUAGE.lower()}.json", LANGUAGE.lower()
+    )
+
+
+def run_category_llm_proportion_graph() -> None:
+    attribute_graphs.category_llm_proportion_graph(
+        f"Data/{LANGUAGE.lower()}_repo_metadata.json", LANGUAGE.lower()
+    )
+
+
+def run_monthly_llm_ratio_graph() -> None:
+    keyword_graphs.monthly_llm_ratio_graph(LANGUAGE)
+
+
+# combine comes first, show_model_frequency reads its output
+ANALYSES = {
+    "combine": run_combine,
+    "show_model_frequency": run_show_model_frequency,
+    "category_llm_proportion_graph": run_category_llm_proportion_graph,
+    "monthly_llm_ratio_graph": run_monthly_llm_ratio_graph,
+}
+
+
+def reset_caches() -> None:
+    """Drop the aggregate cache, the warehouse and the render manifest, so every round does the full work"""
+    aggregate_cache._memory.clear()
+    shutil.rmtree(aggregate_cache.CACHE_DIR, ignore_errors=True)
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists(warehouse.WAREHOUSE_PATH + suffix):
+            os.remove(warehouse.WAREHOUSE_PATH + suffix)
+    if os.path.exists(rendering.MANIFEST_PATH):
+        os.remove(rendering.MANIFEST_PATH)
+
+
+def benchmark_analysis(name: str, rounds: int = 3) -> dict:
+    """Time an analysis over several cold rounds, then measure its peak traced memory in one more"""
+    function = ANALYSES[name]
+    times = []
+    for _ in range(rounds):
+        reset_caches()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        times.append(time.perf_counter() - start)
+
+    # tracing slows the allocations down, so it gets a round of its own
+    reset_caches()
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.mean(times),
+        "stddev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "rounds": rounds,
+        "peak_mb": peak / 2**20,
+    }
+
+
+def benchmark_size(
+    size: str, analyses: list[str], rounds: int = 3, seed: int = 0
+) -> dict[str, dict]:
+    """Generate a dataset of the given size in a scratch directory and benchmark the analyses on it"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        scripts_dir = os.path.join(workdir, "Scripts")
+        start = time.perf_counter()
+        SyntheticDataset(SIZES[size], seed).write(scripts_dir)
+        print(f"generated {size} repos in {time.perf_counter() - start:.1f}s")
+        os.chdir(scripts_dir)
+        try:
+            results = {}
+            # the analyses reading the combined dataset need combine to have run once
+            if "combine" not in analyses:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    run_combine()
+            for name in ANALYSES:
+                if name in analyses:
+                    results[f"{name}@{size}"] = benchmark_analysis(name, rounds)
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def load_baselines(path: str = BASELINES_PATH) -> dict:
+    if not os.path.exists(path):
+        return {"environment": {}, "results": {}}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+
+
+def save_baselines(results: dict[str, dict], path: str = BASELINES_PATH) -> None:
+    """Store the results as the new baselines, keeping the baselines of the other benchmarks
+    if they were measured in the same environment"""
+    baselines = load_baselines(path)
+    if baselines["environment"] != environment():
+        baselines = {"environment": environment(), "results": {}}
+    baselines["results"].update(results)
+    with open(path, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+
+
+def is_regression(r: dict, base: dict, tolerance: float) -> bool:
+    """Whether a result is slower or larger than its baseline beyond the tolerance and the noise"""
+    time_limit = base["min_s"] * (1 + tolerance) + NOISE_STDDEVS * base["stddev_s"]
+    slower = r["min_s"] > time_limit and r["min_s"] - base["min_s"] > MIN_TIME_DELTA_S
+    larger = (
+        r["peak_mb"] > base["peak_mb"] * (1 + tolerance)
+        and r["peak_mb"] - base["peak_mb"] > MIN_MEMORY_DELTA_MB
+    )
+    return slower or larger
+
+
+def compare(results: dict[str, dict], baselines: dict, tolerance: float) -> list[str]:
+    """Print the results next to their baselines, return the benchmarks slower or larger than
+    their baseline beyond the tolerance and the noise, none if the baselines come from another
+    environment"""
+    comparable = baselines["environment"] == environment()
+    if baselines["results"] and not comparable:
+        print(
+            f"baselines measured on {baselines['environment']}, not on {environment()}: "
+            "shown for reference only, run with --save to measure them here"
+        )
+    print(
+        f"{'benchmark':<40}{'min s':>10}{'base s':>10}{'ratio':>8}"
+        f"{'peak MB':>10}{'base MB':>10}{'ratio':>8}"
+    )
+    regressions = []
+    for key, r in results.items():
+        base = baselines["results"].get(key)
+        if base is None:
+            print(
+                f"{key:<40}{r['min_s']:>10.3f}{'-':>10}{'-':>8}{r['peak_mb']:>10.1f}{'-':>10}{'-':>8}"
+            )
+            continue
+        time_ratio = r["min_s"] / base["min_s"]
+        memory_ratio = r["peak_mb"] / max(base["peak_mb"], 1e-9)
+        flag = ""
+        if comparable and is_regression(r, base, tolerance):
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(
+            f"{key:<40}{r['min_s']:>10.3f}{base['min_s']:>10.3f}{time_ratio:>8.2f}"
+            f"{r['peak_mb']:>10.1f}{base['peak_mb']:>10.1f}{memory_ratio:>8.2f}{flag}"
+        )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="benchmark_analysis",
+        description="Time and memory-profile the analysis scripts on synthetic datasets, and compare with the baselines",
+    )
+    parser.add_argument(
+        "analyses", nargs="*", help=f"analyses to run, any of {list(ANALYSES)}"
+    )
+    parser.add_argument(
+        "-n", "--sizes", nargs="+", default=["10k"], choices=list(SIZES)
+    )
+    parser.add_argument("-r", "--rounds", default=3, type=int)
+    parser.add_argument("-s", "--seed", default=0, type=int)
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        default=0.25,
+        type=float,
+        help="relative slowdown or memory growth reported as a regression",
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="store the results as the new baselines"
+    )
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+    for name in args.analyses:
+        if name not in ANALYSES:
+            parser.error(f"unknown analysis {name}, choose from {list(ANALYSES)}")
+
+    results = {}
+    for size in args.sizes:
+        results.update(
+            benchmark_size(
+                size, args.analyses or list(ANALYSES), args.rounds, args.seed
+            )
+        )
+    regressions = compare(results, load_baselines(), args.tolerance)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save:
+        save_baselines(results)
+        print(f"baselines saved to {BASELINES_PATH}")
+    elif regressions:
+        sys.exit(1)
@@ -0,0 +1,180 @@
+"""Benchmark the GitHub collectors offline against the local mock API"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import tempfile
+import time
+from datetime import date
+
+import github_metrics
+from github_mock import MockGitHubServer, MockPopulation, RealClock, VirtualClock
+
+STARTING_DATE = date(2023, 1, 1)
+ENDING_DATE = date(2023, 7, 1)
+
+
+def run_keyword_search(module, population: MockPopulation, language: str) -> str:
+    module.repo_search(language, STARTING_DATE, ENDING_DATE, 100, token="mock-token")
+    return f"Data/{language.lower()}_repo_metadata.json"
+
+
+def run_library_model_search(module, population: MockPopulation, language: str) -> str:
+    module.collect_repo_by_language(
+        language.lower(), population.keyword_dict(), suffix="model"
+    )
+    return f"Data/collected_repos_{language.lower()}_model.json"
+
+
+def run_attribute_mining(module, population: MockPopulation, language: str) -> str:
+    data_file = f"Data/collected_repos_{language.lower()}.json"
+    with open(data_file, "w") as f:
+        json.dump(population.combined_repos(language), f)
+    module.attribute_searching(data_file, language)
+    return f"Data/sampled_repo_{language.lower()}.json"
+
+
+def run_bulk_scan(module, population: MockPopulation, language: str) -> str:
+    data_file = f"Data/collected_repos_{language.lower()}.json"
+    with open(data_file, "w") as f:
+        json.dump(population.combined_repos(language), f)
+    model_path, _ = module.bulk_scan(
+        data_file, language.lower(), population.keyword_dict()
+    )
+    return model_path
+
+
+COLLECTORS = {
+    "keyword_search": run_keyword_search,
+    "library_model_search": run_library_model_search,
+    "attribute_mining": run_attribute_mining,
+    "bulk_scan": run_bulk_scan,
+}
+
+
+def benchmark_collector(
+    name: str,
+    population: MockPopulation,
+    language: str,
+    virtual_clock: bool = True,
+    limits: dict | None = None,
+) -> dict:
+    """Run one collector against a fresh mock server and measure its request throughput"""
+    clock = VirtualClock() if virtual_clock else RealClock()
+    cwd = os.getcwd()
+    saved_env = {key: os.environ.get(key) for key in ["GITHUB_API_URL", "GITHUB_TOKEN"]}
+    with MockGitHubServer(
+        population, clock=clock, limits=limits
+    ) as server, tempfile.TemporaryDirectory() as workdir:
+        os.environ["GITHUB_API_URL"] = server.url
+        os.environ.setdefault("GITHUB_TOKEN", "mock-token")
+        try:
+            # reload so that the module level URLs and headers pick up the mock server
+            module = importlib.reload(importlib.import_module(name))
+            module.time = clock
+            github_metrics.time = clock
+            github_metrics.METRICS.reset()
+
+            os.makedirs(os.path.join(workdir, "Data"))
+            os.chdir(workdir)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                output_path = COLLECTORS[name](module, population, language)
+            wall_time = time.perf_counter() - start
+            with open(output_path, "r") as f:
+                results = len(json.load(f))
+        finally:
+            # leave the process as it was, the collector pointing to the real API again
+            os.chdir(cwd)
+            for key, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+            github_metrics.time = time
+            importlib.reload(importlib.import_module(name))
+
+        totals = server.totals()
+        return {
+            "collector": name,
+            "language": language,
+            "requests": totals["requests"],
+            "wasted_requests": totals["wasted"],
+            "results": results,
+            "results_per_request": results / max(totals["requests"], 1),
+            "requests_per_second": totals["requests"] / wall_time,
+            "wall_time_s": wall_time,
+            "sleep_time_s": clock.slept,
+            "simulated_time_s": wall_time + clock.slept if virtual_clock else wall_time,
+            "endpoints": server.stats,
+            "collector_metrics": github_metrics.METRICS.summary(),
+        }
+
+
+def print_results(results: list[dict]) -> None:
+    print(
+        f"{'collector':<22}{'requests':>10}{'wasted':>8}{'results':>9}"
+        f"{'req/s':>10}{'wall s':>9}{'sleep s':>10}"
+    )
+    for r in results:
+        print(
+            f"{r['collector']:<22}{r['requests']:>10}{r['wasted_requests']:>8}{r['results']:>9}"
+            f"{r['requests_per_second']:>10.1f}{r['wall_time_s']:>9.2f}{r['sleep_time_s']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="benchmark_collectors",
+        description="Measure requests/s, wasted requests and wall time of the collectors against a mock GitHub API",
+    )
+    parser.add_argument(
+        "collectors", nargs="*", help=f"collectors to run, any of {list(COLLECTORS)}"
+    )
+    parser.add_argument("-l", "--language", default="Python")
+    parser.add_argument("-n", "--repos", default=1200, type=int)
+    parser.add_argument("-s", "--seed", default=0, type=int)
+    parser.add_argument("--missing-ratio", default=0.001, type=float)
+    parser.add_argument(
+        "--real-time",
+        action="store_true",
+        help="really sleep on rate limits instead of advancing a virtual clock",
+    )
+    parser.add_argument(
+        "--no-rate-limit", action="store_true", help="disable the mock rate limits"
+    )
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+    for name in args.collectors:
+        if name not in COLLECTORS:
+            parser.error(f"unknown collector {name}, choose from {list(COLLECTORS)}")
+
+    population = MockPopulation(
+        repos_per_language=args.repos,
+        starting_date=STARTING_DATE,
+        ending_date=ENDING_DATE,
+        missing_ratio=args.missing_ratio,
+        seed=args.seed,
+    )
+    limits = (
+        {"search": (10**9, 60), "code_search": (10**9, 60), "core": (10**9, 3600)}
+        if args.no_rate_limit
+        else None
+    )
+    results = [
+        benchmark_collector(
+            name,
+            population,
+            args.language,
+            virtual_clock=not args.real_time,
+            limits=limits,
+        )
+        for name in args.collectors or COLLECTORS
+    ]
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
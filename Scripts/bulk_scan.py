@@ -0,0 +1,236 @@
+"""Re-check known repos for SDK and model references with one archive download per repo instead of a code search per keyword"""
+
+import argparse
+import io
+import json
+import os
+import re
+import subprocess
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from github_metrics import METRICS
+from library_model_search import repo
+from verify_usage import SDK_IMPORTS, VENDORED_DIRS
+
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+REPOSITORY_URL = f"{GITHUB_API_URL}/repos"
+HEADERS = {
+    "Accept": "application/vnd.github+json",
+    "Authorization": f"Bearer {os.getenv('GITHUB_TOKEN')}",
+}
+
+LANGUAGE_EXTENSIONS = {"python": (".py",), "java": (".java",), "go": (".go",)}
+
+# code search does not index files larger than this
+MAX_FILE_SIZE = 384 * 1024
+
+
+class KeywordMatcher:
+    """Find all the keywords of a dict in a file with a single compiled regex.
+
+    Longer keywords come first in the alternation, and a keyword only matches when it is not part
+    of a longer identifier, so "gpt-4o" does not match inside "gpt-4o-mini".
+    """
+
+    def __init__(self, keyword_labels: dict[str, str], allow_attribute: bool = False):
+        self.labels = {k.encode("utf-8"): v for k, v in keyword_labels.items()}
+        alternatives = sorted(self.labels, key=len, reverse=True)
+        self.pattern = re.compile(
+            rb"(?<![\w.\-/])("
+            + b"|".join(re.escape(k) for k in alternatives)
+            + rb")(?![\w\-]"
+            # "gpt-4" must not match "gpt-4.1", but module names may be followed by an attribute
+            + (b"" if allow_attribute else rb"|\.\d")
+            + rb")"
+        )
+
+    def labels_in(self, content: bytes) -> set[str]:
+        return {self.labels[m.group(1)] for m in self.pattern.finditer(content)}
+
+
+def model_matcher(model_keyword_dict: dict[str, str]) -> KeywordMatcher:
+    """Matcher of the model names, the keywords of model_keyword_dict.json being quoted phrases"""
+    return KeywordMatcher(
+        {keyword.strip('"'): model for keyword, model in model_keyword_dict.items()}
+    )
+
+
+def library_matcher(language: str) -> KeywordMatcher:
+    """Matcher of the SDK modules of every provider, labelled with the provider"""
+    return KeywordMatcher(
+        {
+            prefix: provider
+            for provider, prefixes in SDK_IMPORTS[language].items()
+            for prefix in prefixes
+        },
+        allow_attribute=True,
+    )
+
+
+def fetch_tarball(full_name: str) -> bytes | None:
+    """Gzipped tarball of the default branch, None if the repo no longer exists"""
+    while True:
+        response = METRICS.get(
+            "repos/tarball",
+            f"{REPOSITORY_URL}/{full_name}/tarball",
+            headers=HEADERS,
+            timeout=120,
+        )
+        if response.status_code == 200:
+            return response.content
+        if response.status_code in (404, 451):
+            return None
+        if response.status_code == 401:
+            raise Exception(
+                "Unauthorized: Check your GITHUB_TOKEN environment variable."
+            )
+        if int(response.headers.get("X-RateLimit-Remaining", "1")) == 0:
+            reset_time = int(response.headers.get("X-RateLimit-Reset", time.time()))
+            wait_time = reset_time - int(time.time()) + 1
+            print(f"Rate limit exceeded, sleeping {wait_time} seconds...")
+            METRICS.sleep(wait_time, "rate_limit")
+        else:
+            print(f"Tarball of {full_name} failed with status {response.status_code}")
+            METRICS.sleep(3, "backoff")
+        METRICS.record_event("retry")
+
+
+def archive_files(tar: tarfile.TarFile, strip_top: bool):
+    """(path, content) of the regular files of a tar archive"""
+    for member in tar:
+        if not member.isfile() or member.size > MAX_FILE_SIZE:
+            continue
+        path = member.name.split("/", 1)[-1] if strip_top else member.name
+        yield path, tar.extractfile(member).read()
+
+
+def repo_files(full_name: str, mirror: str | None = None):
+    """(path, content) of every file of a repo, from a local mirror if given, else from its tarball"""
+    if mirror:
+        local_path = os.path.join(mirror, full_name)
+        if os.path.isdir(os.path.join(local_path, ".git")) or os.path.isdir(
+            f"{local_path}.git"
+        ):
+            git_dir = local_path if os.path.isdir(local_path) else f"{local_path}.git"
+            archive = subprocess.run(
+                ["git", "-C", git_dir, "archive", "--format=tar", "HEAD"],
+                capture_output=True,
+                check=True,
+            ).stdout
+            with tarfile.open(fileobj=io.BytesIO(archive), mode="r:") as tar:
+                yield from archive_files(tar, strip_top=False)
+            return
+        if os.path.isdir(local_path):
+            for root, _, names in os.walk(local_path):
+                for name in names:
+                    path = os.path.join(root, name)
+                    if os.path.getsize(path) <= MAX_FILE_SIZE:
+                        with open(path, "rb") as f:
+                            yield os.path.relpath(path, local_path), f.read()
+            return
+    content = fetch_tarball(full_name)
+    if content is None:
+        return
+    with tarfile.open(fileobj=io.BytesIO(content), mode="r:gz") as tar:
+        yield from archive_files(tar, strip_top=True)
+
+
+def scan_repo(
+    full_name: str,
+    html_url: str,
+    language: str,
+    models: KeywordMatcher,
+    libraries: KeywordMatcher,
+    mirror: str | None = None,
+) -> tuple[repo, repo]:
+    """Label every source file of the repo with the models and libraries it references"""
+    model_repo = repo(full_name, html_url)
+    library_repo = repo(full_name, html_url)
+    extensions = LANGUAGE_EXTENSIONS.get(language, (f".{language}",))
+    for path, content in repo_files(full_name, mirror):
+        if not path.endswith(extensions) or any(
+            vendored in path for vendored in VENDORED_DIRS
+        ):
+            continue
+        for label in models.labels_in(content):
+            model_repo.add_file_label(label, path)
+        for label in libraries.labels_in(content):
+            library_repo.add_file_label(label, path)
+    return model_repo, library_repo
+
+
+def bulk_scan(
+    combined_data_path: str,
+    language: str,
+    model_keyword_dict: dict[str, str],
+    workers: int = 4,
+    mirror: str | None = None,
+) -> tuple[str, str]:
+    """Scan the repos of a combined collection, writing model and library collections in the
+    format of library_model_search, return their paths"""
+    METRICS.reset()
+    with open(combined_data_path, "r", encoding="utf-8") as f:
+        combined_repos = json.load(f)
+    models = model_matcher(model_keyword_dict)
+    libraries = library_matcher(language)
+
+    def scan(combined_repo):
+        return scan_repo(
+            combined_repo["fullname"],
+            combined_repo["html_url"],
+            language,
+            models,
+            libraries,
+            mirror,
+        )
+
+    model_repos = []
+    library_repos = []
+    # the workers record with the recorder of this thread, the one orchestrate bound to the job
+    with ThreadPoolExecutor(
+        max_workers=workers, initializer=METRICS.use, initargs=(METRICS.current(),)
+    ) as pool:
+        for model_repo, library_repo in pool.map(scan, combined_repos):
+            METRICS.record_results("repos/tarball")
+            if model_repo.labels:
+                model_repos.append(model_repo.to_dict())
+            if library_repo.labels:
+                library_repos.append(library_repo.to_dict())
+            print(
+                f"scanned {model_repo.full_name}: {len(model_repo.labels)} models, "
+                f"{len(library_repo.labels)} libraries"
+            )
+
+    output_paths = (
+        f"Data/collected_repos_{language}_model_bulk.json",
+        f"Data/collected_repos_{language}_library_bulk.json",
+    )
+    for path, repos in zip(output_paths, [model_repos, library_repos]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(repos, f, indent=2)
+    METRICS.write_report(f"Data/metrics_{language}_bulk_scan")
+    return output_paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="bulk_scan",
+        description="Scan the repos found by combine.py for every model and SDK with one download per repo",
+    )
+    parser.add_argument("language", choices=list(LANGUAGE_EXTENSIONS))
+    parser.add_argument("-w", "--workers", default=4, type=int)
+    parser.add_argument(
+        "-m", "--mirror", help="directory of local clones named owner/repo"
+    )
+    args = parser.parse_args()
+    with open("model_keyword_dict.json", "r") as f:
+        model_keyword_dict = json.load(f)
+    bulk_scan(
+        f"Data/collected_repos_{args.language}.json",
+        args.language,
+        model_keyword_dict,
+        workers=args.workers,
+        mirror=args.mirror,
+    )
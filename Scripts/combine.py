@@ -1,5 +1,166 @@
+import argparse
+import hashlib
 import json
-from mine import repo
+import os
+import re
+from library_model_search import repo
+
+COMBINE_STATE_DIR = "Data/.cache"
+
+WHITESPACE = re.compile(r"\s*")
+
+
+class FileEvidenceIndex:
+    """Inverted index of one repo from its files to the libraries and models they reference.
+
+    Files are given sorted ids, each label keeps the sorted ids of its files.
+    """
+
+    def __init__(self, library_labels: dict[str, set], model_labels: dict[str, set]):
+        self.file_paths = sorted(
+            set().union(*library_labels.values(), *model_labels.values())
+        )
+        file_ids = {path: i for i, path in enumerate(self.file_paths)}
+        self.file_libraries = [[] for _ in self.file_paths]
+        self.file_models = [[] for _ in self.file_paths]
+        self.library_files = {}
+        self.model_files = {}
+        for labels, postings, per_file in [
+            (library_labels, self.library_files, self.file_libraries),
+            (model_labels, self.model_files, self.file_models),
+        ]:
+            for label, paths in labels.items():
+                postings[label] = sorted(file_ids[path] for path in paths)
+                for file_id in postings[label]:
+                    per_file[file_id].append(label)
+
+    def libraries_with(self, model: str) -> set[str]:
+        """Libraries referenced in at least one file that also references the model"""
+        return {
+            lib
+            for file_id in self.model_files.get(model, [])
+            for lib in self.file_libraries[file_id]
+        }
+
+    def shared_files(self, library: str, model: str) -> list[str]:
+        """Files referencing both the library and the model, merging the two sorted postings"""
+        lib_ids = self.library_files.get(library, [])
+        model_ids = self.model_files.get(model, [])
+        shared = []
+        i = j = 0
+        while i < len(lib_ids) and j < len(model_ids):
+            if lib_ids[i] == model_ids[j]:
+                shared.append(self.file_paths[lib_ids[i]])
+                i += 1
+                j += 1
+            elif lib_ids[i] < model_ids[j]:
+                i += 1
+            else:
+                j += 1
+        return shared
+
+    def evidence(self) -> dict[str, dict[str, list[str]]]:
+        """Libraries and models of every file referencing at least one of each"""
+        return {
+            path: {"libraries": sorted(libs), "models": sorted(models)}
+            for path, libs, models in zip(
+                self.file_paths, self.file_libraries, self.file_models
+            )
+            if libs and models
+        }
+
+
+def combine_repo(
+    repo_name: str,
+    repo_lib_side: repo | None,
+    repo_mod_side: repo | None,
+    model_library_map: dict[str, list[str]],
+) -> dict:
+    """Combined entry of a repo found by the library search, the model search or both"""
+    if repo_mod_side is None:
+        return {
+            "fullname": repo_name,
+            "html_url": repo_lib_side.html_url,
+            "tags": [f"{lib}_unknown_model" for lib in repo_lib_side.labels.keys()],
+        }
+    if repo_lib_side is None:
+        return {
+            "fullname": repo_name,
+            "html_url": repo_mod_side.html_url,
+            "tags": [f"unknown_lib_{model}" for model in repo_mod_side.labels.keys()],
+        }
+
+    index = FileEvidenceIndex(repo_lib_side.labels, repo_mod_side.labels)
+    combined_repo = {
+        "fullname": repo_name,
+        "html_url": repo_lib_side.html_url,
+        "tags": [],
+        "evidence": index.evidence(),
+    }
+
+    for model in repo_mod_side.labels:
+
+        if model not in model_library_map:
+            continue
+        possible_libraries = model_library_map[model]
+        if not isinstance(possible_libraries, list):
+            raise ValueError(
+                f"model_library_map[{model}] should be a list, got {type(possible_libraries)}"
+            )
+
+        cooccurring_libraries = index.libraries_with(model)
+        for lib in possible_libraries:
+            if lib in cooccurring_libraries:
+                combined_repo["tags"].append(f"{lib}_{model}")
+                break
+
+    if not combined_repo["tags"]:
+        combined_repo["tags"] = [f"{lib}" for lib in repo_lib_side.labels.keys()] + [
+            f"{model}" for model in repo_mod_side.labels.keys()
+        ]
+    return combined_repo
+
+
+def labels_hash(repo_dict: dict | None) -> str | None:
+    """Digest of the url and labels of one side of a repo, independent of the order of the paths.
+
+    The order of the labels is kept, the tags of the combined entry follow it.
+    """
+    if repo_dict is None:
+        return None
+    content = (
+        repo_dict["html_url"],
+        [
+            (label, sorted(paths))
+            for label, paths in repo_dict.get("labels", {}).items()
+        ],
+    )
+    return hashlib.blake2b(repr(content).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def read_array_entries(path: str):
+    """(entry, source text) of every element of the JSON array in a file"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    decoder = json.JSONDecoder()
+    pos = WHITESPACE.match(text, text.index("[") + 1).end()
+    while text[pos] != "]":
+        entry, end = decoder.raw_decode(text, pos)
+        yield entry, text[pos:end]
+        pos = WHITESPACE.match(text, end).end()
+        if text[pos] == ",":
+            pos = WHITESPACE.match(text, pos + 1).end()
+
+
+def entry_fragment(entry: dict) -> str:
+    """Source text of an element of an array written by json.dump(..., indent=2)"""
+    return json.dumps([entry], indent=2)[4:-2]
+
+
+def combine_state_path(output_path: str) -> str:
+    """Per repo label hashes of the last combine run writing output_path"""
+    name = os.path.basename(output_path).removesuffix(".json")
+    return os.path.join(COMBINE_STATE_DIR, f"combine_{name}.json")
 
 
 def combine(
@@ -7,112 +168,149 @@ def combine(
     model_data_path: str,
     output_path: str,
     model_library_map: dict[str, list[str]],
-):
+    incremental: bool = False,
+) -> dict[str, int]:
+    """Combine the library and model collections into output_path, return the number of repos
+    recombined and removed.
 
+    In incremental mode only the repos whose labels changed since the last run are recombined, the
+    others keep their entry and position in the existing output.
+    """
+    # repos are only built for the entries that get recombined
     repos_with_llm_library_dict = {
-        repo_lib["full_name"]: repo.from_dict(repo_lib)
+        repo_lib["full_name"]: repo_lib
         for repo_lib in json.load(open(library_data_path, "r", encoding="utf-8"))
     }
     repos_with_llm_model_dict = {
-        repo_mod["full_name"]: repo.from_dict(repo_mod)
+        repo_mod["full_name"]: repo_mod
         for repo_mod in json.load(open(model_data_path, "r", encoding="utf-8"))
     }
+    repo_hashes = {
+        repo_name: [
+            labels_hash(repos_with_llm_library_dict.get(repo_name)),
+            labels_hash(repos_with_llm_model_dict.get(repo_name)),
+        ]
+        for repo_name in repos_with_llm_library_dict.keys()
+        | repos_with_llm_model_dict.keys()
+    }
+    map_hash = hashlib.blake2b(
+        json.dumps(model_library_map, sort_keys=True).encode("utf-8"), digest_size=16
+    ).hexdigest()
 
-    repos_with_llm_library_set = set(repos_with_llm_library_dict.keys())
-    repos_with_llm_model_set = set(repos_with_llm_model_dict.keys())
-
-    possible_repos_with_library_and_model_set = repos_with_llm_library_set.intersection(
-        repos_with_llm_model_set
-    )
-    repos_with_library_but_no_model_set = repos_with_llm_library_set.difference(
-        repos_with_llm_model_set
-    )
-    repos_with_model_but_no_library_set = repos_with_llm_model_set.difference(
-        repos_with_llm_library_set
-    )
-
-    combined_repos = []
-    for repo_name in possible_repos_with_library_and_model_set:
-        repo_lib_side = repos_with_llm_library_dict[repo_name]
-        repo_mod_side = repos_with_llm_model_dict[repo_name]
-        combined_repo = {
-            "fullname": repo_name,
-            "html_url": repo_lib_side.html_url,
-            "tags": [],
-        }
+    state_path = combine_state_path(output_path)
+    previous = None
+    if incremental and os.path.exists(state_path) and os.path.exists(output_path):
+        with open(state_path, "r") as f:
+            state = json.load(f)
+        # tags depend on the model map, a new map recombines everything
+        if state["map_hash"] == map_hash:
+            previous = state["repos"]
 
-        for model, model_files in repo_mod_side.labels.items():
+    def combine_one(repo_name):
+        repo_lib = repos_with_llm_library_dict.get(repo_name)
+        repo_mod = repos_with_llm_model_dict.get(repo_name)
+        return combine_repo(
+            repo_name,
+            repo.from_dict(repo_lib) if repo_lib is not None else None,
+            repo.from_dict(repo_mod) if repo_mod is not None else None,
+            model_library_map,
+        )
 
-            if model not in model_library_map:
-                continue
-            possible_libraries = model_library_map[model]
-            if not isinstance(possible_libraries, list):
-                raise ValueError(
-                    f"model_library_map[{model}] should be a list, got {type(possible_libraries)}"
-                )
-
-            for lib in possible_libraries:
-                if lib in repo_lib_side.labels:
-                    if model_files.intersection(repo_lib_side.labels[lib]):
-                        combined_repo["tags"].append(f"{lib}_{model}")
-                        break
-
-        if combined_repo["tags"]:
-            combined_repos.append(combined_repo)
-        else:
-            combined_repo["tags"] = [
-                f"{lib}" for lib in repo_lib_side.labels.keys()
-            ] + [f"{model}" for model in repo_mod_side.labels.keys()]
-            combined_repos.append(combined_repo)
-
-    for repo_name in repos_with_library_but_no_model_set:
-        repo_lib_side = repos_with_llm_library_dict[repo_name]
-        combined_repo = {
-            "fullname": repo_name,
-            "html_url": repo_lib_side.html_url,
-            "tags": [],
-        }
-        combined_repo["tags"] += [
-            f"{lib}_unknown_model" for lib in repo_lib_side.labels.keys()
+    if previous is None:
+        repos_with_llm_library_set = set(repos_with_llm_library_dict.keys())
+        repos_with_llm_model_set = set(repos_with_llm_model_dict.keys())
+        # repos with both sides first, then library only, then model only
+        repo_names = [
+            *(repos_with_llm_library_set & repos_with_llm_model_set),
+            *(repos_with_llm_library_set - repos_with_llm_model_set),
+            *(repos_with_llm_model_set - repos_with_llm_library_set),
         ]
-        combined_repos.append(combined_repo)
+        combined_repos = [combine_one(repo_name) for repo_name in repo_names]
+        changed, removed = set(repo_names), set()
 
-    for repo_name in repos_with_model_but_no_library_set:
-        repo_model_side = repos_with_llm_model_dict[repo_name]
-        combined_repo = {
-            "fullname": repo_name,
-            "html_url": repo_model_side.html_url,
-            "tags": [],
+        print(f"{output_path} has length:{len(combined_repos)}")
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(combined_repos, f, indent=2)
+    else:
+        changed = {
+            repo_name
+            for repo_name, hashes in repo_hashes.items()
+            if previous.get(repo_name) != hashes
         }
-        combined_repo["tags"] += [
-            f"unknown_lib_{model}" for model in repo_model_side.labels.keys()
+        removed = previous.keys() - repo_hashes.keys()
+        # unchanged entries are written back as they were, without encoding them again
+        fragments = []
+        existing_names = set()
+        for combined_repo, fragment in read_array_entries(output_path):
+            repo_name = combined_repo["fullname"]
+            existing_names.add(repo_name)
+            if repo_name not in repo_hashes:
+                continue
+            if repo_name in changed:
+                fragment = entry_fragment(combine_one(repo_name))
+            fragments.append(fragment)
+        fragments += [
+            entry_fragment(combine_one(repo_name))
+            for repo_name in sorted(changed - existing_names)
         ]
-        combined_repos.append(combined_repo)
+        print(f"{len(changed)} repos recombined, {len(removed)} removed")
+
+        print(f"{output_path} has length:{len(fragments)}")
+        # the layout of json.dump(..., indent=2)
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write("[\n  " + ",\n  ".join(fragments) + "\n]" if fragments else "[]")
+
+    os.makedirs(COMBINE_STATE_DIR, exist_ok=True)
+    with open(state_path, "w") as f:
+        f.write(json.dumps({"map_hash": map_hash, "repos": repo_hashes}))
+    return {"recombined": len(changed), "removed": len(removed)}
+
+
+def find_files(
+    combined_data_path: str, library: str, model_substring: str = ""
+) -> list[tuple[str, str, list[str]]]:
+    """Files referencing the library together with a model containing model_substring,
+    e.g. find_files(path, "Anthropic", "gpt"), as (repo, file path, matching models)"""
+    with open(combined_data_path, "r", encoding="utf-8") as f:
+        combined_repos = json.load(f)
+    found = []
+    for combined_repo in combined_repos:
+        for path, refs in combined_repo.get("evidence", {}).items():
+            if library not in refs["libraries"]:
+                continue
+            models = [model for model in refs["models"] if model_substring in model]
+            if models:
+                found.append((combined_repo["fullname"], path, models))
+    return found
 
-    print(f"{output_path} has length:{len(combined_repos)}")
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(combined_repos, f, indent=2)
+def collection_path(language: str, kind: str) -> str:
+    """The collection filtered by verify_usage.py if there is one, the raw code search hits otherwise"""
+    verified_path = f"Data/collected_repos_{language}_{kind}_verified.json"
+    if os.path.exists(verified_path):
+        return verified_path
+    return f"Data/collected_repos_{language}_{kind}.json"
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="combine",
+        description="Tag the repos found by the library and model code searches",
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help="only recombine the repos whose labels changed since the last run",
+    )
+    args = parser.parse_args()
     with open("model_provider_dict.json", "r") as f:
         model_library_map = json.load(f)
+    for language in ["python", "java", "go"]:
         combine(
-            library_data_path="Data/collected_repos_python_library.json",
-            model_data_path="Data/collected_repos_python_model.json",
-            output_path="Data/collected_repos_python.json",
-            model_library_map=model_library_map,
-        )
-        combine(
-            library_data_path="Data/collected_repos_java_library.json",
-            model_data_path="Data/collected_repos_java_model.json",
-            output_path="Data/collected_repos_java.json",
-            model_library_map=model_library_map,
-        )
-        combine(
-            library_data_path="Data/collected_repos_go_library.json",
-            model_data_path="Data/collected_repos_go_model.json",
-            output_path="Data/collected_repos_go.json",
+            library_data_path=collection_path(language, "library"),
+            model_data_path=collection_path(language, "model"),
+            output_path=f"Data/collected_repos_{language}.json",
             model_library_map=model_library_map,
+            incremental=args.incremental,
         )
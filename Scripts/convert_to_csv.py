@@ -1,7 +1,245 @@
-import pandas as pd
+"""Export the JSON files of Data/ to CSV (or Parquet), streaming the records in chunks"""
+
+import argparse
+import json
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+CHUNK_RECORDS = 10_000
+READ_SIZE = 1 << 20
+WHITESPACE = re.compile(r"\s*")
+
+
+def iter_json_array(f, read_size: int = READ_SIZE):
+    """Yield the elements of a top level JSON array one at a time, holding about read_size characters"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    opened = False
+    while True:
+        # skip the opening bracket and the separators before the next element
+        while pos < len(buffer) and (
+            buffer[pos].isspace()
+            or buffer[pos] == ","
+            or (buffer[pos] == "[" and not opened)
+        ):
+            opened = opened or buffer[pos] == "["
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        error = None
+        if pos < len(buffer):
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                error = e
+            else:
+                # a cut element may still decode, "4." of "4.5" for instance, so it is only
+                # complete once followed by a separator
+                follow = WHITESPACE.match(buffer, end).end()
+                if follow < len(buffer) and buffer[follow] in ",]":
+                    yield element
+                    pos = follow
+                    if pos > read_size:
+                        buffer, pos = buffer[pos:], 0
+                    continue
+        if eof:
+            raise error or ValueError("unterminated JSON array")
+        chunk = f.read(read_size)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def iter_records(path: str):
+    """Records of a JSON file: the elements of a top level array, or one record per key of an object"""
+    with open(path, "rb") as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first == b"[" and ijson is not None:
+            f.seek(0)
+            yield from ijson.items(f, "item", use_float=True)
+            return
+    with open(path, "r", encoding="utf-8") as f:
+        if first == b"[":
+            yield from iter_json_array(f)
+            return
+        # objects are small reports (metrics, counts), loaded at once
+        data = json.load(f)
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield (
+                {"key": key, **value}
+                if isinstance(value, dict)
+                else {
+                    "key": key,
+                    "value": value,
+                }
+            )
+
+
+def output_path(path: str, output_dir: str, fmt: str) -> str:
+    name = os.path.basename(path).removesuffix(".json")
+    return os.path.join(output_dir, f"{name}.{fmt}")
+
+
+def is_up_to_date(path: str, out_path: str) -> bool:
+    return os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(
+        path
+    )
+
+
+def chunks(records, size: int):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def scan_columns(path: str) -> dict[str, set[type]]:
+    """Columns of all the records of a file in order of first appearance, with the types of their values"""
+    columns = {}
+    for record in iter_records(path):
+        for key, value in record.items():
+            types = columns.setdefault(key, set())
+            if value is not None:
+                types.add(type(value))
+    return columns
+
+
+def arrow_type(types: set[type]):
+    """Parquet type of a column, string for the nested, mixed or always null ones"""
+    if types == {bool}:
+        return pa.bool_()
+    if types and types <= {int}:
+        return pa.int64()
+    if types and types <= {int, float}:
+        return pa.float64()
+    return pa.string()
+
+
+def export_file(
+    path: str,
+    output_dir: str,
+    fmt: str = "csv",
+    chunk_records: int = CHUNK_RECORDS,
+    force: bool = False,
+) -> str | None:
+    """Export one JSON file chunk by chunk, return the output path or None if it was up to date"""
+    out_path = output_path(path, output_dir, fmt)
+    if not force and is_up_to_date(path, out_path):
+        return None
+    tmp_path = f"{out_path}.tmp"
+    # records do not all have the same keys (detail-only fields, reports), so a first pass
+    # collects every column and its types before the chunks are aligned on them
+    column_types = scan_columns(path)
+    columns = list(column_types)
+    writer = None
+    if fmt == "parquet":
+        schema = pa.schema(
+            [(column, arrow_type(types)) for column, types in column_types.items()]
+        )
+        text_columns = [
+            column for column in columns if schema.field(column).type == pa.string()
+        ]
+    n = 0
+    try:
+        for chunk in chunks(iter_records(path), chunk_records):
+            df = pd.DataFrame(chunk, index=range(n, n + len(chunk)), columns=columns)
+            if fmt == "csv":
+                df.to_csv(tmp_path, mode="w" if n == 0 else "a", header=n == 0)
+            else:
+                # nested and mixed values (topics, labels) are stored as JSON text
+                for column in text_columns:
+                    df[column] = df[column].map(
+                        lambda v: (
+                            v if v is None or isinstance(v, str) else json.dumps(v)
+                        )
+                    )
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, schema)
+                writer.write_table(
+                    pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+                )
+            n += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if n == 0:
+        # an empty output still marks the input as exported
+        if fmt == "csv":
+            open(tmp_path, "w").close()
+        else:
+            pq.write_table(pa.table({}), tmp_path)
+    os.replace(tmp_path, out_path)
+    print(f"{path} -> {out_path} ({n} records)")
+    return out_path
+
+
+def export_all(
+    data_dir: str = "Data",
+    output_dir: str | None = None,
+    fmt: str = "csv",
+    workers: int | None = None,
+    force: bool = False,
+) -> list[str]:
+    """Export every JSON file of data_dir in parallel, skipping the ones whose output is newer"""
+    output_dir = output_dir or data_dir
+    os.makedirs(output_dir, exist_ok=True)
+    paths = sorted(
+        os.path.join(data_dir, name)
+        for name in os.listdir(data_dir)
+        if name.endswith(".json") and os.path.isfile(os.path.join(data_dir, name))
+    )
+    pending = [
+        path
+        for path in paths
+        if force or not is_up_to_date(path, output_path(path, output_dir, fmt))
+    ]
+    if len(paths) > len(pending):
+        print(f"{len(paths) - len(pending)} files up to date, skipping them.")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(export_file, path, output_dir, fmt, CHUNK_RECORDS, force)
+            for path in pending
+        ]
+        return [future.result() for future in futures]
+
 
-paths=os.listdir("Data")
-for path in paths:
-    df=pd.read_json(f"Data/{path}")
-    df.to_csv(f"Data/{path.replace("json","csv")}")
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="convert_to_csv",
+        description="Export the JSON files of a directory to CSV or Parquet",
+    )
+    parser.add_argument("-d", "--data-dir", default="Data")
+    parser.add_argument("-o", "--output-dir")
+    parser.add_argument("-f", "--format", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("-w", "--workers", type=int)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    if args.format == "parquet" and pa is None:
+        parser.error("parquet export needs pyarrow")
+    export_all(
+        args.data_dir,
+        args.output_dir,
+        fmt=args.format,
+        workers=args.workers,
+        force=args.force,
+    )
@@ -1,52 +1,182 @@
+import warnings
+from typing import TYPE_CHECKING
+
 import numpy as np
-import json
-import matplotlib.pyplot as plt
+from scipy.stats import rankdata
 
+from rendering import FigureJob, render, render_all
+from records import load_records
 
-def spearman_corr_heatmap(data_path: str, suffix: str):
-    # Load data
-    with open(data_path, "r") as f:
-        data_list = json.load(f)
-
-    stargazers_counts = []
-    open_issues_counts = []
-    sizes = []
-    subscribers_counts = []
-    network_counts = []
-
-    for data in data_list:
-        stargazers_counts.append(data.get("stargazers_count", 0))
-        open_issues_counts.append(data.get("open_issues_count", 0))
-        sizes.append(data.get("size", 0))
-        subscribers_counts.append(data.get("subscribers_count", 0))
-        network_counts.append(data.get("network_count", 0))
-
-    X = np.column_stack(
-        [
-            stargazers_counts,
-            open_issues_counts,
-            sizes,
-            subscribers_counts,
-            network_counts,
-        ]
+if TYPE_CHECKING:
+    from matplotlib.figure import Figure
+
+ATTRIBUTE_NAMES = [
+    "stargazers_count",
+    "open_issues_count",
+    "size",
+    "subscribers_count",
+    "network_count",
+]
+
+# upper bound on the number of elements of a bootstrap batch (B x n x k)
+MAX_BATCH_ELEMENTS = 20_000_000
+
+# bins per axis of the correlation histograms
+LOG_BINS = 40
+
+
+def load_attribute_matrix(
+    data_path: str, attribute_names: list[str] = ATTRIBUTE_NAMES
+) -> np.ndarray:
+    """Load the given numeric attributes of every repo as an (n x k) float matrix, missing values as 0"""
+    data_list = load_records(data_path)
+    return np.array(
+        [[getattr(data, name) or 0 for name in attribute_names] for data in data_list],
+        dtype=float,
+    ).reshape(len(data_list), len(attribute_names))
+
+
+def load_metric_stack(
+    data_paths: list[str], attribute_names: list[str] = ATTRIBUTE_NAMES
+) -> np.ndarray:
+    """Load the attributes of several files as one (L x n x k) array, missing values and the padding
+    up to the longest file as NaN"""
+    matrices = [
+        np.array(
+            [
+                [getattr(data, name) for name in attribute_names]
+                for data in load_records(path)
+            ],
+            dtype=float,
+        ).reshape(-1, len(attribute_names))
+        for path in data_paths
+    ]
+    X = np.full(
+        (len(matrices), max(len(m) for m in matrices), len(attribute_names)), np.nan
     )
+    for i, matrix in enumerate(matrices):
+        X[i, : len(matrix)] = matrix
+    return X
 
-    # Rank-transform
-    ranks = np.apply_along_axis(lambda x: np.argsort(np.argsort(x)), axis=0, arr=X)
 
-    # Spearman correlation
-    rho = np.corrcoef(ranks, rowvar=False)
+def batched_corrcoef(X: np.ndarray) -> np.ndarray:
+    """Pearson correlation matrices of a (B x n x k) stack of samples, returned as (B x k x k)"""
+    centered = X - X.mean(axis=-2, keepdims=True)
+    cov = np.einsum("...ni,...nj->...ij", centered, centered)
+    std = np.sqrt(np.einsum("...ii->...i", cov))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return cov / (std[..., :, None] * std[..., None, :])
 
-    # Plot heatmap
-    attribute_names = [
-        "stargazers_count",
-        "open_issues_count",
-        "size",
-        "subscribers_count",
-        "network_count",
+
+def nan_corrcoef(X: np.ndarray) -> np.ndarray:
+    """Pearson correlation matrices of a (B x n x k) stack with NaN for missing values, each pair of
+    columns correlated over the rows where both are present"""
+    present = ~np.isnan(X)
+    with warnings.catch_warnings():
+        # columns with no value at all have a NaN mean, and end up with NaN correlations
+        warnings.simplefilter("ignore", RuntimeWarning)
+        # centering first keeps the sums of squares small
+        centered = np.where(present, X - np.nanmean(X, axis=-2, keepdims=True), 0)
+    weights = present.astype(float)
+    # [i, j] sums run over the rows where columns i and j are both present
+    n = np.einsum("...ni,...nj->...ij", weights, weights)
+    sum_x = np.einsum("...ni,...nj->...ij", centered, weights)
+    sum_xx = np.einsum("...ni,...nj->...ij", centered**2, weights)
+    sum_xy = np.einsum("...ni,...nj->...ij", centered, centered)
+    sum_y, sum_yy = np.swapaxes(sum_x, -1, -2), np.swapaxes(sum_xx, -1, -2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sum_xy - sum_x * sum_y / n
+        var_x = sum_xx - sum_x**2 / n
+        var_y = sum_yy - sum_y**2 / n
+        return cov / np.sqrt(var_x * var_y)
+
+
+def correlation_matrices(X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Pearson and Spearman matrices of every slice of a NaN padded (L x n x k) stack at once.
+
+    Each column is ranked over its own present values, which gives the exact pairwise Spearman
+    coefficient whenever two columns are missing on the same rows.
+    """
+    ranks = rankdata(X, axis=-2, nan_policy="omit")
+    return nan_corrcoef(X), nan_corrcoef(ranks)
+
+
+def spearman_matrix(X: np.ndarray) -> np.ndarray:
+    """Spearman correlation between the columns of X, with tied values given their average rank"""
+    return batched_corrcoef(rankdata(X, axis=0))
+
+
+def log_histogram2d(
+    x: np.ndarray, y: np.ndarray, n_bins: int = LOG_BINS
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """2D histogram of two non-negative attributes, on bins evenly spaced in log(1 + value)"""
+    edges = [
+        np.expm1(np.linspace(0, np.log1p(max(v.max(initial=0), 1)), n_bins + 1))
+        for v in (x, y)
     ]
+    return np.histogram2d(x, y, bins=edges)
+
+
+def bootstrap_spearman(
+    X: np.ndarray,
+    n_boot: int = 1000,
+    alpha: float = 0.05,
+    seed: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Percentile bootstrap confidence intervals for every pair of the Spearman matrix.
+
+    All columns are resampled together as a (B x n x k) array, in batches bounded by MAX_BATCH_ELEMENTS.
+    """
+    rng = np.random.default_rng(seed)
+    n, k = X.shape
+    batch_size = max(1, MAX_BATCH_ELEMENTS // max(n * k, 1))
+    rhos = []
+    for start in range(0, n_boot, batch_size):
+        b = min(batch_size, n_boot - start)
+        samples = X[rng.integers(0, n, size=(b, n))]
+        rhos.append(batched_corrcoef(rankdata(samples, axis=1)))
+    rhos = np.concatenate(rhos)
+    with np.errstate(invalid="ignore"):
+        low, high = np.nanpercentile(
+            rhos, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0
+        )
+    return low, high
+
+
+def spearman_corr_heatmap_job(
+    data_path: str, suffix: str, n_boot: int = 1000, alpha: float = 0.05
+) -> FigureJob:
+    # Load data
+    X = load_attribute_matrix(data_path)
+
+    # Spearman correlation with bootstrap confidence intervals
+    low, high = bootstrap_spearman(X, n_boot=n_boot, alpha=alpha)
+    return FigureJob(
+        draw_spearman_corr_heatmap,
+        {
+            "rho": spearman_matrix(X),
+            "low": low,
+            "high": high,
+            "alpha": alpha,
+            "attribute_names": ATTRIBUTE_NAMES,
+        },
+        f"../Figures/table_corr_{suffix}.png",
+    )
+
+
+def draw_spearman_corr_heatmap(
+    rho: np.ndarray,
+    low: np.ndarray,
+    high: np.ndarray,
+    alpha: float,
+    attribute_names: list[str],
+) -> "Figure":
+    # matplotlib is only loaded to draw, hypothesis_testing uses this module without it
+    from matplotlib.figure import Figure
 
-    fig, ax = plt.subplots(figsize=(8, 6))
+    # Plot heatmap
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
     cax = ax.matshow(rho, cmap="coolwarm", vmin=-1, vmax=1)
 
     # Add colorbar
@@ -58,18 +188,31 @@ def spearman_corr_heatmap(data_path: str, suffix: str):
     ax.set_xticklabels(attribute_names, rotation=45, ha="left")
     ax.set_yticklabels(attribute_names)
 
-    # Annotate correlation values
+    # Annotate correlation values and confidence intervals
     for i in range(len(attribute_names)):
         for j in range(len(attribute_names)):
-            ax.text(j, i, f"{rho[i,j]:.2f}", va="center", ha="center", color="black")
+            label = f"{rho[i,j]:.2f}"
+            if i != j:
+                label += f"\n[{low[i,j]:.2f}, {high[i,j]:.2f}]"
+            ax.text(j, i, label, va="center", ha="center", color="black", fontsize=8)
+
+    ax.set_title(f"Spearman Correlation Heatmap ({1 - alpha:.0%} bootstrap CI)")
+    fig.tight_layout()
+    return fig
 
-    plt.title("Spearman Correlation Heatmap")
-    plt.tight_layout()
-    plt.savefig(f"../Figures/table_corr_{suffix}")
+
+def spearman_corr_heatmap(
+    data_path: str, suffix: str, n_boot: int = 1000, alpha: float = 0.05
+):
+    render(spearman_corr_heatmap_job(data_path, suffix, n_boot=n_boot, alpha=alpha))
 
 
 # Example usage
 if __name__ == "__main__":
-    spearman_corr_heatmap("Data/sampled_repo_python.json", "python")
-    spearman_corr_heatmap("Data/sampled_repo_go.json", "go")
-    spearman_corr_heatmap("Data/sampled_repo_java.json", "java")
+    render_all(
+        [
+            spearman_corr_heatmap_job("Data/sampled_repo_python.json", "python"),
+            spearman_corr_heatmap_job("Data/sampled_repo_go.json", "go"),
+            spearman_corr_heatmap_job("Data/sampled_repo_java.json", "java"),
+        ]
+    )
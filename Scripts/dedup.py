@@ -0,0 +1,116 @@
+"""Memory bounded deduplication of code search hits, with per query duplicate rates"""
+
+import hashlib
+import math
+import os
+import sqlite3
+
+import numpy as np
+
+DEDUP_DIR = "Data/.dedup"
+
+# keys are checked against the exact store in batches of this size
+FLUSH_EVERY = 1000
+
+
+class BloomFilter:
+    """Fixed size bit array answering "maybe seen" or "never seen" for 16 byte keys"""
+
+    def __init__(self, capacity: int = 5_000_000, error_rate: float = 0.01):
+        self.n_bits = max(
+            8, int(-capacity * math.log(error_rate) / math.log(2) ** 2) // 8 * 8
+        )
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.bits = np.zeros(self.n_bits // 8, dtype=np.uint8)
+
+    def _positions(self, key: bytes) -> np.ndarray:
+        # double hashing from the two halves of the key, which is already a digest
+        h1 = int.from_bytes(key[:8], "little")
+        h2 = int.from_bytes(key[8:16], "little") | 1
+        return np.array(
+            [(h1 + i * h2) % self.n_bits for i in range(self.n_hashes)],
+            dtype=np.int64,
+        )
+
+    def add(self, key: bytes) -> bool:
+        """Set the bits of the key, return True if they were all already set"""
+        positions = self._positions(key)
+        masks = np.left_shift(1, positions % 8).astype(np.uint8)
+        present = bool(np.all(self.bits[positions // 8] & masks))
+        np.bitwise_or.at(self.bits, positions // 8, masks)
+        return present
+
+
+class HitDeduplicator:
+    """Drop repeated (repo id, path, keyword) hits.
+
+    A Bloom filter answers for keys never seen, the rare positives are confirmed against an exact
+    on-disk set of 16 byte digests, so memory stays flat however large the crawl.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capacity: int = 5_000_000,
+        error_rate: float = 0.01,
+        dedup_dir: str = DEDUP_DIR,
+    ):
+        os.makedirs(dedup_dir, exist_ok=True)
+        self.path = os.path.join(dedup_dir, f"{name}.sqlite")
+        # every collection run starts from an empty set
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("CREATE TABLE seen (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.pending = set()
+        self.stats = {}
+        self.false_positives = 0
+
+    @staticmethod
+    def key(repo_id, file_path: str, keyword: str) -> bytes:
+        return hashlib.blake2b(
+            f"{repo_id}\0{file_path}\0{keyword}".encode("utf-8"), digest_size=16
+        ).digest()
+
+    def flush(self) -> None:
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO seen (key) VALUES (?)",
+            ((key,) for key in self.pending),
+        )
+        self.conn.commit()
+        self.pending.clear()
+
+    def is_duplicate(self, query: str, repo_id, file_path: str, keyword: str) -> bool:
+        """Record a hit of a query, return True if the same hit was already seen"""
+        key = self.key(repo_id, file_path, keyword)
+        stats = self.stats.setdefault(query, {"hits": 0, "duplicates": 0})
+        stats["hits"] += 1
+        if self.bloom.add(key):
+            if (
+                key in self.pending
+                or self.conn.execute(
+                    "SELECT 1 FROM seen WHERE key = ?", (key,)
+                ).fetchone()
+            ):
+                stats["duplicates"] += 1
+                return True
+            self.false_positives += 1
+        self.pending.add(key)
+        if len(self.pending) >= FLUSH_EVERY:
+            self.flush()
+        return False
+
+    def report(self) -> dict:
+        """Hits, duplicates and duplicate rate of every query"""
+        return {
+            query: {
+                **stats,
+                "duplicate_rate": stats["duplicates"] / max(stats["hits"], 1),
+            }
+            for query, stats in self.stats.items()
+        }
+
+    def close(self) -> None:
+        self.flush()
+        self.conn.close()
@@ -0,0 +1,70 @@
+"""Which repo fields each analysis needs, and the queue of repos whose detail-only fields were not fetched"""
+
+import json
+import os
+
+# fields missing from the search payload, only returned by /repos/{full_name}
+DETAIL_FIELDS = {"subscribers_count", "network_count"}
+
+LLM_FLAG_FIELDS = {"name", "description", "topics"}
+
+# fields of the repo metadata read by each analysis of the graph scripts
+ANALYSIS_FIELDS = {
+    "monthly_llm_ratio": LLM_FLAG_FIELDS | {"created_at"},
+    "total_llm_ratio": LLM_FLAG_FIELDS | {"created_at"},
+    "llm_ratio_graph": LLM_FLAG_FIELDS
+    | {"stargazers_count", "size", "network_count", "subscribers_count"},
+    "correlation_analysis": {
+        "stargazers_count",
+        "open_issues_count",
+        "size",
+        "network_count",
+        "subscribers_count",
+    },
+}
+
+
+def required_fields(analyses: list[str] | None = None) -> set[str]:
+    """Union of the fields needed by the analyses, all of them if None"""
+    if analyses is None:
+        analyses = list(ANALYSIS_FIELDS)
+    fields = set()
+    for analysis in analyses:
+        if analysis not in ANALYSIS_FIELDS:
+            raise ValueError(
+                f"Unknown analysis {analysis}, expected one of {list(ANALYSIS_FIELDS)}"
+            )
+        fields |= ANALYSIS_FIELDS[analysis]
+    return fields
+
+
+def needs_details(analyses: list[str] | None = None) -> bool:
+    """Whether the analyses need the fields that cost one /repos request per repo"""
+    return bool(required_fields(analyses) & DETAIL_FIELDS)
+
+
+class EnrichQueue:
+    """Persistent list of the repos collected without their detail-only fields"""
+
+    def __init__(self, language: str, data_dir: str = "Data"):
+        self.path = os.path.join(data_dir, f"enrich_queue_{language.lower()}.json")
+        self.pending = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                self.pending = dict.fromkeys(json.load(f))
+
+    def add(self, full_name: str) -> None:
+        self.pending[full_name] = None
+
+    def remove(self, full_name: str) -> None:
+        self.pending.pop(full_name, None)
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def __iter__(self):
+        return iter(list(self.pending))
+
+    def save(self) -> None:
+        with open(self.path, "w") as f:
+            json.dump(list(self.pending), f)
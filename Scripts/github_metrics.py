@@ -0,0 +1,276 @@
+"""Request level instrumentation shared by the GitHub collectors"""
+
+import json
+import threading
+import time
+from time import perf_counter
+
+import requests
+
+
+class RequestMetrics:
+    """Record latency, status, bytes and rate limit headroom of every request, plus time spent sleeping"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # optional shared rate budget, its acquire(endpoint) blocks until a request may be sent
+        # and returns the token to send it with
+        self.scheduler = None
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.requests = []
+            self.sleeps = {}
+            self.results = {}
+            self.events = {}
+
+    def get(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        """requests.get that records the outcome under the given endpoint label"""
+        if self.scheduler is not None:
+            token = self.scheduler.acquire(endpoint)
+            if token:
+                kwargs["headers"] = {
+                    **(kwargs.get("headers") or {}),
+                    "Authorization": f"Bearer {token}",
+                }
+        start = perf_counter()
+        try:
+            response = requests.get(url, **kwargs)
+        except requests.exceptions.RequestException:
+            self.record_request(endpoint, 0, perf_counter() - start, 0, None)
+            raise
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        self.record_request(
+            endpoint,
+            response.status_code,
+            perf_counter() - start,
+            len(response.content),
+            int(remaining) if remaining is not None else None,
+        )
+        return response
+
+    def record_request(
+        self,
+        endpoint: str,
+        status: int,
+        latency: float,
+        n_bytes: int,
+        remaining: int | None,
+    ) -> None:
+        with self._lock:
+            self.requests.append((endpoint, status, latency, n_bytes, remaining))
+
+    def sleep(self, seconds: float, reason: str) -> None:
+        """Sleep and account the time to the given reason (rate_limit, throttle, backoff...)"""
+        if seconds <= 0:
+            return
+        time.sleep(seconds)
+        with self._lock:
+            self.sleeps[reason] = self.sleeps.get(reason, 0.0) + seconds
+
+    def record_results(self, endpoint: str, n: int = 1) -> None:
+        """Count results that were actually kept by the collector"""
+        with self._lock:
+            self.results[endpoint] = self.results.get(endpoint, 0) + n
+
+    def record_event(self, event: str, n: int = 1) -> None:
+        """Count notable events such as retries or overflowed search windows"""
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + n
+
+    def merge(self, other: "RequestMetrics") -> None:
+        """Add the requests, sleeps, results and events recorded by another recorder"""
+        with other._lock:
+            started = other.started
+            requests_log = list(other.requests)
+            counters = [dict(other.sleeps), dict(other.results), dict(other.events)]
+        with self._lock:
+            self.started = min(self.started, started)
+            self.requests += requests_log
+            for own, theirs in zip([self.sleeps, self.results, self.events], counters):
+                for key, value in theirs.items():
+                    own[key] = own.get(key, 0) + value
+
+    def summary(self) -> dict:
+        with self._lock:
+            requests_log = list(self.requests)
+            sleeps = dict(self.sleeps)
+            results = dict(self.results)
+            events = dict(self.events)
+            elapsed = time.time() - self.started
+
+        endpoints = {}
+        for endpoint, status, latency, n_bytes, remaining in requests_log:
+            entry = endpoints.setdefault(
+                endpoint,
+                {
+                    "requests": 0,
+                    "status": {},
+                    "latency_s": 0.0,
+                    "max_latency_s": 0.0,
+                    "bytes": 0,
+                    "min_rate_limit_remaining": None,
+                    "last_rate_limit_remaining": None,
+                },
+            )
+            entry["requests"] += 1
+            entry["status"][str(status)] = entry["status"].get(str(status), 0) + 1
+            entry["latency_s"] += latency
+            entry["max_latency_s"] = max(entry["max_latency_s"], latency)
+            entry["bytes"] += n_bytes
+            if remaining is not None:
+                entry["last_rate_limit_remaining"] = remaining
+                if (
+                    entry["min_rate_limit_remaining"] is None
+                    or remaining < entry["min_rate_limit_remaining"]
+                ):
+                    entry["min_rate_limit_remaining"] = remaining
+
+        for endpoint, entry in endpoints.items():
+            entry["results"] = results.get(endpoint, 0)
+            entry["mean_latency_s"] = entry["latency_s"] / entry["requests"]
+            entry["results_per_request"] = entry["results"] / entry["requests"]
+            entry["failed_requests"] = entry["requests"] - entry["status"].get("200", 0)
+
+        n_requests = len(requests_log)
+        request_time = sum(r[2] for r in requests_log)
+        sleep_time = sum(sleeps.values())
+        return {
+            "elapsed_s": elapsed,
+            "request_time_s": request_time,
+            "sleep_time_s": sleep_time,
+            "other_time_s": max(elapsed - request_time - sleep_time, 0.0),
+            "sleep_fraction": sleep_time / elapsed if elapsed > 0 else 0.0,
+            "requests": n_requests,
+            "failed_requests": sum(1 for r in requests_log if r[1] != 200),
+            "bytes": sum(r[3] for r in requests_log),
+            "results": sum(results.values()),
+            "results_per_request": sum(results.values()) / max(n_requests, 1),
+            "sleeps": sleeps,
+            "events": events,
+            "endpoints": endpoints,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.summary(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Export the counters in the Prometheus text exposition format"""
+        summary = self.summary()
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_str = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(
+                    f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}"
+                )
+
+        endpoints = summary["endpoints"]
+        metric(
+            "github_requests_total",
+            "counter",
+            "GitHub API requests by endpoint and status code.",
+            [
+                ({"endpoint": e, "status": s}, n)
+                for e, entry in endpoints.items()
+                for s, n in entry["status"].items()
+            ],
+        )
+        metric(
+            "github_request_seconds_sum",
+            "counter",
+            "Total latency of GitHub API requests.",
+            [({"endpoint": e}, entry["latency_s"]) for e, entry in endpoints.items()],
+        )
+        metric(
+            "github_response_bytes_total",
+            "counter",
+            "Bytes received from the GitHub API.",
+            [({"endpoint": e}, entry["bytes"]) for e, entry in endpoints.items()],
+        )
+        metric(
+            "github_rate_limit_remaining",
+            "gauge",
+            "Last X-RateLimit-Remaining value seen.",
+            [
+                ({"endpoint": e}, entry["last_rate_limit_remaining"])
+                for e, entry in endpoints.items()
+                if entry["last_rate_limit_remaining"] is not None
+            ],
+        )
+        metric(
+            "github_results_total",
+            "counter",
+            "Results kept by the collectors.",
+            [({"endpoint": e}, entry["results"]) for e, entry in endpoints.items()],
+        )
+        metric(
+            "github_sleep_seconds_total",
+            "counter",
+            "Time spent sleeping by reason.",
+            [({"reason": r}, s) for r, s in summary["sleeps"].items()],
+        )
+        metric(
+            "github_events_total",
+            "counter",
+            "Collector events such as retries and overflowed windows.",
+            [({"event": e}, n) for e, n in summary["events"].items()],
+        )
+        metric(
+            "github_elapsed_seconds",
+            "gauge",
+            "Time since the metrics were reset.",
+            [({}, summary["elapsed_s"])],
+        )
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, path_prefix: str) -> None:
+        """Write the JSON summary and Prometheus export, and print the efficiency report"""
+        summary = self.summary()
+        with open(f"{path_prefix}.json", "w") as f:
+            json.dump(summary, f, indent=2)
+        with open(f"{path_prefix}.prom", "w") as f:
+            f.write(self.to_prometheus())
+        print(
+            f"{summary['requests']} requests ({summary['failed_requests']} failed), "
+            f"{summary['results']} results, {summary['results_per_request']:.2f} results per request"
+        )
+        print(
+            f"elapsed {summary['elapsed_s']:.1f}s: requests {summary['request_time_s']:.1f}s, "
+            f"sleeping {summary['sleep_time_s']:.1f}s ({summary['sleep_fraction']:.1%})"
+        )
+        for event, n in summary["events"].items():
+            print(f"{event}: {n}")
+
+
+class ThreadMetrics:
+    """The recorder of the current thread, the shared default one unless use() bound another.
+
+    The collectors record through the module level METRICS, so collectors running concurrently
+    (orchestrate) each bind their own recorder to keep their reports apart.
+    """
+
+    def __init__(self, default: RequestMetrics):
+        object.__setattr__(self, "_default", default)
+        object.__setattr__(self, "_local", threading.local())
+
+    def use(self, recorder: RequestMetrics | None) -> None:
+        """Bind a recorder to the current thread, None to go back to the default one"""
+        self._local.recorder = recorder
+
+    def current(self) -> RequestMetrics:
+        return getattr(self._local, "recorder", None) or self._default
+
+    def __getattr__(self, name: str):
+        return getattr(self.current(), name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self.current(), name, value)
+
+
+METRICS = ThreadMetrics(RequestMetrics())
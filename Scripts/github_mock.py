@@ -0,0 +1,506 @@
+"""Local stand-in for the GitHub REST API used to test and benchmark the collectors offline"""
+
+import io
+import json
+import random
+import re
+import tarfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MAX_SEARCH_RESULTS = 1000
+MAX_PER_PAGE = 100
+
+# requests allowed per window, window length in seconds (GitHub defaults)
+RATE_LIMITS = {
+    "search": (30, 60),
+    "code_search": (10, 60),
+    "core": (5000, 3600),
+}
+
+DEFAULT_KEYWORDS = [
+    "gpt-4o",
+    "gpt-4o-mini",
+    "gpt-3.5-turbo",
+    "claude-3-5-sonnet-latest",
+    "gemini-2.5-flash",
+    "mistral-medium-2508",
+    "grok-3",
+]
+
+DEFAULT_LIBRARIES = ["OpenAI", "Anthropic", "Google", "Mistral", "xAI"]
+
+DEFAULT_LANGUAGES = ["Python", "Java", "Go"]
+
+FILE_EXTENSIONS = {"python": "py", "java": "java", "go": "go"}
+
+# import line written in the synthetic sources for each library
+LIBRARY_IMPORTS = {
+    "OpenAI": "import openai",
+    "Anthropic": "import anthropic",
+    "Google": "import google.genai",
+    "Mistral": "import mistralai",
+    "xAI": "import xai_sdk",
+}
+
+
+class VirtualClock:
+    """Clock whose sleep advances an offset instead of blocking, so rate limit waits cost no wall time"""
+
+    def __init__(self):
+        self.offset = 0.0
+        self.slept = 0.0
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return time.time() + self.offset
+
+    def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        with self._lock:
+            self.offset += seconds
+            self.slept += seconds
+
+
+class RealClock:
+    """Clock backed by the time module that still keeps track of time spent sleeping"""
+
+    def __init__(self):
+        self.slept = 0.0
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        time.sleep(seconds)
+        with self._lock:
+            self.slept += seconds
+
+
+class RateLimiter:
+    """Fixed window rate limiter emulating the X-RateLimit-* headers of the GitHub API"""
+
+    def __init__(self, clock, limits: dict | None = None):
+        self.clock = clock
+        self.limits = dict(RATE_LIMITS if limits is None else limits)
+        self.windows = {}
+        self._lock = threading.Lock()
+
+    def consume(self, resource: str) -> tuple[bool, dict]:
+        """Consume one request from a resource, returning whether it is allowed and the headers to send"""
+        limit, length = self.limits[resource]
+        now = self.clock.time()
+        with self._lock:
+            reset, used = self.windows.get(resource, (now + length, 0))
+            if now >= reset:
+                reset, used = now + length, 0
+            allowed = used < limit
+            if allowed:
+                used += 1
+            self.windows[resource] = (reset, used)
+        headers = {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": str(limit - used),
+            "X-RateLimit-Used": str(used),
+            "X-RateLimit-Reset": str(int(reset)),
+            "X-RateLimit-Resource": resource,
+        }
+        return allowed, headers
+
+
+class MockPopulation:
+    """Deterministic synthetic set of repositories, with source files referencing model and library keywords"""
+
+    def __init__(
+        self,
+        languages: list[str] | None = None,
+        repos_per_language: int = 1200,
+        starting_date: date = date(2023, 1, 1),
+        ending_date: date = date(2023, 7, 1),
+        keywords: list[str] | None = None,
+        libraries: list[str] | None = None,
+        missing_ratio: float = 0.01,
+        seed: int = 0,
+    ):
+        self.keywords = list(DEFAULT_KEYWORDS if keywords is None else keywords)
+        self.libraries = list(DEFAULT_LIBRARIES if libraries is None else libraries)
+        self.repos = []
+        self.by_name = {}
+        self.missing = set()
+
+        rng = random.Random(seed)
+        span = (ending_date - starting_date).total_seconds()
+        start = datetime(
+            starting_date.year,
+            starting_date.month,
+            starting_date.day,
+            tzinfo=timezone.utc,
+        )
+        repo_id = 1
+        for language in languages or DEFAULT_LANGUAGES:
+            for n in range(repos_per_language):
+                owner = f"owner{rng.randrange(repos_per_language // 3 + 1)}"
+                name = f"{language.lower().replace('#', 'sharp')}-project-{n}"
+                created_at = start + timedelta(seconds=rng.random() * span)
+                stars = int(rng.paretovariate(1.2)) - 1
+                files = {}
+                if rng.random() < 0.3:
+                    for f in range(rng.randint(1, 4)):
+                        referenced = set(rng.sample(self.keywords, rng.randint(1, 2)))
+                        referenced.update(rng.sample(self.libraries, 1))
+                        extension = FILE_EXTENSIONS.get(
+                            language.lower(), language.lower()
+                        )
+                        files[f"src/module_{f}.{extension}"] = referenced
+                repo = {
+                    "id": repo_id,
+                    "name": name,
+                    "full_name": f"{owner}/{name}",
+                    "html_url": f"https://github.com/{owner}/{name}",
+                    "description": rng.choice(
+                        ["An LLM chatbot", "A web framework", "CLI tool", None]
+                    ),
+                    "language": language,
+                    "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "stargazers_count": stars,
+                    "open_issues_count": rng.randrange(50),
+                    "size": int(rng.lognormvariate(5, 1.5)) % 5000,
+                    "topics": rng.sample(["llm", "ai", "web", "cli", "rag"], 2),
+                    "license": {"key": rng.choice(["mit", "apache-2.0"])},
+                    "owner": {
+                        "login": owner,
+                        "type": rng.choice(["User", "Organization"]),
+                    },
+                    "archived": rng.random() < 0.05,
+                    "subscribers_count": rng.randrange(max(stars // 10, 1) + 1),
+                    "network_count": rng.randrange(max(stars // 5, 1) + 1),
+                    "files": files,
+                }
+                repo_id += 1
+                self.repos.append(repo)
+                self.by_name[repo["full_name"]] = repo
+                if rng.random() < missing_ratio:
+                    self.missing.add(repo["full_name"])
+
+    def languages(self) -> list[str]:
+        return sorted({r["language"] for r in self.repos})
+
+    def keyword_dict(self) -> dict[str, str]:
+        """Model keyword dict in the format written by list_models"""
+        return {f'"{keyword}"': keyword for keyword in self.keywords}
+
+    def combined_repos(self, language: str) -> list[dict]:
+        """Records in the format written by combine, for feeding attribute_mining"""
+        return [
+            {"fullname": r["full_name"], "html_url": r["html_url"], "tags": []}
+            for r in self.repos
+            if r["language"].lower() == language.lower()
+        ]
+
+
+def search_payload(repo: dict) -> dict:
+    """Fields returned for a repository by the search endpoints"""
+    return {
+        k: v
+        for k, v in repo.items()
+        if k not in ("files", "subscribers_count", "network_count")
+    }
+
+
+def detail_payload(repo: dict) -> dict:
+    """Fields returned for a repository by the /repos/{full_name} endpoint"""
+    return {k: v for k, v in repo.items() if k != "files"}
+
+
+def tarball_payload(repo: dict, libraries: list[str]) -> bytes:
+    """Gzipped tarball of the synthetic sources of a repo, under a single top level directory"""
+    buffer = io.BytesIO()
+    top = f"{repo['full_name'].replace('/', '-')}-{repo['id']:07x}"
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for path, referenced in sorted(repo["files"].items()):
+            lines = [
+                (
+                    LIBRARY_IMPORTS.get(keyword, f"import {keyword.lower()}")
+                    if keyword in libraries
+                    else f'model = "{keyword}"'
+                )
+                for keyword in sorted(referenced)
+            ]
+            content = ("\n".join(lines) + "\n").encode("utf-8")
+            info = tarfile.TarInfo(f"{top}/{path}")
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def parse_range(value: str) -> tuple[float, float]:
+    """Parse a GitHub search range qualifier (a..b, a..*, >=a, <b, a) into inclusive numeric bounds"""
+    if ".." in value:
+        low, high = value.split("..", 1)
+        return (
+            float("-inf") if low in ("", "*") else float(low),
+            float("inf") if high in ("", "*") else float(high),
+        )
+    for prefix, bounds in (
+        (">=", lambda v: (v, float("inf"))),
+        ("<=", lambda v: (float("-inf"), v)),
+        (">", lambda v: (v + 1, float("inf"))),
+        ("<", lambda v: (float("-inf"), v - 1)),
+    ):
+        if value.startswith(prefix):
+            return bounds(float(value[len(prefix) :]))
+    return float(value), float(value)
+
+
+def parse_date_range(value: str) -> tuple[str, str]:
+    """Parse a created:a..b qualifier into inclusive ISO date string bounds"""
+    if ".." in value:
+        low, high = value.split("..", 1)
+        return (
+            low if low not in ("", "*") else "0000",
+            high if high not in ("", "*") else "9999",
+        )
+    if value.startswith(">="):
+        return value[2:], "9999"
+    if value.startswith("<="):
+        return "0000", value[2:]
+    return value, value
+
+
+def parse_query(query: str) -> tuple[dict[str, str], list[str]]:
+    """Split a search query into qualifiers and quoted/bare terms"""
+    qualifiers = {}
+    terms = []
+    for quoted, bare in re.findall(r'"((?:[^"\\]|\\.)*)"|(\S+)', query):
+        if bare and ":" in bare:
+            key, value = bare.split(":", 1)
+            qualifiers[key.lower()] = value
+        else:
+            term = (quoted or bare).replace("\\", "").strip('"')
+            if term:
+                terms.append(term)
+    return qualifiers, terms
+
+
+def repo_matches(repo: dict, qualifiers: dict[str, str]) -> bool:
+    if (
+        "language" in qualifiers
+        and repo["language"].lower() != qualifiers["language"].lower()
+    ):
+        return False
+    if "created" in qualifiers:
+        low, high = parse_date_range(qualifiers["created"])
+        if not (
+            low <= repo["created_at"][: len(low)]
+            and repo["created_at"][: len(high)] <= high
+        ):
+            return False
+    for qualifier, field in (("stars", "stargazers_count"), ("size", "size")):
+        if qualifier in qualifiers:
+            low, high = parse_range(qualifiers[qualifier])
+            if not (low <= repo[field] <= high):
+                return False
+    return True
+
+
+class MockGitHubServer:
+    """Threaded HTTP server serving /search/repositories, /search/code, /repos/{full_name} and its tarball"""
+
+    def __init__(
+        self,
+        population: MockPopulation,
+        clock=None,
+        limits: dict | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.population = population
+        self.clock = clock or RealClock()
+        self.limiter = RateLimiter(self.clock, limits)
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockGitHubServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def record(self, endpoint: str, status: int, n_items: int) -> None:
+        with self._lock:
+            entry = self.stats.setdefault(
+                endpoint, {"requests": 0, "items": 0, "wasted": 0, "status": {}}
+            )
+            entry["requests"] += 1
+            entry["items"] += n_items
+            entry["status"][str(status)] = entry["status"].get(str(status), 0) + 1
+            if status != 200 or n_items == 0:
+                entry["wasted"] += 1
+
+    def totals(self) -> dict:
+        """Request, item and wasted request counts summed over all endpoints"""
+        with self._lock:
+            return {
+                key: sum(entry[key] for entry in self.stats.values())
+                for key in ("requests", "items", "wasted")
+            }
+
+    def search(self, qualifiers: dict, terms: list[str], params: dict, code: bool):
+        repos = [r for r in self.population.repos if repo_matches(r, qualifiers)]
+        if code:
+            items = [
+                {
+                    "name": path.rsplit("/", 1)[-1],
+                    "path": path,
+                    "sha": f"{r['id']:040x}",
+                    "repository": search_payload(r),
+                }
+                for r in repos
+                for path, referenced in sorted(r["files"].items())
+                if all(term in referenced for term in terms)
+            ]
+        else:
+            if params.get("sort") == "stars":
+                reverse = params.get("order", "desc") == "desc"
+                repos = sorted(
+                    repos, key=lambda r: r["stargazers_count"], reverse=reverse
+                )
+            items = [search_payload(r) for r in repos]
+
+        per_page = min(int(params.get("per_page", 30)), MAX_PER_PAGE)
+        page = max(int(params.get("page", 1)), 1)
+        first = (page - 1) * per_page
+        if first >= MAX_SEARCH_RESULTS:
+            return 422, {
+                "message": "Only the first 1000 search results are available",
+                "documentation_url": "https://docs.github.com/v3/search/",
+            }
+        last = min(first + per_page, MAX_SEARCH_RESULTS)
+        return 200, {
+            "total_count": len(items),
+            "incomplete_results": False,
+            "items": items[first:last],
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status: int, body: dict, headers: dict) -> None:
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                if url.path == "/search/repositories":
+                    endpoint, resource = "search/repositories", "search"
+                elif url.path == "/search/code":
+                    endpoint, resource = "search/code", "code_search"
+                elif url.path.startswith("/repos/") and url.path.endswith("/tarball"):
+                    endpoint, resource = "repos/tarball", "core"
+                elif url.path.startswith("/repos/"):
+                    endpoint, resource = "repos", "core"
+                else:
+                    server.record("unknown", 404, 0)
+                    self.send_json(404, {"message": "Not Found"}, {})
+                    return
+
+                allowed, headers = server.limiter.consume(resource)
+                if not allowed:
+                    server.record(endpoint, 403, 0)
+                    self.send_json(
+                        403,
+                        {"message": f"API rate limit exceeded for {resource}."},
+                        headers,
+                    )
+                    return
+
+                if resource == "core":
+                    full_name = (
+                        url.path.removeprefix("/repos/")
+                        .strip("/")
+                        .removesuffix("/tarball")
+                    )
+                    repo = server.population.by_name.get(full_name)
+                    if repo is None or full_name in server.population.missing:
+                        server.record(endpoint, 404, 0)
+                        self.send_json(404, {"message": "Not Found"}, headers)
+                        return
+                    server.record(endpoint, 200, 1)
+                    if endpoint == "repos/tarball":
+                        payload = tarball_payload(repo, server.population.libraries)
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/x-gzip")
+                        self.send_header("Content-Length", str(len(payload)))
+                        for key, value in headers.items():
+                            self.send_header(key, value)
+                        self.end_headers()
+                        self.wfile.write(payload)
+                        return
+                    self.send_json(200, detail_payload(repo), headers)
+                    return
+
+                qualifiers, terms = parse_query(params.get("q", ""))
+                status, body = server.search(
+                    qualifiers, terms, params, code=resource == "code_search"
+                )
+                server.record(endpoint, status, len(body.get("items", [])))
+                self.send_json(status, body, headers)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="github_mock",
+        description="Serve a synthetic GitHub API for offline runs of the collectors",
+    )
+    parser.add_argument("-p", "--port", default=8765, type=int)
+    parser.add_argument("-n", "--repos", default=1200, type=int)
+    parser.add_argument("-s", "--seed", default=0, type=int)
+    args = parser.parse_args()
+    population = MockPopulation(repos_per_language=args.repos, seed=args.seed)
+    server = MockGitHubServer(population, port=args.port)
+    print(f"Serving mock GitHub API on {server.url}, set GITHUB_API_URL to use it")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
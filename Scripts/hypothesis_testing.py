@@ -0,0 +1,259 @@
+"""Run normality and pairwise location tests for any set of metrics across language samples"""
+
+import argparse
+import csv
+import json
+from itertools import combinations
+
+import numpy as np
+from scipy.stats import anderson, mannwhitneyu, rankdata
+
+from correlation import load_attribute_matrix
+
+DEFAULT_GROUPS = {
+    "python": "Data/sampled_repo_python.json",
+    "java": "Data/sampled_repo_java.json",
+    "go": "Data/sampled_repo_go.json",
+}
+DEFAULT_METRICS = ["size", "stargazers_count"]
+
+# upper bound on the number of elements of a permutation batch, the B x n random keys and their
+# argsort plus the B x n_a x k gathered ranks
+MAX_BATCH_ELEMENTS = 20_000_000
+
+TABLE_COLUMNS = [
+    "test",
+    "metric",
+    "group_a",
+    "group_b",
+    "alternative",
+    "n_a",
+    "n_b",
+    "mean_a",
+    "std_a",
+    "mean_b",
+    "std_b",
+    "statistic",
+    "p_value",
+    "p_permutation",
+    "p_adjusted",
+    "reject",
+]
+
+
+def load_groups(
+    group_paths: dict[str, str], metrics: list[str]
+) -> dict[str, np.ndarray]:
+    """Load an (n x k) matrix of the given metrics for every group"""
+    return {
+        group: load_attribute_matrix(path, metrics)
+        for group, path in group_paths.items()
+    }
+
+
+def permutation_pvalues(
+    a: np.ndarray,
+    b: np.ndarray,
+    alternative: str = "two-sided",
+    n_perm: int = 10000,
+    seed: int = 0,
+) -> np.ndarray:
+    """Permutation p-values of the Mann-Whitney U statistic for every column of a and b.
+
+    Ranks of the pooled sample do not change under relabelling, so they are computed once and
+    each batch of permutations only gathers and sums the ranks falling in the first group.
+    """
+    rng = np.random.default_rng(seed)
+    n_a, k = a.shape
+    pooled_ranks = rankdata(np.vstack([a, b]), axis=0)
+    n = pooled_ranks.shape[0]
+    offset = n_a * (n_a + 1) / 2
+    center = n_a * (n - n_a) / 2
+
+    observed = pooled_ranks[:n_a].sum(axis=0) - offset
+    hits = np.zeros(k)
+    batch_size = max(1, MAX_BATCH_ELEMENTS // max(n + n_a * k, 1))
+    for start in range(0, n_perm, batch_size):
+        size = min(batch_size, n_perm - start)
+        labels = np.argsort(rng.random((size, n)), axis=1)[:, :n_a]
+        permuted = pooled_ranks[labels].sum(axis=1) - offset
+        if alternative == "less":
+            hits += (permuted <= observed).sum(axis=0)
+        elif alternative == "greater":
+            hits += (permuted >= observed).sum(axis=0)
+        else:
+            hits += (np.abs(permuted - center) >= np.abs(observed - center)).sum(axis=0)
+    return (hits + 1) / (n_perm + 1)
+
+
+def adjust_pvalues(p_values: np.ndarray, method: str = "holm") -> np.ndarray:
+    """Correct p-values for multiple comparisons with Holm-Bonferroni, Benjamini-Hochberg or Bonferroni"""
+    p = np.asarray(p_values, dtype=float)
+    m = len(p)
+    if m == 0 or method == "none":
+        return p
+    if method == "bonferroni":
+        return np.minimum(p * m, 1)
+    order = np.argsort(p)
+    ranked = p[order]
+    if method == "holm":
+        adjusted = np.maximum.accumulate(ranked * (m - np.arange(m)))
+    elif method == "bh":
+        adjusted = np.minimum.accumulate((ranked * m / np.arange(1, m + 1))[::-1])[::-1]
+    else:
+        raise ValueError(f"unknown correction method {method}")
+    result = np.empty(m)
+    result[order] = np.minimum(adjusted, 1)
+    return result
+
+
+def run_tests(
+    groups: dict[str, np.ndarray],
+    metrics: list[str],
+    pairs: list[tuple[str, str]] | None = None,
+    alternative: str = "two-sided",
+    n_perm: int = 10000,
+    correction: str = "holm",
+    alpha: float = 0.05,
+) -> list[dict]:
+    """Anderson-Darling per group and metric, then Mann-Whitney U and permutation tests per pair.
+
+    Every pair is tested on all metrics at once, p-values of the pairwise tests are corrected together.
+    """
+    rows = []
+    for group, X in groups.items():
+        for j, metric in enumerate(metrics):
+            # p-value interpolated from the tables of the test, clipped to [0.01, 0.15]
+            res = anderson(X[:, j], method="interpolate")
+            rows.append(
+                {
+                    "test": "anderson_darling",
+                    "metric": metric,
+                    "group_a": group,
+                    "n_a": len(X),
+                    "mean_a": X[:, j].mean(),
+                    "std_a": X[:, j].std(ddof=1),
+                    "statistic": res.statistic,
+                    "p_value": res.pvalue,
+                    "reject": bool(res.pvalue < alpha),
+                }
+            )
+
+    pair_rows = []
+    for group_a, group_b in pairs or list(combinations(groups, 2)):
+        a, b = groups[group_a], groups[group_b]
+        u, p = mannwhitneyu(a, b, alternative=alternative, axis=0)
+        p_perm = permutation_pvalues(a, b, alternative=alternative, n_perm=n_perm)
+        for j, metric in enumerate(metrics):
+            pair_rows.append(
+                {
+                    "test": "mann_whitney_u",
+                    "metric": metric,
+                    "group_a": group_a,
+                    "group_b": group_b,
+                    "alternative": alternative,
+                    "n_a": len(a),
+                    "n_b": len(b),
+                    "mean_a": a[:, j].mean(),
+                    "std_a": a[:, j].std(ddof=1),
+                    "mean_b": b[:, j].mean(),
+                    "std_b": b[:, j].std(ddof=1),
+                    "statistic": u[j],
+                    "p_value": p[j],
+                    "p_permutation": p_perm[j],
+                }
+            )
+
+    adjusted = adjust_pvalues(np.array([r["p_value"] for r in pair_rows]), correction)
+    for row, p_adj in zip(pair_rows, adjusted):
+        row["p_adjusted"] = p_adj
+        row["reject"] = bool(p_adj < alpha)
+
+    table = rows + pair_rows
+    for row in table:
+        for column in TABLE_COLUMNS:
+            row.setdefault(column, None)
+    return table
+
+
+def print_table(table: list[dict]) -> None:
+    print("===== Anderson-Darling test =====")
+    for r in table:
+        if r["test"] == "anderson_darling":
+            print(
+                f"{r['group_a']:<12}{r['metric']:<20} A2={r['statistic']:.4f}, "
+                f"p={r['p_value']:.2f}{' *' if r['reject'] else ''}, "
+                f"mean {r['mean_a']:.2f}, std {r['std_a']:.2f}, n={r['n_a']}"
+            )
+    print("\n===== Mann–Whitney U Tests =====")
+    for r in table:
+        if r["test"] == "mann_whitney_u":
+            print(
+                f"{r['group_a']} vs {r['group_b']} ({r['metric']}, {r['alternative']}): "
+                f"U={r['statistic']:.1f}, p={r['p_value']:.6f}, "
+                f"p_perm={r['p_permutation']:.6f}, p_adj={r['p_adjusted']:.6f}"
+                f"{' *' if r['reject'] else ''}"
+            )
+
+
+def write_table(table: list[dict], output_path: str) -> None:
+    """Write the results table as CSV or JSON depending on the file extension"""
+    if output_path.endswith(".json"):
+        with open(output_path, "w") as f:
+            json.dump(table, f, indent=2, default=float)
+        return
+    with open(output_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=TABLE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="hypothesis_testing",
+        description="Anderson-Darling, Mann-Whitney U and permutation tests for metrics across languages",
+    )
+    parser.add_argument("-m", "--metrics", nargs="+", default=DEFAULT_METRICS)
+    parser.add_argument(
+        "-g",
+        "--groups",
+        nargs="+",
+        default=[f"{k}={v}" for k, v in DEFAULT_GROUPS.items()],
+        help="groups as name=path pairs, the first one is compared to the others unless --all-pairs is set",
+    )
+    # the study tests whether python repos are smaller and less starred than java and go ones
+    parser.add_argument(
+        "-a",
+        "--alternative",
+        default="less",
+        choices=["two-sided", "less", "greater"],
+    )
+    parser.add_argument(
+        "--all-pairs",
+        action="store_true",
+        help="test every pair of groups instead of the first one against the others",
+    )
+    parser.add_argument("-p", "--permutations", default=10000, type=int)
+    parser.add_argument(
+        "-c",
+        "--correction",
+        default="holm",
+        choices=["holm", "bh", "bonferroni", "none"],
+    )
+    parser.add_argument("-o", "--output", default="Data/hypothesis_tests.csv")
+    args = parser.parse_args()
+
+    group_paths = dict(g.split("=", 1) for g in args.groups)
+    groups = load_groups(group_paths, args.metrics)
+    names = list(groups)
+    pairs = None if args.all_pairs else [(names[0], other) for other in names[1:]]
+    table = run_tests(
+        groups,
+        args.metrics,
+        pairs=pairs,
+        alternative=args.alternative,
+        n_perm=args.permutations,
+        correction=args.correction,
+    )
+    print_table(table)
+    write_table(table, args.output)
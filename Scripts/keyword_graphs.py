@@ -1,7 +1,17 @@
-import matplotlib.pyplot as plt
+from itertools import combinations
+
 import numpy as np
-import json
-from datetime import datetime
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+
+from correlation import (
+    ATTRIBUTE_NAMES,
+    correlation_matrices,
+    load_metric_stack,
+    log_histogram2d,
+)
+from rendering import FigureJob, render, render_all
+from records import RepoMetadata, load_records
 
 KEYWORD_LIST = [
     "llm",
@@ -46,117 +56,248 @@ KEYWORD_LIST = [
     "rag",
 ]
 
+RATIO_METRICS = ["stargazers_count", "size", "network_count", "subscribers_count"]
 
-def monthly_llm_ratio_graph(language: str) -> tuple[list[int], list[int]]:
-    """Collect the proportion of LLM-related project by month"""
-    llm_projects = {}
-    projects = {}
-    with open(f"Data/{language.lower()}_repo_metadata.json", "r") as f:
-        data_dicts = json.load(f)
-        for i in range(len(data_dicts)):
-            month_key = datetime.fromisoformat(data_dicts[i]["created_at"]).strftime(
-                "%Y-%m"
+METRIC_LABELS = {
+    "stargazers_count": "Number of Stars",
+    "open_issues_count": "Open Issues",
+    "size": "Size (MB)",
+    "subscribers_count": "Number of Subscribers (Watchers)",
+    "network_count": "Network Count (Forks)",
+}
+
+
+def is_llm_repo(repo: RepoMetadata) -> bool:
+    """Classify a repo as LLM-related from its topics, description and name"""
+    topics = repo.topics or []
+    description = (repo.description or "").lower()
+    name = (repo.name or "").lower()
+    return any(
+        (topic in topics) or (topic in description) or (topic in name)
+        for topic in KEYWORD_LIST
+    )
+
+
+def load_metadata_columns(language: str, metrics: list[str]) -> dict[str, np.ndarray]:
+    """Load the given numeric metrics, the creation month and the LLM flag of every repo as arrays.
+
+    Missing metric values become NaN, missing creation dates NaT.
+    """
+    data_dicts = load_records(f"Data/{language.lower()}_repo_metadata.json")
+    columns = {
+        metric: np.array([getattr(d, metric) for d in data_dicts], dtype=float)
+        for metric in metrics
+    }
+    # ISO timestamps start with YYYY-MM, so truncating the strings parses the month directly
+    columns["month"] = (
+        np.array([d.created_at or "NaT" for d in data_dicts], dtype=str)
+        .astype("U7")
+        .astype("datetime64[M]")
+    )
+    columns["is_llm"] = np.fromiter(
+        (is_llm_repo(d) for d in data_dicts), dtype=bool, count=len(data_dicts)
+    )
+    return columns
+
+
+def load_monthly_llm_counts(languages: list[str]) -> dict[str, np.ndarray]:
+    """Monthly project and LLM project counts of the languages, from the warehouse.
+
+    The metadata files that changed since they were last loaded are reloaded first.
+    """
+    # imported here, the warehouse imports is_llm_repo from this module
+    import warehouse
+
+    conn = warehouse.connect()
+    try:
+        for language in languages:
+            warehouse.load_metadata(
+                conn,
+                f"Data/{language.lower()}_repo_metadata.json",
+                language.lower(),
             )
-            if any(
-                (topic in (data_dicts[i]["topics"] or []))
-                or (topic in (data_dicts[i]["description"] or "").lower())
-                or (topic in (data_dicts[i]["name"] or "").lower())
-                for topic in KEYWORD_LIST
-            ):
-                llm_projects[month_key] = llm_projects.get(month_key, 0) + 1
-            projects[month_key] = projects.get(month_key, 0) + 1
-
-    months = sorted(projects.keys())
-    projects_n = [projects[m] for m in months]
-    llm_projects_n = [llm_projects.get(m, 0) for m in months]
-    llm_fraction = [llm_projects.get(m, 0) / projects[m] for m in months]
-    other_fraction = [1 - x for x in llm_fraction]
+        return warehouse.monthly_llm_counts(conn, languages)
+    finally:
+        conn.close()
+
+
+def monthly_llm_ratio_job(
+    language: str, counts: dict[str, np.ndarray] | None = None
+) -> FigureJob:
+    if counts is None:
+        counts = load_monthly_llm_counts([language])
+    rows = counts["language"] == language
+    return FigureJob(
+        draw_monthly_llm_ratio,
+        {
+            "language": language,
+            "months": [str(m) for m in counts["month"][rows]],
+            "llm_fraction": counts["llm_projects"][rows] / counts["projects"][rows],
+        },
+        f"../Figures/{language.lower()}_llm_fraction.png",
+    )
+
+
+def draw_monthly_llm_ratio(
+    language: str, months: list[str], llm_fraction: np.ndarray
+) -> Figure:
+    other_fraction = 1 - llm_fraction
 
     x = np.arange(len(months))
-    plt.figure(figsize=(12, 6))
-    plt.bar(x, llm_fraction, color="skyblue", label="LLM-related projects")
-    plt.bar(
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    ax.bar(x, llm_fraction, color="skyblue", label="LLM-related projects")
+    ax.bar(
         x,
         other_fraction,
         bottom=llm_fraction,
         color="lightgray",
         label="Other projects",
     )
-    plt.ylim(0, 1)
-    plt.xlabel("Month")
-    plt.ylabel("Fraction")
-    plt.title(f"Fraction of LLM-related GitHub Projects in {language} per Month")
-    plt.xticks(x, months, rotation=80)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(f"../Figures/{language.lower()}_llm_fraction.png")
-    plt.close()
+    ax.set_ylim(0, 1)
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Fraction")
+    ax.set_title(f"Fraction of LLM-related GitHub Projects in {language} per Month")
+    ax.set_xticks(x)
+    ax.set_xticklabels(months, rotation=80)
+    ax.legend()
+    fig.tight_layout()
+    return fig
 
-    return projects_n, llm_projects_n
 
+def monthly_llm_ratio_graph(language: str, counts: dict[str, np.ndarray] | None = None):
+    """Collect the proportion of LLM-related project by month"""
+    render(monthly_llm_ratio_job(language, counts))
 
-def total_llm_ratio_graph(
-    language_list: list[str],
-    n_repos_language: list[int],
-    n_llm_repo_language: list[int],
-):
-    """Collect the proportion of LLM-related project by language"""
-    llm_repo_ratio_language = [
-        n_llm_repo_language[i] / n_repos_language[i] for i in range(len(language_list))
-    ]
-    other_repo_ratio_language = [1 - llm_ratio for llm_ratio in llm_repo_ratio_language]
+
+def total_llm_ratio_job(
+    counts: dict[str, np.ndarray], language_list: list[str] | None = None
+) -> FigureJob:
+    if language_list is None:
+        language_list = list(np.unique(counts["language"]))
+    n_repos_language = np.array(
+        [counts["projects"][counts["language"] == l].sum() for l in language_list]
+    )
+    n_llm_repo_language = np.array(
+        [counts["llm_projects"][counts["language"] == l].sum() for l in language_list]
+    )
+    return FigureJob(
+        draw_total_llm_ratio,
+        {
+            "language_list": list(language_list),
+            "llm_repo_ratio_language": n_llm_repo_language
+            / np.maximum(n_repos_language, 1),
+        },
+        "../Figures/llm_fraction_languages.png",
+    )
+
+
+def draw_total_llm_ratio(
+    language_list: list[str], llm_repo_ratio_language: np.ndarray
+) -> Figure:
+    other_repo_ratio_language = 1 - llm_repo_ratio_language
 
     x = np.arange(len(language_list))
-    plt.figure(figsize=(12, 6))
-    plt.bar(x, llm_repo_ratio_language, color="skyblue", label="LLM-related projects")
-    plt.bar(
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    ax.bar(x, llm_repo_ratio_language, color="skyblue", label="LLM-related projects")
+    ax.bar(
         x,
         other_repo_ratio_language,
         bottom=llm_repo_ratio_language,
         color="lightgray",
         label="Other projects",
     )
-    plt.ylim(0, 1)
-    plt.xlabel("Language")
-    plt.ylabel("Fraction")
-    plt.title(f"Fraction of LLM-related GitHub Projects by Programming Language")
-    plt.xticks(x, language_list)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(f"../Figures/llm_fraction_languages.png")
-    plt.close()
+    ax.set_ylim(0, 1)
+    ax.set_xlabel("Language")
+    ax.set_ylabel("Fraction")
+    ax.set_title(f"Fraction of LLM-related GitHub Projects by Programming Language")
+    ax.set_xticks(x)
+    ax.set_xticklabels(language_list)
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+def total_llm_ratio_graph(
+    counts: dict[str, np.ndarray], language_list: list[str] | None = None
+):
+    """Collect the proportion of LLM-related project by language"""
+    render(total_llm_ratio_job(counts, language_list))
+
+
+def llm_ratio_bins(
+    values: np.ndarray, is_llm: np.ndarray, n_bins: int = 7
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Count projects and LLM projects in n_bins power-spaced intervals of a metric"""
+    valid = ~np.isnan(values)
+    values, is_llm = values[valid], is_llm[valid]
+    min_value, max_value = values.min(), values.max()
+    intervals = np.linspace(0, 1, n_bins + 1) ** 4
+    intervals = intervals * (max_value + 1 - min_value) + min_value
+    index = np.searchsorted(intervals, values, side="right") - 1
+    projects_number = np.bincount(index, minlength=n_bins)[:n_bins].astype(float)
+    llm_projects_number = np.bincount(index, weights=is_llm, minlength=n_bins)[:n_bins]
+    return intervals, projects_number, llm_projects_number
+
+
+def llm_ratio_jobs(
+    languages: list[str], metrics: list[str] = RATIO_METRICS
+) -> list[FigureJob]:
+    """Bin every metric for every language, loading each dataset once"""
+    jobs = []
+    for language in languages:
+        columns = load_metadata_columns(language, metrics)
+        for metric in metrics:
+            if np.isnan(columns[metric]).all():
+                print(f"No {metric} values for {language}, skipping.")
+                continue
+            intervals, projects_number, llm_projects_number = llm_ratio_bins(
+                columns[metric], columns["is_llm"]
+            )
+            jobs.append(
+                FigureJob(
+                    draw_llm_ratio_graph,
+                    {
+                        "language": language,
+                        "metric": metric,
+                        "intervals": intervals,
+                        "projects_number": projects_number,
+                        "llm_projects_number": llm_projects_number,
+                    },
+                    f"../Figures/{language.lower()}_llm_{metric}.png",
+                )
+            )
+    return jobs
+
+
+def llm_ratio_graphs(languages: list[str], metrics: list[str] = RATIO_METRICS):
+    """Plot the LLM ratio by every metric for every language"""
+    render_all(llm_ratio_jobs(languages, metrics))
 
 
 def llm_ratio_graph(language: str, metric: str):
-    """Collect the proportion of LLM-related project by number of stars"""
-    projects_number = np.zeros(7)
-    llm_projects_number = np.zeros(7)
-    with open(f"Data/{language.lower()}_repo_metadata.json", "r") as f:
-        data_dicts = json.load(f)
-        max_stars = max(dict[metric] for dict in data_dicts)
-        min_stars = min(dict[metric] for dict in data_dicts)
-        intervals = np.linspace(0, 1, 8) ** 4
-        intervals = intervals * (max_stars + 1 - min_stars) + min_stars
-        for i in range(len(data_dicts)):
-            index = np.searchsorted(intervals, data_dicts[i][metric], side="right") - 1
-            if any(
-                (topic in (data_dicts[i]["topics"] or []))
-                or (topic in (data_dicts[i]["description"] or "").lower())
-                or (topic in (data_dicts[i]["name"] or "").lower())
-                for topic in KEYWORD_LIST
-            ):
-                llm_projects_number[index] += 1
-            projects_number[index] += 1
-
-    x = np.arange(7)
+    """Collect the proportion of LLM-related project by a numeric metric"""
+    render_all(llm_ratio_jobs([language], [metric]), workers=1)
+
+
+def draw_llm_ratio_graph(
+    language: str,
+    metric: str,
+    intervals: np.ndarray,
+    projects_number: np.ndarray,
+    llm_projects_number: np.ndarray,
+) -> Figure:
+    x = np.arange(len(projects_number))
     labels = [
         f"{int(intervals[i])} - {int(intervals[i+1])}"
         for i in range(len(intervals) - 1)
     ]
     llm_ratio = llm_projects_number / np.maximum(projects_number, 1)
-    other_ratio = [1 - llm_ratio[i] for i in range(len(llm_ratio))]
+    other_ratio = 1 - llm_ratio
 
-    _, ax = plt.subplots(figsize=(12, 6))
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
 
     ax.bar(x, llm_ratio, color="skyblue", label="LLM-related projects")
     ax.bar(
@@ -180,146 +321,141 @@ def llm_ratio_graph(language: str, metric: str):
     )
     ax2.set_ylabel("Cumulative ratio of projects")
     ax2.legend(loc="upper right")
-    plt.title(f"Ratio of LLM-related Projects in {language} by {metric.capitalize()}")
-    plt.tight_layout()
-    plt.savefig(f"../Figures/{language.lower()}_llm_{metric}.png")
-    plt.close()
+    ax.set_title(
+        f"Ratio of LLM-related Projects in {language} by {metric.capitalize()}"
+    )
+    fig.tight_layout()
+    return fig
 
 
-def corr_and_fit(x, y):
-    corr = np.corrcoef(x, y)[0, 1]
+def linear_fit(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Points of the least squares line of y on x, evenly spaced in log(1 + x) so it stays smooth on log axes"""
     try:
         slope, intercept = np.polyfit(x, y, 1)
-        fit_x = np.linspace(x.min(), x.max(), 2)
+        fit_x = np.expm1(np.linspace(np.log1p(x.min()), np.log1p(x.max()), 100))
         fit_y = slope * fit_x + intercept
     except Exception:
         fit_x, fit_y = np.array([]), np.array([])
-    return corr, fit_x, fit_y
+    return fit_x, fit_y
 
 
-def correlation_analysis(language: str, data_dir="Data", output_dir="../Figures"):
+def correlation_analysis_jobs(
+    languages: list[str], metrics: list[str] = ATTRIBUTE_NAMES
+) -> list[FigureJob]:
     """
-    Correlate stargazer_count with watchers_count and forks_count,
-    and generate scatter plots with linear fit lines.
+    Correlate every pair of metrics for every language, computing the Pearson and Spearman
+    matrices of all languages in one pass and binning each pair into a log-scaled 2D histogram.
     """
+    X = load_metric_stack(
+        [f"Data/{language.lower()}_repo_metadata.json" for language in languages],
+        metrics,
+    )
+    pearson, spearman = correlation_matrices(X)
 
-    stars, forks, subscribers = [], [], []
-    with open(f"Data/{language.lower()}_repo_metadata.json", "r") as f:
-        data = json.load(f)
-        for repo in data:
-            stars_v = repo.get("stargazers_count")
-            forks_v = repo.get("network_count")
-            subscribers_v = repo.get("subscribers_count")
-            if None in (stars_v, forks_v, subscribers_v):
-                continue
-            stars.append(stars_v)
-            forks.append(forks_v)
-            subscribers.append(subscribers_v)
+    jobs = []
+    for l, language in enumerate(languages):
+        plot_data = []
+        for i, j in combinations(range(len(metrics)), 2):
+            both = ~np.isnan(X[l, :, i]) & ~np.isnan(X[l, :, j])
+            x, y = X[l, both, i], X[l, both, j]
+            counts, x_edges, y_edges = log_histogram2d(x, y)
+            fit_x, fit_y = linear_fit(x, y)
+            plot_data.append(
+                (
+                    counts,
+                    x_edges,
+                    y_edges,
+                    fit_x,
+                    fit_y,
+                    METRIC_LABELS.get(metrics[i], metrics[i]),
+                    METRIC_LABELS.get(metrics[j], metrics[j]),
+                    pearson[l, i, j],
+                    spearman[l, i, j],
+                )
+            )
+        jobs.append(
+            FigureJob(
+                draw_correlation_analysis,
+                {"language": language, "plot_data": plot_data},
+                f"../Figures/{language.lower()}_correlation_analysis.png",
+            )
+        )
+    return jobs
 
-    stars_np = np.array(stars)
-    forks_np = np.array(forks)
-    subs_np = np.array(subscribers)
 
-    # Compute correlations and fit lines
-    corr_star_fork, fitx_star_fork, fity_star_fork = corr_and_fit(stars_np, forks_np)
-    corr_star_sub, fitx_star_sub, fity_star_sub = corr_and_fit(stars_np, subs_np)
-    corr_sub_fork, fitx_sub_fork, fity_sub_fork = corr_and_fit(subs_np, forks_np)
+def correlation_analysis_job(language: str) -> FigureJob:
+    return correlation_analysis_jobs([language])[0]
 
-    # Plot results
-    fig, axs = plt.subplots(3, 1, figsize=(12, 8))
+
+def draw_correlation_analysis(language: str, plot_data: list[tuple]) -> Figure:
+    n_cols = min(len(plot_data), 5)
+    n_rows = -(-len(plot_data) // n_cols)
+    fig = Figure(figsize=(max(4.5 * n_cols, 9), 4 * n_rows))
+    axs = np.atleast_1d(fig.subplots(n_rows, n_cols)).ravel()
     fig.suptitle(
         f"Correlation Analysis for {language.capitalize()} Repositories",
         fontsize=16,
         weight="bold",
     )
 
-    plot_data = [
-        (
-            axs[0],
-            stars_np,
-            forks_np,
-            fitx_star_fork,
-            fity_star_fork,
-            "Number of Stars",
-            "Network Count (Forks)",
-            corr_star_fork,
-        ),
-        (
-            axs[1],
-            stars_np,
-            subs_np,
-            fitx_star_sub,
-            fity_star_sub,
-            "Number of Stars",
-            "Number of Subscribers (Watchers)",
-            corr_star_sub,
-        ),
-        (
-            axs[2],
-            subs_np,
-            forks_np,
-            fitx_sub_fork,
-            fity_sub_fork,
-            "Number of Subscribers (Watchers)",
-            "Network Count (Forks)",
-            corr_sub_fork,
-        ),
-    ]
-
-    for ax, x, y, fx, fy, xlabel, ylabel, corr in plot_data:
-        # Scatter + fit
-        ax.scatter(x, y, alpha=0.6, edgecolor="k", linewidths=0.3)
-        if corr > 0.5 or corr < -0.5:
-            ax.plot(fx, fy, color="red")
+    for ax, (counts, xe, ye, fx, fy, xlabel, ylabel, corr, rho) in zip(axs, plot_data):
         ax.set_xlabel(xlabel)
         ax.set_ylabel(ylabel)
         ax.set_title(f"{ylabel} vs {xlabel}", fontsize=11)
+        if not counts.any():
+            ax.text(0.5, 0.5, "No data", transform=ax.transAxes, ha="center")
+            continue
+        # Repos per bin, on symlog axes close to the log(1 + value) spacing of the bins
+        mesh = ax.pcolormesh(
+            xe,
+            ye,
+            np.ma.masked_equal(counts.T, 0),
+            norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)),
+            cmap="viridis",
+        )
+        fig.colorbar(mesh, ax=ax, label="Repositories")
+        if corr > 0.5 or corr < -0.5:
+            ax.plot(fx, fy, color="red")
+        ax.set_xscale("symlog", linthresh=1)
+        ax.set_yscale("symlog", linthresh=1)
+        ax.set_xlim(xe[0], xe[-1])
+        ax.set_ylim(ye[0], ye[-1])
         ax.grid(True, linestyle="--", alpha=0.3)
         ax.text(
             0.95,
             0.05,
-            f"Pearson r = {corr:.3f}" if not np.isnan(corr) else "Pearson r = N/A",
+            (f"Pearson r = {corr:.3f}" if not np.isnan(corr) else "Pearson r = N/A")
+            + (
+                f"\nSpearman ρ = {rho:.3f}"
+                if not np.isnan(rho)
+                else "\nSpearman ρ = N/A"
+            ),
             transform=ax.transAxes,
             ha="right",
             va="bottom",
             fontsize=9,
             bbox=dict(boxstyle="round,pad=0.3", facecolor="white", alpha=0.6),
         )
+    for ax in axs[len(plot_data) :]:
+        ax.set_visible(False)
 
-    plt.tight_layout()
-    plt.savefig(f"../Figures/{language.lower()}_correlation_analysis.png")
-    plt.close()
+    fig.tight_layout()
+    return fig
+
+
+def correlation_analysis(language: str, data_dir="Data", output_dir="../Figures"):
+    """
+    Correlate every pair of metrics and draw their log-binned 2D histograms
+    with linear fit lines.
+    """
+    render(correlation_analysis_job(language))
 
 
 if __name__ == "__main__":
-    ppn, pp_llm_n = monthly_llm_ratio_graph("Python")
-    jpn, jp_llm_n = monthly_llm_ratio_graph("Java")
-    cpn, cp_llm_n = monthly_llm_ratio_graph("C#")
-    jspn, jsp_llm_n = monthly_llm_ratio_graph("Javascript")
-    gpn, gp_llm_n = monthly_llm_ratio_graph("Go")
     languages = ["Python", "Java", "C#", "Javascript", "Go"]
-    n_repos = [np.sum(ppn), np.sum(jpn), np.sum(cpn), np.sum(jspn), np.sum(gpn)]
-    n_llm_repos = [
-        np.sum(pp_llm_n),
-        np.sum(jp_llm_n),
-        np.sum(cp_llm_n),
-        np.sum(jsp_llm_n),
-        np.sum(gp_llm_n),
-    ]
-    total_llm_ratio_graph(languages, n_repos, n_llm_repos)
-    llm_ratio_graph("Python", "stargazers_count")
-    llm_ratio_graph("Java", "stargazers_count")
-    llm_ratio_graph("C#", "stargazers_count")
-    llm_ratio_graph("Javascript", "stargazers_count")
-    llm_ratio_graph("Go", "stargazers_count")
-    llm_ratio_graph("Python", "size")
-    llm_ratio_graph("Java", "size")
-    llm_ratio_graph("C#", "size")
-    llm_ratio_graph("Javascript", "size")
-    llm_ratio_graph("Go", "size")
-
-    correlation_analysis("Python")
-    correlation_analysis("Java")
-    correlation_analysis("C#")
-    correlation_analysis("Javascript")
-    correlation_analysis("Go")
+    counts = load_monthly_llm_counts(languages)
+    jobs = [monthly_llm_ratio_job(language, counts) for language in languages]
+    jobs.append(total_llm_ratio_job(counts, languages))
+    jobs += llm_ratio_jobs(languages)
+    jobs += correlation_analysis_jobs(languages)
+    render_all(jobs)
@@ -1,15 +1,33 @@
 """Collect repository metadata monthly from a starting day up to an end date"""
 
 import os
-import time
-import requests
-from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
 from dateutil.relativedelta import relativedelta
-import json
 import argparse
 
+from field_planner import DETAIL_FIELDS, EnrichQueue, needs_details
+from github_metrics import METRICS
+from records import RepoMetadata, dump_records, load_records
+from snapshot_store import record_crawl
+
 MAX_LEN_PAGE = 100
-REPO_SEARCH_URL = "https://api.github.com/search/repositories"
+MAX_SEARCH_RESULTS = 1000
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+REPO_SEARCH_URL = f"{GITHUB_API_URL}/search/repositories"
+# transient errors retried with exponential backoff, any other failure is raised
+RETRY_STATUS = (429, 500, 502, 503, 504)
+MAX_RETRIES = 6
+
+
+def resolve_token(token: str) -> str:
+    """The given github token, or the one of the GITHUB_TOKEN environment variable"""
+    if token == "":
+        env_token = os.getenv("GITHUB_TOKEN")
+        if env_token:
+            return env_token
+        raise ValueError("No github token provided")
+    return token
 
 
 def repo_search(
@@ -18,16 +36,16 @@ def repo_search(
     ending_date: date,
     repos_per_month: int,
     token: str = "",
+    analyses: list[str] | None = None,
 ) -> None:
-    """query the github API for repos in a given language monthly from a given date up to an end date"""
+    """query the github API for repos in a given language monthly from a given date up to an end date.
+
+    The detail-only fields are fetched only if the analyses need them, otherwise the repos are queued for enrich_metadata.
+    """
 
     # initialize github token
-    if token == "":
-        env_token = os.getenv("GITHUB_TOKEN")
-        if env_token:
-            token = env_token
-        else:
-            raise ValueError("No github token provided")
+    token = resolve_token(token)
+    METRICS.reset()
 
     # github does not display more than 1000 results
     if repos_per_month > 1000:
@@ -67,6 +85,8 @@ def repo_search(
     ]
 
     responses = []
+    fetch_details = needs_details(analyses)
+    enrich_queue = EnrichQueue(language)
 
     # query github and collect requested results per month
     for param in param_list:
@@ -76,13 +96,21 @@ def repo_search(
         # query multiple pages if necessary
         while n < repos_per_month:
             param["page"] = i
-            response = requests.get(REPO_SEARCH_URL, params=param, headers=headers)
+            response = METRICS.get(
+                "search/repositories", REPO_SEARCH_URL, params=param, headers=headers
+            )
 
             # deal with rate limit
             if response.status_code == 403:
                 print(f"Rate limited on repo search. Sleeping one minute...")
-                time.sleep(60)
-                response = requests.get(REPO_SEARCH_URL, params=param, headers=headers)
+                METRICS.sleep(60, "rate_limit")
+                METRICS.record_event("retry")
+                response = METRICS.get(
+                    "search/repositories",
+                    REPO_SEARCH_URL,
+                    params=param,
+                    headers=headers,
+                )
 
             # get the repo items returned
             items = response.json().get("items", [])
@@ -93,49 +121,29 @@ def repo_search(
 
             # record metadata
             for item in items:
-                repo_detail_url = (
-                    f"https://api.github.com/repos/{item.get('full_name')}"
-                )
-                detail_resp = requests.get(repo_detail_url, headers=headers)
-
-                if detail_resp.status_code == 403:
-                    print(
-                        f"Rate limited on detailed repo info. Sleeping one minute..."
-                    )
-                    time.sleep(60)
-                    detail_resp = requests.get(repo_detail_url, headers=headers)
-
-                detailed_data = detail_resp.json()
-
-                responses.append(
-                    {
-                        "id": item.get("id"),
-                        "name": item.get("name"),
-                        "full_name": item.get("full_name"),
-                        "html_url": item.get("html_url"),
-                        "description": item.get("description"),
-                        "language": item.get("language"),
-                        "created_at": item.get("created_at"),
-                        "stargazers_count": item.get("stargazers_count"),
-                        "open_issues_count": item.get("open_issues_count"),
-                        "size": item.get("size") / 1000,
-                        "topics": item.get("topics", []),
-                        "license": (
-                            item.get("license", {}).get("key")
-                            if item.get("license")
-                            else None
-                        ),
-                        "owner_login": (
-                            item["owner"]["login"] if item.get("owner") else None
-                        ),
-                        "owner_type": (
-                            item["owner"]["type"] if item.get("owner") else None
-                        ),
-                        "archived": item.get("archived"),
-                        "subscribers_count": detailed_data.get("subscribers_count"),
-                        "network_count": detailed_data.get("network_count"),
-                    }
-                )
+                if fetch_details:
+                    repo_detail_url = f"{GITHUB_API_URL}/repos/{item.get('full_name')}"
+                    detail_resp = METRICS.get("repos", repo_detail_url, headers=headers)
+
+                    if detail_resp.status_code == 403:
+                        print(
+                            f"Rate limited on detailed repo info. Sleeping one minute..."
+                        )
+                        METRICS.sleep(60, "rate_limit")
+                        METRICS.record_event("retry")
+                        detail_resp = METRICS.get(
+                            "repos", repo_detail_url, headers=headers
+                        )
+
+                    detailed_data = detail_resp.json()
+                    # collected with its details, an earlier run may have queued it
+                    enrich_queue.remove(item.get("full_name"))
+                else:
+                    detailed_data = {}
+                    enrich_queue.add(item.get("full_name"))
+
+                responses.append(RepoMetadata.from_api(item, detailed_data))
+                METRICS.record_results("search/repositories")
                 print(
                     f"appended repo {item.get("full_name")} created at {item.get("created_at")}"
                 )
@@ -146,7 +154,7 @@ def repo_search(
                     break
 
                 # wait a bit before next iteration
-                time.sleep(0.2)
+                METRICS.sleep(0.2, "throttle")
 
             # break if reached the maximum number of github resuls
             i += 1
@@ -154,29 +162,305 @@ def repo_search(
                 break
 
     # write to json file
-    with open(f"Data/{language.lower()}_repo_metadata.json", "w") as f:
-        json.dump(responses, f, ensure_ascii=False)
+    dump_records(responses, f"Data/{language.lower()}_repo_metadata.json")
+    enrich_queue.save()
+    record_crawl(responses)
+    METRICS.write_report(f"Data/metrics_{language.lower()}_repo_search")
 
     return
 
 
+def api_get(
+    endpoint: str, url: str, headers: dict, params: dict | None = None, missing=()
+):
+    """JSON body of a request, waiting out rate limits and retrying transient errors.
+
+    Returns None for the statuses in missing, raises on any other failure so that a failed
+    request is never read as an empty result.
+    """
+    retries = 0
+    while True:
+        response = METRICS.get(endpoint, url, params=params, headers=headers)
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code in missing:
+            return None
+        if response.status_code == 403:
+            print(f"Rate limited on {endpoint}. Sleeping one minute...")
+            METRICS.sleep(60, "rate_limit")
+        elif response.status_code in RETRY_STATUS and retries < MAX_RETRIES:
+            wait_time = int(response.headers.get("Retry-After", 2**retries))
+            print(
+                f"{endpoint} failed with status {response.status_code}, retrying in {wait_time}s..."
+            )
+            METRICS.sleep(wait_time, "backoff")
+            retries += 1
+        else:
+            raise Exception(
+                f"GitHub API request to {url} failed with status code {response.status_code}"
+            )
+        METRICS.record_event("retry")
+
+
+def search_get(param: dict, headers: dict) -> dict:
+    """One page of repository search results"""
+    return api_get("search/repositories", REPO_SEARCH_URL, headers, params=param)
+
+
+def repo_details(full_name: str, headers: dict) -> dict:
+    """Detailed info of a repo, empty if it no longer exists"""
+    return (
+        api_get(
+            "repos",
+            f"{GITHUB_API_URL}/repos/{full_name}",
+            headers,
+            missing=(404, 451),
+        )
+        or {}
+    )
+
+
+def window_query(
+    language: str, start: datetime, end: datetime, stars: tuple | None
+) -> str:
+    """Search query of the repos created between start and end (inclusive) with stars in range"""
+    query = (
+        f"language:{language.lower()} "
+        f"created:{start:%Y-%m-%dT%H:%M:%SZ}..{end:%Y-%m-%dT%H:%M:%SZ}"
+    )
+    if stars is not None:
+        low, high = stars
+        query += f" stars:{low}..{'*' if high is None else high}"
+    return query
+
+
+def split_stars(stars: tuple | None) -> list[tuple] | None:
+    """Halve a star range, unbounded ranges growing geometrically, None if it is a single value"""
+    low, high = (0, None) if stars is None else stars
+    if high is None:
+        step = max(low, 1)
+        return [(low, low + step), (low + step + 1, None)]
+    if low == high:
+        return None
+    mid = (low + high) // 2
+    return [(low, mid), (mid + 1, high)]
+
+
+def split_window(
+    language: str,
+    start: datetime,
+    end: datetime,
+    headers: dict,
+    stars: tuple | None = None,
+) -> list[tuple[str, int]]:
+    """Bisect a window on creation time, then on stars, until every leaf has at most 1000 results.
+
+    Returns the (query, total_count) of the leaves.
+    """
+    query = window_query(language, start, end, stars)
+    total = search_get({"q": query, "per_page": 1, "page": 1}, headers)["total_count"]
+    METRICS.record_event("window_probe")
+    if total <= MAX_SEARCH_RESULTS:
+        return [(query, total)] if total else []
+    if end > start and stars is None:
+        mid = start + (end - start) / 2
+        mid = mid.replace(microsecond=0)
+        return split_window(language, start, mid, headers) + split_window(
+            language, mid + timedelta(seconds=1), end, headers
+        )
+    halves = split_stars(stars)
+    if halves is None:
+        print(f"{query} still has {total} results, keeping the first 1000")
+        METRICS.record_event("unsplittable_window")
+        return [(query, MAX_SEARCH_RESULTS)]
+    return [
+        leaf
+        for half in halves
+        for leaf in split_window(language, start, end, headers, half)
+    ]
+
+
+def fetch_window(
+    query: str,
+    total: int,
+    headers: dict,
+    enrich_queue: EnrichQueue,
+    fetch_details: bool = True,
+) -> list[dict]:
+    """Every repo of a leaf window, with its detailed info or queued for enrichment"""
+    responses = []
+    n_pages = min(-(-total // MAX_LEN_PAGE), MAX_SEARCH_RESULTS // MAX_LEN_PAGE)
+    for page in range(1, n_pages + 1):
+        param = {"q": query, "per_page": MAX_LEN_PAGE, "page": page}
+        items = search_get(param, headers).get("items", [])
+        if not items:
+            break
+        for item in items:
+            if fetch_details:
+                detailed_data = repo_details(item.get("full_name"), headers)
+                enrich_queue.remove(item.get("full_name"))
+            else:
+                detailed_data = {}
+                enrich_queue.add(item.get("full_name"))
+            responses.append(RepoMetadata.from_api(item, detailed_data))
+            METRICS.record_results("search/repositories")
+            METRICS.sleep(0.2, "throttle")
+    print(f"fetched {len(responses)} repos for {query}")
+    return responses
+
+
+def exhaustive_repo_search(
+    language: str,
+    starting_date: date,
+    ending_date: date,
+    token: str = "",
+    workers: int = 4,
+    analyses: list[str] | None = None,
+) -> None:
+    """Enumerate every repo of a language created in the period, not only the most starred of each month.
+
+    Each month is bisected into windows under the search result cap, then the windows are fetched concurrently.
+    """
+    token = resolve_token(token)
+    METRICS.reset()
+    headers = {
+        "Accept": "application/vnd.github+json",
+        "Authorization": f"Bearer {token}",
+    }
+
+    months = []
+    month_start = datetime(
+        starting_date.year, starting_date.month, starting_date.day, tzinfo=timezone.utc
+    )
+    end = datetime(
+        ending_date.year, ending_date.month, ending_date.day, tzinfo=timezone.utc
+    )
+    while month_start < end:
+        month_end = min(month_start + relativedelta(months=1), end)
+        months.append((month_start, month_end - timedelta(seconds=1)))
+        month_start = month_end
+
+    fetch_details = needs_details(analyses)
+    enrich_queue = EnrichQueue(language)
+    # the workers record with the recorder of this thread, the one orchestrate bound to the job
+    with ThreadPoolExecutor(
+        max_workers=workers, initializer=METRICS.use, initargs=(METRICS.current(),)
+    ) as pool:
+        leaves = [
+            leaf
+            for month_leaves in pool.map(
+                lambda month: split_window(language, *month, headers), months
+            )
+            for leaf in month_leaves
+        ]
+        print(
+            f"{len(leaves)} windows holding {sum(total for _, total in leaves)} repos"
+        )
+        windows = pool.map(
+            lambda leaf: fetch_window(*leaf, headers, enrich_queue, fetch_details),
+            leaves,
+        )
+
+        # windows are disjoint, but results can move between pages while paginating
+        responses = {}
+        for window in windows:
+            for record in window:
+                responses[record.full_name] = record
+
+    responses = list(responses.values())
+    dump_records(responses, f"Data/{language.lower()}_repo_metadata.json")
+    enrich_queue.save()
+    record_crawl(responses)
+    METRICS.write_report(f"Data/metrics_{language.lower()}_repo_search")
+
+
+def enrich_metadata(
+    language: str, analyses: list[str] | None = None, token: str = ""
+) -> int:
+    """Fetch the detail-only fields of the queued repos, if the analyses need them, return the number enriched"""
+    enrich_queue = EnrichQueue(language)
+    if not needs_details(analyses) or not len(enrich_queue):
+        print(f"Nothing to enrich for {language}.")
+        return 0
+    METRICS.reset()
+    headers = {
+        "Accept": "application/vnd.github+json",
+        "Authorization": f"Bearer {resolve_token(token)}",
+    }
+    data_path = f"Data/{language.lower()}_repo_metadata.json"
+    responses = load_records(data_path)
+    records = {record.full_name: record for record in responses}
+
+    n = 0
+    for full_name in enrich_queue:
+        if full_name in records:
+            detailed_data = repo_details(full_name, headers)
+            for field in DETAIL_FIELDS:
+                setattr(records[full_name], field, detailed_data.get(field))
+            n += 1
+            METRICS.sleep(0.2, "throttle")
+        enrich_queue.remove(full_name)
+
+    dump_records(responses, data_path)
+    enrich_queue.save()
+    record_crawl(responses)
+    METRICS.write_report(f"Data/metrics_{language.lower()}_enrich")
+    print(f"Enriched {n} repos for {language}.")
+    return n
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         prog="mine_repos",
         description="Collect repository metadata monthly from a starting day up to an end date",
     )
     parser.add_argument("language")
-    parser.add_argument("starting_date", type=lambda s: date.fromisoformat(s))
+    parser.add_argument(
+        "starting_date", nargs="?", type=lambda s: date.fromisoformat(s)
+    )
     parser.add_argument(
         "-f", "--finish", default=date.today(), type=lambda s: date.fromisoformat(s)
     )
     parser.add_argument("-m", "--monthly", default=100, type=int)
     parser.add_argument("-t", "--token")
-    args = parser.parse_args()
-    repo_search(
-        args.language,
-        args.starting_date,
-        args.finish,
-        args.monthly,
-        token=args.token or "",
+    parser.add_argument(
+        "-e",
+        "--exhaustive",
+        action="store_true",
+        help="collect every repo of the period instead of the top ones of each month",
     )
+    parser.add_argument("-w", "--workers", default=4, type=int)
+    parser.add_argument(
+        "-a",
+        "--analyses",
+        nargs="+",
+        help="analyses the data is collected for, the per repo detail requests are skipped if none needs them",
+    )
+    parser.add_argument(
+        "--enrich",
+        action="store_true",
+        help="fetch the detail fields of the repos collected without them",
+    )
+    args = parser.parse_args()
+    if args.enrich:
+        enrich_metadata(args.language, args.analyses, token=args.token or "")
+    elif args.starting_date is None:
+        parser.error("starting_date is required unless --enrich is given")
+    elif args.exhaustive:
+        exhaustive_repo_search(
+            args.language,
+            args.starting_date,
+            args.finish,
+            token=args.token or "",
+            workers=args.workers,
+            analyses=args.analyses,
+        )
+    else:
+        repo_search(
+            args.language,
+            args.starting_date,
+            args.finish,
+            args.monthly,
+            token=args.token or "",
+            analyses=args.analyses,
+        )
@@ -4,7 +4,13 @@ import sys
 import time
 import requests
 
-CODE_SEARCH_URL = "https://api.github.com/search/code"
+from dedup import HitDeduplicator
+from github_metrics import METRICS
+from usage_sketch import ModelUsageStream
+
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+CODE_SEARCH_URL = f"{GITHUB_API_URL}/search/code"
+SKETCH_SAVE_EVERY = 100
 HEADERS = {
     "Accept": "application/vnd.github+json",
     "Authorization": f"Bearer {os.getenv('GITHUB_TOKEN')}",
@@ -25,11 +31,13 @@ class repo:
     def __eq__(self, other) -> bool:
         return isinstance(other, repo) and self.full_name == other.full_name
 
-    def add_file_label(self, label: str, file_path: str):
+    def add_file_label(self, label: str, file_path: str) -> bool:
+        """Add a file to a label, return True if the label is new for this repo"""
         if label in self.labels:
             self.labels[label].add(file_path)
-        else:
-            self.labels[label] = set([file_path])
+            return False
+        self.labels[label] = set([file_path])
+        return True
 
     def to_dict(self):
         return {
@@ -70,10 +78,13 @@ def retrieve_all(query: str, start_size_delta: int):
         while i < 10:
             params["page"] = i + 1
             try:
-                response = requests.get(CODE_SEARCH_URL, headers=HEADERS, params=params)
+                response = METRICS.get(
+                    "search/code", CODE_SEARCH_URL, headers=HEADERS, params=params
+                )
             except requests.exceptions.RequestException as e:
                 print(f"Requests exception detected: {e}, sleeping for 10 seconds...")
-                time.sleep(10)
+                METRICS.sleep(10, "backoff")
+                METRICS.record_event("retry")
                 continue
             if response.status_code == 401:
                 raise Exception(
@@ -87,14 +98,16 @@ def retrieve_all(query: str, start_size_delta: int):
                     current_time = int(time.time())
                     wait_time = reset_time - current_time + 1
                     print(f"Rate limit exceeded, sleeping {wait_time} seconds...")
-                    time.sleep(wait_time)
+                    METRICS.sleep(wait_time, "rate_limit")
+                    METRICS.record_event("retry")
                     print("Resuming requests...")
                     continue
                 else:
                     print(
                         f"GitHub API request failed with status code {response.status_code}"
                     )
-                    time.sleep(3)
+                    METRICS.sleep(3, "backoff")
+                    METRICS.record_event("retry")
                     continue
 
             data = response.json()
@@ -103,25 +116,27 @@ def retrieve_all(query: str, start_size_delta: int):
                 print(
                     f'Nothing found in page {i} for query: {params["q"]}, skipping to next query...'
                 )
-                time.sleep(1)
+                METRICS.sleep(1, "throttle")
                 break
             for item in items:
                 repo_v = item.get("repository")
                 if repo_v:
                     yield {
+                        "repo_id": repo_v.get("id"),
                         "full_name": repo_v.get("full_name"),
                         "html_url": repo_v.get("html_url"),
                         "file_path": item.get("path"),
                     }
             request_n += len(items)
+            METRICS.record_results("search/code", len(items))
             if len(items) < 100:
                 print(
                     f"Retrieved {len(items)} results in page {i} for query:{params["q"]}, skipping to next query..."
                 )
-                time.sleep(1)
+                METRICS.sleep(1, "throttle")
                 break
             print(f'Retrieved {request_n} results for query: {params["q"]} so far...')
-            time.sleep(1)
+            METRICS.sleep(1, "throttle")
             i += 1
 
         if request_n >= 1000:
@@ -130,6 +145,8 @@ def retrieve_all(query: str, start_size_delta: int):
                     "GitHub API code search limit reached with 1kb size delta, chunking failed."
                 )
             else:
+                METRICS.record_event("overflowed_window")
+                METRICS.record_event("overflowed_window_results", request_n)
                 size_delta = int(size_delta / 2)
                 continue
         curr_size += size_delta
@@ -141,28 +158,75 @@ def retrieve_all(query: str, start_size_delta: int):
             size_delta *= 2
 
 
-def collect_repo_by_language(language: str, keyword_dict: dict, suffix: str = ""):
+def write_dedup_report(dedup: HitDeduplicator, path: str):
+    """Write the duplicate rate of every query and close the deduplicator"""
+    dedup.close()
+    report = dedup.report()
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    hits = sum(stats["hits"] for stats in report.values())
+    duplicates = sum(stats["duplicates"] for stats in report.values())
+    print(
+        f"{duplicates}/{hits} duplicate hits dropped ({duplicates / max(hits, 1):.1%}), "
+        f"{dedup.false_positives} Bloom filter false positives"
+    )
+
+
+def collect_repo_by_language(
+    language: str,
+    keyword_dict: dict,
+    suffix: str = "",
+    sketch: ModelUsageStream | None = None,
+):
+    """Collect the repos referencing each keyword, optionally feeding new (repo, label) pairs to a usage sketch"""
     if not keyword_dict:
         print(f"No keywords for {language}, skipping.")
         return
+    # the report of each collection counts its own requests only
+    METRICS.reset()
+    sketch_path = (
+        f"Data/model_usage_sketch_{language}{"_"+suffix if suffix!="" else ""}.json"
+    )
     repo_dict = {}
+    dedup = HitDeduplicator(f"{language}{"_"+suffix if suffix!="" else ""}")
     try:
         for keyword, group in keyword_dict.items():
             keyword = keyword.replace('"', r"\"")
             print(f"Searching for keyword: {keyword}")
-            for data in retrieve_all(f'language:{language} "{keyword}"', 5):
+            query = f'language:{language} "{keyword}"'
+            for data in retrieve_all(query, 5):
+                # overlapping windows return the same hits again
+                if dedup.is_duplicate(
+                    query, data["repo_id"], data["file_path"], keyword
+                ):
+                    METRICS.record_event("duplicate_hits")
+                    continue
                 print(
                     f"Found reference of \"{keyword}\" for {language}. repo - {data['full_name']}, file - {data['file_path']}"
                 )
                 full_name = data["full_name"]
                 if full_name not in repo_dict:
                     repo_dict[full_name] = repo(full_name, data["html_url"])
-                repo_dict[full_name].add_file_label(group, data["file_path"])
+                if (
+                    repo_dict[full_name].add_file_label(group, data["file_path"])
+                    and sketch is not None
+                ):
+                    sketch.add(group)
+                    if sketch.n_updates % SKETCH_SAVE_EVERY == 0:
+                        sketch.save(sketch_path)
         with open(
             f"Data/collected_repos_{language}{"_"+suffix if suffix!="" else ""}.json",
             "w",
         ) as f:
             json.dump([r.to_dict() for r in repo_dict.values()], f, indent=2)
+        if sketch is not None:
+            sketch.save(sketch_path)
+        METRICS.write_report(
+            f"Data/metrics_{language}{"_"+suffix if suffix!="" else ""}_code_search"
+        )
+        write_dedup_report(
+            dedup, f"Data/dedup_{language}{"_"+suffix if suffix!="" else ""}.json"
+        )
     except KeyboardInterrupt as e:
         print(
             f"keyboard interrupt detected, found {len(repo_dict)} repos. Saving intermediary results..."
@@ -172,6 +236,14 @@ def collect_repo_by_language(language: str, keyword_dict: dict, suffix: str = ""
             "w",
         ) as f:
             json.dump([r.to_dict() for r in repo_dict.values()], f, indent=2)
+        if sketch is not None:
+            sketch.save(sketch_path)
+        METRICS.write_report(
+            f"Data/metrics_{language}{"_"+suffix if suffix!="" else ""}_code_search"
+        )
+        write_dedup_report(
+            dedup, f"Data/dedup_{language}{"_"+suffix if suffix!="" else ""}.json"
+        )
         sys.exit(0)
 
 
@@ -180,4 +252,9 @@ if __name__ == "__main__":
         model_keyword_dict = json.load(f)
 
     # Python LLM model usage
-    collect_repo_by_language("python", model_keyword_dict, suffix="model")
+    collect_repo_by_language(
+        "python",
+        model_keyword_dict,
+        suffix="model",
+        sketch=ModelUsageStream(),
+    )
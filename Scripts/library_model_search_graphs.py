@@ -1,36 +1,115 @@
-import matplotlib.pyplot as plt
 import numpy as np
 import json
-from datetime import datetime
+from matplotlib.figure import Figure
 
+import os
 
-def show_library_imports(file_path: str, suffix):
-    provider_dict = {
-        "OpenAI": 0,
-        "xAI": 0,
-        "Anthropic": 0,
-        "Mistral": 0,
-        "Google": 0,
-        "unknown_lib": 0,
+from aggregate_cache import cached, stat_hash
+from rendering import FigureJob, render, render_all
+from usage_sketch import ModelUsageStream
+
+PROVIDER_LIST = ["OpenAI", "xAI", "Anthropic", "Mistral", "Google", "unknown_lib"]
+
+# part of the cache key of the model aggregates, to bump whenever compute_model_aggregates changes
+AGGREGATES_VERSION = 2
+
+
+def compute_model_aggregates(data_path: str, models: list[str], top_k: int) -> dict:
+    """Count providers and models, rank the top models and build the model x provider matrix in one scan"""
+    with open(data_path, "r") as f:
+        data_dicts = json.load(f)
+    model_set = set(models)
+    model_counts = {model: 0 for model in models}
+    provider_counts = {provider: 0 for provider in PROVIDER_LIST}
+    provider_model_counts = {
+        model: {**{provider: 0 for provider in PROVIDER_LIST}, "tot": 0}
+        for model in models
     }
-    with open(file_path, "r") as f:
-        dicts = json.load(f)
-        for dict in dicts:
-            for tag in dict["tags"]:
-                if "OpenAI" in tag:
-                    provider_dict["OpenAI"] += 1
-                elif "xAI" in tag:
-                    provider_dict["xAI"] += 1
-                elif "Anthropic" in tag:
-                    provider_dict["Anthropic"] += 1
-                elif "Mistral" in tag:
-                    provider_dict["Mistral"] += 1
-                elif "Google" in tag:
-                    provider_dict["Google"] += 1
-                elif "unknown_lib" in tag:
-                    provider_dict["unknown_lib"] += 1
-    labels = ["openai", "anthropic", "mistral", "google", "xai", "other"]
-    x = np.arange(len(labels))
+    # models whose name is contained in a tag, tags repeat a lot across repos
+    tag_models = {}
+
+    for dict_value in data_dicts:
+        provider_encountered = []
+        models_encountered = []
+        for tag in dict_value["tags"]:
+            if tag not in tag_models:
+                tag_models[tag] = [model for model in models if model in tag]
+            for model in tag_models[tag]:
+                model_counts[model] += 1
+
+            for provider in PROVIDER_LIST:
+                if provider in tag:
+                    provider_counts[provider] += 1
+                    break
+
+            if "_" in tag:
+                res = tag.split("_")
+                if len(res) == 2:
+                    if res[1] in model_set and res[0] in PROVIDER_LIST:
+                        provider_model_counts[res[1]]["tot"] += 1
+                        provider_model_counts[res[1]][res[0]] += 1
+                elif len(res) == 3:
+                    if res[2] in model_set:
+                        provider_model_counts[res[2]]["tot"] += 1
+                        provider_model_counts[res[2]]["unknown_lib"] += 1
+            else:
+                if tag in PROVIDER_LIST:
+                    provider_encountered.append(tag)
+                if tag in model_set:
+                    models_encountered.append(tag)
+        if models_encountered and len(provider_encountered) == 1:
+            for model in models_encountered:
+                provider_model_counts[model]["tot"] += 1
+                provider_model_counts[model][provider_encountered[0]] += 1
+        elif models_encountered:
+            for model in models_encountered:
+                provider_model_counts[model]["tot"] += 1
+                provider_model_counts[model]["unknown_lib"] += 1
+
+    return {
+        "model_counts": model_counts,
+        "top_models": sorted(model_counts, key=model_counts.get, reverse=True)[:top_k],
+        "provider_counts": provider_counts,
+        "provider_model_counts": provider_model_counts,
+    }
+
+
+def reduce_repos(data_path: str, top_models: list[str]) -> list[dict]:
+    """Repos with a tag containing one of the top models"""
+    with open(data_path, "r") as f:
+        data_dicts = json.load(f)
+    return [
+        d
+        for d in data_dicts
+        if any(model in tag for tag in d["tags"] for model in top_models)
+    ]
+
+
+def model_aggregates(
+    data_path: str,
+    top_k: int = 20,
+    model_dict_path: str = "model_provider_dict.json",
+) -> dict:
+    """Model aggregates of a combined dataset, cached on the size and modification time of the dataset
+    and of the model dict"""
+
+    def compute():
+        with open(model_dict_path, "r") as f:
+            models = list(json.load(f).keys())
+        return compute_model_aggregates(data_path, models, top_k)
+
+    return cached(
+        "model_aggregates",
+        [data_path, model_dict_path],
+        compute,
+        AGGREGATES_VERSION,
+        top_k,
+        fingerprint=stat_hash,
+    )
+
+
+def show_library_imports_job(file_path: str, suffix) -> FigureJob:
+    provider_dict = model_aggregates(file_path)["provider_counts"]
     values = [
         provider_dict["OpenAI"],
         provider_dict["Anthropic"],
@@ -39,147 +118,130 @@ def show_library_imports(file_path: str, suffix):
         provider_dict["xAI"],
         provider_dict["unknown_lib"],
     ]
-    plt.figure(figsize=(12, 6))
-    plt.bar(x, values, color="skyblue", label="Number of repos for each provider")
-    plt.yscale("log")
-    plt.xlabel("Provider")
-    plt.ylabel("Number of repos")
-    plt.title(f"Provider of LLM library by number of repos")
-    plt.xticks(x, labels)
-    plt.legend()
-    plt.tight_layout()
-    plt.savefig(f"../Figures/llm_library_usage_{suffix}.png")
-    plt.close()
+    return FigureJob(
+        draw_library_imports,
+        {"values": values},
+        f"../Figures/llm_library_usage_{suffix}.png",
+    )
 
 
-def show_model_frequency(file_path, suffix):
-    models = []
-    with open("model_provider_dict.json", "r") as f:
-        dict_json = json.load(f)
-        models = dict_json.keys()
-    model_counts = {}
-    for model in models:
-        model_counts[model] = 0
-    with open(file_path, "r") as f:
-        dicts = json.load(f)
-        for dict in dicts:
-            for tag in dict["tags"]:
-                for model in models:
-                    if model in tag:
-                        model_counts[model] += 1
+def draw_library_imports(values: list[int]) -> Figure:
+    labels = ["openai", "anthropic", "mistral", "google", "xai", "other"]
+    x = np.arange(len(labels))
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    ax.bar(x, values, color="skyblue", label="Number of repos for each provider")
+    ax.set_yscale("log")
+    ax.set_xlabel("Provider")
+    ax.set_ylabel("Number of repos")
+    ax.set_title(f"Provider of LLM library by number of repos")
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels)
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+def show_library_imports(file_path: str, suffix):
+    render(show_library_imports_job(file_path, suffix))
+
+
+def show_model_frequency_job(file_path, suffix) -> FigureJob:
+    model_counts = model_aggregates(file_path)["model_counts"]
     with open(f"model_counts_{suffix}.json", "w") as f:
         json.dump(model_counts, f)
     count_array = []
     for count in model_counts.values():
         count_array.append(count)
     count_array.sort(reverse=True)
+    return FigureJob(
+        draw_model_frequency,
+        {"count_array": count_array},
+        f"../Figures/llm_model_usage_{suffix}.png",
+    )
+
+
+def draw_model_frequency(count_array: list[int]) -> Figure:
     total_count = np.sum(count_array)
     top_20p = 0
     top_n = int(len(count_array) * 0.2)
     for i in range(top_n):
         top_20p += count_array[i]
-    plt.figure(figsize=(12, 6))
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
     x = np.arange(len(count_array))
-    plt.fill_between(
+    ax.fill_between(
         x[:top_n], count_array[:top_n], color="orange", alpha=0.3, label="Top 20%"
     )
-    plt.plot(x, count_array, color="skyblue", label="number of repo for each model")
-    plt.xlabel("Models ordered by how much they are referenced")
-    plt.ylabel("Number of repos")
-    plt.title(f"LLM Model by number of repos")
-    plt.legend()
-    plt.text(
+    ax.plot(x, count_array, color="skyblue", label="number of repo for each model")
+    ax.set_xlabel("Models ordered by how much they are referenced")
+    ax.set_ylabel("Number of repos")
+    ax.set_title(f"LLM Model by number of repos")
+    ax.legend()
+    ax.text(
         0.95,
         0.95,
         f"Top 20% of models make {top_20p/total_count:.1%} of total usage",
-        transform=plt.gca().transAxes,
+        transform=ax.transAxes,
         ha="right",
         va="top",
         fontsize=12,
     )
-    plt.tight_layout()
+    fig.tight_layout()
     num_ticks = 5
     tick_positions = np.linspace(0, len(count_array) - 1, num_ticks, dtype=int)
     tick_labels = [f"Top {pos + 1}" for pos in tick_positions]
 
-    plt.xticks(tick_positions, tick_labels)
-    plt.savefig(f"../Figures/llm_model_usage_{suffix}.png")
-    plt.close()
+    ax.set_xticks(tick_positions)
+    ax.set_xticklabels(tick_labels)
+    return fig
 
 
-def show_top_models(file_path, suffix):
-    with open(file_path, "r") as f:
-        model_counts = json.load(f)
-        top20 = sorted(model_counts, key=model_counts.get, reverse=True)[:20]
-        with open(f"top_20_models_{suffix}.json", "w") as f:
-            json.dump(top20, f, indent=2)
-        x = np.arange(20)
-        labels = top20
-        y = [model_counts[model] for model in top20]
-        plt.figure(figsize=(12, 6))
-        plt.bar(x, y, color="skyblue", label="Number of repos for each model")
-        plt.xlabel("Models")
-        plt.ylabel("Number of repos")
-        plt.title(f"Top 20 models by number of repos")
-        plt.xticks(x, labels, rotation=80)
-        plt.legend()
-        plt.tight_layout()
-        plt.savefig(f"../Figures/top_models_{suffix}.png")
-        plt.close()
-
-
-def show_library_most_pop_model(file_path_most_pop_models, data, suffix):
-    pop_models = []
-    data_dicts = []
-    with open(file_path_most_pop_models, "r") as f:
-        pop_models = json.load(f)
-    with open(data, "r") as f:
-        data_dicts = json.load(f)
-    result_dicts = []
-    for dict_value in data_dicts:
-        for tag in dict_value["tags"]:
-            for model in pop_models:
-                if model in tag:
-                    result_dicts.append(dict_value)
-                    break
-    with open(f"Data/reduced_repos_{suffix}.json", "w") as f:
-        json.dump(result_dicts, f, indent=2)
+def show_model_frequency(file_path, suffix):
+    render(show_model_frequency_job(file_path, suffix))
 
-    provider_list = ["OpenAI", "xAI", "Anthropic", "Mistral", "Google", "unknown_lib"]
-    count_dict = {}
 
-    for model in pop_models:
-        count_dict[model] = {provider: 0 for provider in provider_list}
-        count_dict[model]["tot"] = 0
+def show_top_models_job(file_path, suffix) -> FigureJob:
+    aggregates = model_aggregates(file_path)
+    model_counts = aggregates["model_counts"]
+    top20 = aggregates["top_models"]
+    with open(f"top_20_models_{suffix}.json", "w") as f:
+        json.dump(top20, f, indent=2)
+    return FigureJob(
+        draw_top_models,
+        {"top20": top20, "y": [model_counts[model] for model in top20]},
+        f"../Figures/top_models_{suffix}.png",
+    )
 
-    for dict_value in result_dicts:
-        provider_encountered = []
-        models_encountered = []
-        for tag in dict_value["tags"]:
-            if "_" in tag:
-                res = tag.split("_")
-                if len(res) == 2:
-                    if res[1] in pop_models:
-                        count_dict[res[1]]["tot"] += 1
-                        count_dict[res[1]][res[0]] += 1
-                elif len(res) == 3:
-                    if res[2] in pop_models:
-                        count_dict[res[2]]["tot"] += 1
-                        count_dict[res[2]]["unknown_lib"] += 1
-            else:
-                if tag in provider_list:
-                    provider_encountered.append(tag)
-                if tag in pop_models:
-                    models_encountered.append(tag)
-        if models_encountered and len(provider_encountered) == 1:
-            for model in models_encountered:
-                count_dict[model]["tot"] += 1
-                count_dict[model][provider_encountered[0]] += 1
-        elif models_encountered:
-            for model in models_encountered:
-                count_dict[model]["tot"] += 1
-                count_dict[model]["unknown_lib"] += 1
 
+def draw_top_models(top20: list[str], y: list[int]) -> Figure:
+    x = np.arange(len(top20))
+    labels = top20
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    ax.bar(x, y, color="skyblue", label="Number of repos for each model")
+    ax.set_xlabel("Models")
+    ax.set_ylabel("Number of repos")
+    ax.set_title(f"Top 20 models by number of repos")
+    ax.set_xticks(x)
+    ax.set_xticklabels(labels, rotation=80)
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+def show_top_models(file_path, suffix):
+    render(show_top_models_job(file_path, suffix))
+
+
+def show_library_most_pop_model_job(data, suffix) -> FigureJob:
+    aggregates = model_aggregates(data)
+    pop_models = aggregates["top_models"]
+    count_dict = aggregates["provider_model_counts"]
+    with open(f"Data/reduced_repos_{suffix}.json", "w") as f:
+        json.dump(reduce_repos(data, pop_models), f, indent=2)
+
+    provider_list = PROVIDER_LIST
     ratios = {provider: [] for provider in provider_list}
 
     for model in pop_models:
@@ -190,15 +252,26 @@ def show_library_most_pop_model(file_path_most_pop_models, data, suffix):
         for provider in provider_list:
             ratios[provider].append(counts[provider] / total)
 
+    return FigureJob(
+        draw_library_most_pop_model,
+        {"pop_models": pop_models, "provider_list": provider_list, "ratios": ratios},
+        f"../Figures/top_models_prop_{suffix}.png",
+    )
+
+
+def draw_library_most_pop_model(
+    pop_models: list[str], provider_list: list[str], ratios: dict[str, list[float]]
+) -> Figure:
     x = np.arange(len(pop_models))
     bottom = np.zeros(len(pop_models))
 
-    plt.figure(figsize=(14, 6))
+    fig = Figure(figsize=(14, 6))
+    ax = fig.subplots()
 
     color_list = ["skyblue", "limegreen", "tomato", "c", "m", "0.3"]
 
     for i in range(len(provider_list)):
-        plt.bar(
+        ax.bar(
             x,
             ratios[provider_list[i]],
             bottom=bottom,
@@ -207,33 +280,42 @@ def show_library_most_pop_model(file_path_most_pop_models, data, suffix):
         )
         bottom += np.array(ratios[provider_list[i]])
 
-    plt.xticks(x, pop_models, rotation=80)
-    plt.yticks(np.linspace(0, 1, 6))
-    plt.ylim(0, 1)
-    plt.ylabel("Proportion of Provider in most popular models")
-    plt.title("Provider Ratios per Model (Normalized)")
-    plt.legend(title="Provider", bbox_to_anchor=(1.05, 1), loc="upper left")
-    plt.tight_layout()
-    plt.savefig(f"../Figures/top_models_prop_{suffix}.png")
-    plt.close()
+    ax.set_xticks(x)
+    ax.set_xticklabels(pop_models, rotation=80)
+    ax.set_yticks(np.linspace(0, 1, 6))
+    ax.set_ylim(0, 1)
+    ax.set_ylabel("Proportion of Provider in most popular models")
+    ax.set_title("Provider Ratios per Model (Normalized)")
+    ax.legend(title="Provider", bbox_to_anchor=(1.05, 1), loc="upper left")
+    fig.tight_layout()
+    return fig
 
 
-if __name__ == "__main__":
-    show_library_imports("Data/collected_repos_python.json", "python")
-    show_model_frequency("Data/collected_repos_python.json", "python")
-    show_library_imports("Data/collected_repos_java.json", "java")
-    show_model_frequency("Data/collected_repos_java.json", "java")
-    show_library_imports("Data/collected_repos_go.json", "go")
-    show_model_frequency("Data/collected_repos_go.json", "go")
-    show_top_models("model_counts_python.json", "python")
-    show_top_models("model_counts_java.json", "java")
-    show_top_models("model_counts_go.json", "go")
-    show_library_most_pop_model(
-        "top_20_models_python.json", "Data/collected_repos_python.json", "python"
-    )
-    show_library_most_pop_model(
-        "top_20_models_java.json", "Data/collected_repos_java.json", "java"
-    )
-    show_library_most_pop_model(
-        "top_20_models_go.json", "Data/collected_repos_go.json", "go"
+def show_library_most_pop_model(data, suffix):
+    render(show_library_most_pop_model_job(data, suffix))
+
+
+def streaming_top_models_job(sketch_path: str, suffix) -> FigureJob:
+    """Top 20 models read from the usage sketch saved by the collector, without scanning the dataset"""
+    top = ModelUsageStream.load(sketch_path).top_models(20)
+    return FigureJob(
+        draw_top_models,
+        {"top20": [model for model, _ in top], "y": [count for _, count in top]},
+        f"../Figures/top_models_stream_{suffix}.png",
     )
+
+
+if __name__ == "__main__":
+    jobs = []
+    for sketch_path, suffix in [
+        ("Data/model_usage_sketch_python_model.json", "python"),
+    ]:
+        if os.path.exists(sketch_path):
+            jobs.append(streaming_top_models_job(sketch_path, suffix))
+    for suffix in ["python", "java", "go"]:
+        data_path = f"Data/collected_repos_{suffix}.json"
+        jobs.append(show_library_imports_job(data_path, suffix))
+        jobs.append(show_model_frequency_job(data_path, suffix))
+        jobs.append(show_top_models_job(data_path, suffix))
+        jobs.append(show_library_most_pop_model_job(data_path, suffix))
+    render_all(jobs)
@@ -1,8 +1,4 @@
 import os
-import openai
-from mistralai import Mistral
-from google import genai
-import anthropic
 import json
 
 STARTING_MODELS_OPENAI = [
@@ -55,6 +51,12 @@ STARTING_MODELS_MISTRALAI = ["mistral-medium-2508", "magistral-medium-2509"]
 
 
 def list_models():
+    # the SDKs are only needed to query the providers, model_catalog uses the lists without them
+    import openai
+    from mistralai import Mistral
+    from google import genai
+    import anthropic
+
     client_openai = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     openai_models = [
         model.id
@@ -120,18 +122,12 @@ def create_model_provider_dict(
     model_to_provider = {}
 
     for model in openai_models:
-        if (
-            model in model_to_provider
-            and "OpenAI" not in model_to_provider[f"{model}"]
-        ):
+        if model in model_to_provider and "OpenAI" not in model_to_provider[f"{model}"]:
             model_to_provider[f"{model}"].append("OpenAI")
         else:
             model_to_provider[f"{model}"] = ["OpenAI"]
     for model in gemini_models:
-        if (
-            model in model_to_provider
-            and "Google" not in model_to_provider[f"{model}"]
-        ):
+        if model in model_to_provider and "Google" not in model_to_provider[f"{model}"]:
             model_to_provider[f"{model}"].append("Google")
         else:
             model_to_provider[f"{model}"] = ["Google"]
@@ -0,0 +1,122 @@
+"""Single entry point of the study, `python llmstudy.py <command> [args]` runs the script of that stage"""
+
+import argparse
+import os
+import runpy
+import sys
+from typing import NamedTuple
+
+
+class Command(NamedTuple):
+    """Script run by a command, and whether it parses arguments of its own"""
+
+    module: str
+    help: str
+    forwards_args: bool = True
+    plots: bool = False
+
+
+# in the order of execution of the study, only the module of the chosen command is
+# imported so listing the commands does not pay for matplotlib, scipy or the SDKs
+COMMANDS = {
+    "search": Command("keyword_search", "collect repository metadata by month"),
+    "models": Command(
+        "list_models", "list the models of the providers", forwards_args=False
+    ),
+    "catalog": Command(
+        "model_catalog",
+        "rebuild the model dictionaries offline from the installed SDKs",
+    ),
+    "code-search": Command(
+        "library_model_search",
+        "search the code for the SDKs and the models",
+        forwards_args=False,
+    ),
+    "orchestrate": Command(
+        "orchestrate", "run the collectors of several languages sharing the API budget"
+    ),
+    "verify": Command("verify_usage", "keep the code search hits really using an SDK"),
+    "bulk-scan": Command("bulk_scan", "scan the repo tarballs for every model and SDK"),
+    "combine": Command("combine", "tag the repos found by the code searches"),
+    "attributes": Command(
+        "attribute_mining",
+        "sample repos and fetch their attributes",
+        forwards_args=False,
+    ),
+    "keyword-graphs": Command(
+        "keyword_graphs",
+        "plot the LLM repo ratios and metric correlations",
+        forwards_args=False,
+        plots=True,
+    ),
+    "library-graphs": Command(
+        "library_model_search_graphs",
+        "plot the SDK and model usage",
+        forwards_args=False,
+        plots=True,
+    ),
+    "attribute-graphs": Command(
+        "attribute_graphs",
+        "plot the LLM proportions by category",
+        forwards_args=False,
+        plots=True,
+    ),
+    "correlation": Command(
+        "correlation",
+        "plot the Spearman correlations of the sampled repos",
+        forwards_args=False,
+        plots=True,
+    ),
+    "hypothesis": Command(
+        "hypothesis_testing", "test the metric differences across languages"
+    ),
+    "export": Command("convert_to_csv", "export the JSON data to CSV or Parquet"),
+    "warehouse": Command("warehouse", "load the data into the SQLite warehouse"),
+    "snapshots": Command("snapshot_store", "show the fastest growing repos"),
+    "mock": Command("github_mock", "serve a synthetic GitHub API"),
+    "bench-collectors": Command(
+        "benchmark_collectors", "benchmark the collectors against the mock API"
+    ),
+    "bench-analysis": Command(
+        "benchmark_analysis", "benchmark the analyses on synthetic data"
+    ),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="llmstudy",
+        description="Run a stage of the study, the arguments after the command go to its script",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True, metavar="command")
+    for name, command in COMMANDS.items():
+        # the scripts with their own parser answer --help themselves
+        subparsers.add_parser(
+            name,
+            help=command.help,
+            description=command.help,
+            add_help=not command.forwards_args,
+        )
+    return parser
+
+
+def run(name: str, args: list[str]) -> None:
+    """Run the script of a command as __main__ with args as its command line"""
+    command = COMMANDS[name]
+    if command.plots:
+        # pick the headless backend up front instead of letting matplotlib probe for one
+        os.environ.setdefault("MPLBACKEND", "Agg")
+    sys.argv = [f"{command.module}.py", *args]
+    runpy.run_module(command.module, run_name="__main__", alter_sys=True)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+    if rest and not COMMANDS[args.command].forwards_args:
+        parser.error(f"{args.command} takes no arguments: {' '.join(rest)}")
+    run(args.command, rest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Offline catalog of the model names, read from the Literal type aliases of the installed provider SDKs"""
+
+import argparse
+import ast
+import importlib.util
+import os
+import re
+from importlib.metadata import PackageNotFoundError, version
+
+from aggregate_cache import cached
+from list_models import (
+    STARTING_MODELS_ANTHROPIC,
+    STARTING_MODELS_GEMINI,
+    STARTING_MODELS_META,
+    STARTING_MODELS_MISTRALAI,
+    STARTING_MODELS_OPENAI,
+    STARTING_MODELS_XAI,
+    create_model_keyword_dict,
+    create_model_provider_dict,
+    save_model_provider_dict,
+)
+
+# bumped when the extraction changes, invalidating the cached catalogs
+CATALOG_VERSION = 1
+
+# distribution and import package of the SDK of each provider, with the hand
+# maintained models of list_models
+PROVIDER_SDKS = {
+    "openai": ("openai", "openai", STARTING_MODELS_OPENAI),
+    "gemini": ("google-genai", "google.genai", STARTING_MODELS_GEMINI),
+    "mistral": ("mistralai", "mistralai", STARTING_MODELS_MISTRALAI),
+    "anthropic": ("anthropic", "anthropic", STARTING_MODELS_ANTHROPIC),
+}
+
+# ChatModel, ResponsesModel, ImageModel (openai), Model, ModelParam (anthropic)...
+MODEL_ALIAS = re.compile(r"[A-Za-z]*Model(Param)?")
+
+
+def alias_files(package: str) -> list[str]:
+    """Source files of an installed package that may define model aliases, found without importing it"""
+    try:
+        spec = importlib.util.find_spec(package)
+    except (ImportError, ValueError):
+        return []
+    if spec is None or not spec.submodule_search_locations:
+        return []
+    paths = []
+    for location in spec.submodule_search_locations:
+        for root, _, files in os.walk(location):
+            paths += [
+                os.path.join(root, name)
+                for name in files
+                if name.endswith(".py") and "model" in name
+            ]
+    return sorted(paths)
+
+
+def literal_strings(node: ast.AST):
+    """String values of the Literal[...] subscripts under node, Unions and nesting included"""
+    for sub in ast.walk(node):
+        if (
+            isinstance(sub, ast.Subscript)
+            and isinstance(sub.value, (ast.Name, ast.Attribute))
+            and (getattr(sub.value, "id", None) or sub.value.attr) == "Literal"
+        ):
+            for value in ast.walk(sub.slice):
+                if isinstance(value, ast.Constant) and isinstance(value.value, str):
+                    yield value.value
+
+
+def alias_models(path: str) -> list[str]:
+    """Models listed by the module level model aliases of a source file"""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    models = []
+    for node in tree.body:
+        if isinstance(node, ast.AnnAssign):
+            targets, value = [node.target], node.value
+        elif isinstance(node, ast.Assign):
+            targets, value = node.targets, node.value
+        else:
+            continue
+        if value is not None and any(
+            isinstance(target, ast.Name) and MODEL_ALIAS.fullmatch(target.id)
+            for target in targets
+        ):
+            models += literal_strings(value)
+    return models
+
+
+def sdk_version(distribution: str) -> str | None:
+    try:
+        return version(distribution)
+    except PackageNotFoundError:
+        return None
+
+
+def sdk_models(paths: list[str]) -> list[str]:
+    """Models of the aliases of the given files, deduplicated in order of appearance"""
+    return list(dict.fromkeys(model for path in paths for model in alias_models(path)))
+
+
+def build_catalog() -> dict:
+    """Catalog of the models of each provider, the SDK ones merged with the lists of list_models.
+
+    Cached on the content of the alias files, the SDK versions and the hand maintained lists.
+    """
+    files = {
+        provider: alias_files(package)
+        for provider, (_, package, _) in PROVIDER_SDKS.items()
+    }
+    versions = {
+        distribution: sdk_version(distribution)
+        for distribution, _, _ in PROVIDER_SDKS.values()
+    }
+
+    def compute() -> dict:
+        providers = {}
+        for provider, (_, _, starting_models) in PROVIDER_SDKS.items():
+            found = sdk_models(files[provider])
+            providers[provider] = {
+                "sdk": found,
+                # same order as list_models, the discovered models before the known ones
+                "models": [m for m in found if m not in starting_models]
+                + starting_models,
+            }
+        return {
+            "version": CATALOG_VERSION,
+            "sdk_versions": versions,
+            "providers": providers,
+        }
+
+    input_paths = [path for paths in files.values() for path in paths]
+    params = (
+        CATALOG_VERSION,
+        versions,
+        {provider: models for provider, (_, _, models) in PROVIDER_SDKS.items()},
+        STARTING_MODELS_XAI,
+        STARTING_MODELS_META,
+    )
+    return cached("model_catalog", input_paths, compute, *params)
+
+
+def write_dictionaries(catalog: dict) -> None:
+    """Regenerate model_provider_dict.json and model_keyword_dict.json from the catalog"""
+    models = [
+        catalog["providers"][provider]["models"]
+        for provider in ["openai", "gemini", "mistral", "anthropic"]
+    ]
+    save_model_provider_dict(
+        create_model_provider_dict(
+            *models, xai_models=STARTING_MODELS_XAI, meta_models=STARTING_MODELS_META
+        )
+    )
+    create_model_keyword_dict(*models, STARTING_MODELS_XAI, STARTING_MODELS_META)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="model_catalog",
+        description="Regenerate the model dictionaries offline from the installed SDKs and the lists of list_models",
+    )
+    parser.parse_args()
+    catalog = build_catalog()
+    for provider, entry in catalog["providers"].items():
+        distribution = PROVIDER_SDKS[provider][0]
+        print(
+            f"{provider}: {len(entry['models'])} models, {len(entry['sdk'])} from "
+            f"{distribution} {catalog['sdk_versions'][distribution] or '(not installed)'}"
+        )
+    write_dictionaries(catalog)
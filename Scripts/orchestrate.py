@@ -0,0 +1,215 @@
+"""Run the collectors for several languages at once under one shared rate limit budget and token pool"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import keyword_search
+import library_model_search
+from github_metrics import METRICS, RequestMetrics
+
+# requests allowed per token and window length in seconds, by API resource
+RATE_LIMITS = {
+    "search": (30, 60),
+    "code_search": (10, 60),
+    "core": (5000, 3600),
+}
+
+ENDPOINT_RESOURCES = {
+    "search/repositories": "search",
+    "search/code": "code_search",
+}
+
+LANGUAGES = ["python", "java", "c#", "javascript", "go"]
+
+
+class RateBudget:
+    """Sliding window budget of every resource for a pool of tokens.
+
+    Requests of each resource are granted in arrival order, so languages running concurrently
+    are interleaved fairly, and each goes out with the token with the most room left.
+    """
+
+    def __init__(self, tokens: list[str], limits: dict | None = None):
+        if not tokens:
+            raise ValueError("No github token provided")
+        self.tokens = tokens
+        self.limits = limits or RATE_LIMITS
+        self.cond = threading.Condition()
+        self.sent = {
+            resource: {token: deque() for token in tokens} for resource in self.limits
+        }
+        self.waiting = {resource: deque() for resource in self.limits}
+        self.granted = {}
+
+    def acquire(self, endpoint: str) -> str:
+        """Block until a request to the endpoint fits in the budget, return the token to use"""
+        resource = ENDPOINT_RESOURCES.get(endpoint, "core")
+        limit, window = self.limits[resource]
+        who = threading.current_thread().name
+        with self.cond:
+            ticket = object()
+            queue = self.waiting[resource]
+            queue.append(ticket)
+            while True:
+                if queue[0] is not ticket:
+                    self.cond.wait()
+                    continue
+                now = time.monotonic()
+                for sent in self.sent[resource].values():
+                    while sent and sent[0] <= now - window:
+                        sent.popleft()
+                token = min(self.tokens, key=lambda t: len(self.sent[resource][t]))
+                sent = self.sent[resource][token]
+                if len(sent) < limit:
+                    sent.append(now)
+                    queue.popleft()
+                    self.granted[who] = self.granted.get(who, 0) + 1
+                    self.cond.notify_all()
+                    return token
+                self.cond.wait(
+                    timeout=min(s[0] for s in self.sent[resource].values())
+                    + window
+                    - now
+                )
+
+
+def token_pool(tokens: list[str] | None = None) -> list[str]:
+    """Tokens given on the command line, else GITHUB_TOKENS (comma separated), else GITHUB_TOKEN"""
+    if tokens:
+        return tokens
+    env_tokens = os.getenv("GITHUB_TOKENS") or os.getenv("GITHUB_TOKEN") or ""
+    return [token for token in env_tokens.split(",") if token]
+
+
+def parse_target(
+    value: str, default_start: date, default_end: date
+) -> tuple[str, date, date]:
+    """language or language:start or language:start:end"""
+    parts = value.split(":")
+    return (
+        parts[0].lower(),
+        date.fromisoformat(parts[1]) if len(parts) > 1 and parts[1] else default_start,
+        date.fromisoformat(parts[2]) if len(parts) > 2 and parts[2] else default_end,
+    )
+
+
+def orchestrate(
+    targets: list[tuple[str, date, date]],
+    tokens: list[str],
+    stages: list[str],
+    repos_per_month: int = 100,
+    exhaustive: bool = False,
+    model_keyword_dict: dict | None = None,
+    limits: dict | None = None,
+) -> dict:
+    """Run every stage for every language concurrently, return the requests granted to each job"""
+    budget = RateBudget(tokens, limits)
+    started = time.time()
+
+    jobs = []
+    for language, start, end in targets:
+        if "repos" in stages:
+            if exhaustive:
+                jobs.append(
+                    (
+                        f"repos-{language}",
+                        keyword_search.exhaustive_repo_search,
+                        (language, start, end, tokens[0]),
+                    )
+                )
+            else:
+                jobs.append(
+                    (
+                        f"repos-{language}",
+                        keyword_search.repo_search,
+                        (language, start, end, repos_per_month, tokens[0]),
+                    )
+                )
+        if "code" in stages:
+            jobs.append(
+                (
+                    f"code-{language}",
+                    library_model_search.collect_repo_by_language,
+                    (language, model_keyword_dict, "model"),
+                )
+            )
+
+    # one recorder per job, so the report of each collector only counts its own requests
+    recorders = {name: RequestMetrics() for name, _, _ in jobs}
+    for recorder in recorders.values():
+        recorder.scheduler = budget
+
+    def run(job):
+        name, function, args = job
+        threading.current_thread().name = name
+        METRICS.use(recorders[name])
+        started = time.perf_counter()
+        try:
+            function(*args)
+        finally:
+            METRICS.use(None)
+        print(f"{name} done in {time.perf_counter() - started:.1f}s")
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        for future in [pool.submit(run, job) for job in jobs]:
+            future.result()
+
+    # totals of all the jobs, their sleeps add up across the concurrent threads
+    total = RequestMetrics()
+    for recorder in recorders.values():
+        total.merge(recorder)
+    total.started = started
+    total.write_report("Data/metrics_orchestrate")
+    return budget.granted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="orchestrate",
+        description="Collect repos and code search hits for several languages concurrently, sharing the API budget",
+    )
+    parser.add_argument(
+        "targets",
+        nargs="*",
+        default=LANGUAGES,
+        help="language, language:start or language:start:end",
+    )
+    parser.add_argument(
+        "-s",
+        "--start",
+        default=date(2022, 1, 1),
+        type=lambda s: date.fromisoformat(s),
+    )
+    parser.add_argument(
+        "-f", "--finish", default=date.today(), type=lambda s: date.fromisoformat(s)
+    )
+    parser.add_argument(
+        "--stages", nargs="+", default=["repos", "code"], choices=["repos", "code"]
+    )
+    parser.add_argument("-m", "--monthly", default=100, type=int)
+    parser.add_argument("-e", "--exhaustive", action="store_true")
+    parser.add_argument(
+        "-t", "--token", action="append", help="may be repeated to pool tokens"
+    )
+    args = parser.parse_args()
+
+    model_keyword_dict = None
+    if "code" in args.stages:
+        with open("model_keyword_dict.json", "r") as f:
+            model_keyword_dict = json.load(f)
+    granted = orchestrate(
+        [parse_target(target, args.start, args.finish) for target in args.targets],
+        token_pool(args.token),
+        args.stages,
+        repos_per_month=args.monthly,
+        exhaustive=args.exhaustive,
+        model_keyword_dict=model_keyword_dict,
+    )
+    for name, n in sorted(granted.items()):
+        print(f"{name}: {n} requests")
@@ -0,0 +1,101 @@
+"""Typed repo metadata records and their JSON codec, shared by the collectors and the analyses"""
+
+import json
+from dataclasses import dataclass, field, fields
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@dataclass(slots=True)
+class RepoMetadata:
+    """Metadata kept for a repo, as written to *_repo_metadata.json and sampled_repo_*.json"""
+
+    id: int | None = None
+    name: str | None = None
+    full_name: str | None = None
+    html_url: str | None = None
+    description: str | None = None
+    language: str | None = None
+    created_at: str | None = None
+    stargazers_count: int | None = None
+    open_issues_count: int | None = None
+    size: float | None = None
+    topics: list[str] = field(default_factory=list)
+    license: str | None = None
+    owner_login: str | None = None
+    owner_type: str | None = None
+    archived: bool | None = None
+    subscribers_count: int | None = None
+    network_count: int | None = None
+
+    @classmethod
+    def from_api(cls, item: dict, detailed_data: dict | None = None) -> "RepoMetadata":
+        """Record of a repo from its API payload, the detail-only fields taken from detailed_data if given"""
+        if detailed_data is None:
+            detailed_data = item
+        license = item.get("license")
+        owner = item.get("owner")
+        return cls(
+            id=item.get("id"),
+            name=item.get("name"),
+            full_name=item.get("full_name"),
+            html_url=item.get("html_url"),
+            description=item.get("description"),
+            language=item.get("language"),
+            created_at=item.get("created_at"),
+            stargazers_count=item.get("stargazers_count"),
+            open_issues_count=item.get("open_issues_count"),
+            size=item.get("size") / 1000,
+            topics=item.get("topics", []),
+            license=license.get("key") if license else None,
+            owner_login=owner["login"] if owner else None,
+            owner_type=owner["type"] if owner else None,
+            archived=item.get("archived"),
+            subscribers_count=detailed_data.get("subscribers_count"),
+            network_count=detailed_data.get("network_count"),
+        )
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RepoMetadata":
+        """Record of a decoded JSON object, missing fields left to their default and unknown keys dropped"""
+        return cls(**{name: d[name] for name in FIELD_NAMES if name in d})
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in FIELD_NAMES}
+
+    def get(self, name: str, default=None):
+        """Field by name, so code written against the JSON dicts also accepts records"""
+        return getattr(self, name, default)
+
+
+FIELD_NAMES = tuple(f.name for f in fields(RepoMetadata))
+
+
+def load_records(path: str) -> list[RepoMetadata]:
+    """Decode a JSON array of repo metadata, with orjson when installed"""
+    if orjson is not None:
+        with open(path, "rb") as f:
+            data_dicts = orjson.loads(f.read())
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data_dicts = json.load(f)
+    return [RepoMetadata.from_dict(d) for d in data_dicts]
+
+
+def dump_records(records: list[RepoMetadata], path: str, indent: bool = False) -> None:
+    """Encode repo metadata as a JSON array, with orjson when installed"""
+    if orjson is not None:
+        # orjson serializes dataclasses natively, without building the dicts
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(records, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                [record.to_dict() for record in records],
+                f,
+                ensure_ascii=False,
+                indent=2 if indent else None,
+            )
@@ -0,0 +1,111 @@
+"""Parallel, headless rendering of the figures produced by the graph scripts"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, NamedTuple
+
+MANIFEST_PATH = "../Figures/.render_manifest.json"
+
+
+class FigureJob(NamedTuple):
+    """Data of one figure, the module level function drawing it and where to save it.
+
+    draw is called as draw(**data) and must return a matplotlib.figure.Figure.
+    """
+
+    draw: Callable
+    data: dict
+    output_path: str
+
+
+def use_agg() -> None:
+    """Force the non-interactive Agg backend, used as process pool initializer"""
+    import matplotlib
+
+    matplotlib.use("Agg", force=True)
+
+
+def job_hash(job: FigureJob) -> str:
+    """Hash of the figure data and of the source of the module of its draw function.
+
+    The whole module is hashed, the draw functions use its helpers and constants.
+    """
+    digest = hashlib.sha256()
+    digest.update(inspect.getsource(inspect.getmodule(job.draw)).encode("utf-8"))
+    digest.update(pickle.dumps(job.data, protocol=4))
+    return digest.hexdigest()
+
+
+def draw_and_save(job: FigureJob) -> str:
+    fig = job.draw(**job.data)
+    fig.savefig(job.output_path)
+    return job.output_path
+
+
+def load_manifest(manifest_path: str) -> dict[str, str]:
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict[str, str], manifest_path: str) -> None:
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def render_all(
+    jobs: list[FigureJob],
+    workers: int | None = None,
+    force: bool = False,
+    manifest_path: str = MANIFEST_PATH,
+) -> list[str]:
+    """Render the figures whose data changed since the last run in a process pool, return their paths.
+
+    The manifest is saved as each figure completes, so a failing figure does not make the others render again.
+    """
+    manifest = load_manifest(manifest_path)
+    hashes = {job.output_path: job_hash(job) for job in jobs}
+    pending = [
+        job
+        for job in jobs
+        if force
+        or not os.path.exists(job.output_path)
+        or manifest.get(job.output_path) != hashes[job.output_path]
+    ]
+    if len(jobs) > len(pending):
+        print(f"{len(jobs) - len(pending)} figures unchanged, skipping them.")
+
+    def done(path: str) -> None:
+        manifest[path] = hashes[path]
+        save_manifest(manifest, manifest_path)
+
+    if workers == 1 or len(pending) <= 1:
+        use_agg()
+        for job in pending:
+            done(draw_and_save(job))
+    else:
+        errors = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=use_agg) as pool:
+            for future in as_completed(
+                [pool.submit(draw_and_save, job) for job in pending]
+            ):
+                try:
+                    done(future.result())
+                except Exception as e:
+                    errors.append(e)
+        if errors:
+            raise errors[0]
+    return [job.output_path for job in pending]
+
+
+def render(job: FigureJob, force: bool = False) -> list[str]:
+    """Render a single figure in the current process"""
+    return render_all([job], workers=1, force=force)
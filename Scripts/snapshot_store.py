@@ -0,0 +1,214 @@
+"""Longitudinal store of repo popularity counters, recording only the values changed by each crawl"""
+
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+SNAPSHOT_PATH = "Data/snapshots.npz"
+
+# collectors running in threads of the same process record their crawls one at a time
+_record_lock = threading.Lock()
+
+SNAPSHOT_METRICS = [
+    "stargazers_count",
+    "network_count",
+    "subscribers_count",
+    "open_issues_count",
+]
+
+
+class SnapshotStore:
+    """Delta encoded time series of SNAPSHOT_METRICS for every repo ever crawled.
+
+    Each change is a (crawl, repo, metric, delta) row appended in crawl order, the first value of a
+    repo being a delta from 0. Values at any crawl are prefix sums of the deltas.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        self.repos = []
+        self.repo_index = {}
+        self.crawl_times = np.zeros(0, dtype=np.float64)
+        self.change_crawl = np.zeros(0, dtype=np.int32)
+        self.change_repo = np.zeros(0, dtype=np.int32)
+        self.change_metric = np.zeros(0, dtype=np.int8)
+        self.change_delta = np.zeros(0, dtype=np.int64)
+        # latest value of every (repo, metric), -1 when never seen
+        self.latest = np.zeros((0, len(SNAPSHOT_METRICS)), dtype=np.int64)
+        if os.path.exists(path):
+            self.load()
+
+    def load(self) -> None:
+        with np.load(self.path) as data:
+            self.repos = data["repos"].tolist()
+            self.crawl_times = data["crawl_times"]
+            self.change_crawl = data["change_crawl"]
+            self.change_repo = data["change_repo"]
+            self.change_metric = data["change_metric"]
+            self.change_delta = data["change_delta"]
+            self.latest = data["latest"]
+        self.repo_index = {name: i for i, name in enumerate(self.repos)}
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f,
+                repos=np.array(self.repos, dtype=str),
+                crawl_times=self.crawl_times,
+                change_crawl=self.change_crawl,
+                change_repo=self.change_repo,
+                change_metric=self.change_metric,
+                change_delta=self.change_delta,
+                latest=self.latest,
+            )
+        os.replace(tmp_path, self.path)
+
+    def record(self, data_dicts: list[dict], taken_at: float | None = None) -> int:
+        """Append a crawl, storing only the counters that changed, return the number of changes"""
+        if taken_at is None:
+            taken_at = time.time()
+        if len(self.crawl_times) and taken_at < self.crawl_times[-1]:
+            raise ValueError("crawls must be recorded in chronological order")
+
+        # a repo listed twice in a crawl keeps its last values
+        crawled = {}
+        for d in data_dicts:
+            full_name = d.get("full_name")
+            if not full_name:
+                continue
+            if full_name not in self.repo_index:
+                self.repo_index[full_name] = len(self.repos)
+                self.repos.append(full_name)
+            counters = [d.get(metric) for metric in SNAPSHOT_METRICS]
+            crawled[self.repo_index[full_name]] = [
+                -1 if value is None else value for value in counters
+            ]
+        rows = list(crawled.keys())
+        values = list(crawled.values())
+        if len(self.repos) > len(self.latest):
+            self.latest = np.vstack(
+                [
+                    self.latest,
+                    np.full(
+                        (len(self.repos) - len(self.latest), len(SNAPSHOT_METRICS)),
+                        -1,
+                        dtype=np.int64,
+                    ),
+                ]
+            )
+
+        rows = np.array(rows, dtype=np.int32)
+        values = np.array(values, dtype=np.int64).reshape(
+            len(rows), len(SNAPSHOT_METRICS)
+        )
+        # missing values keep the previous one
+        values = np.where(values < 0, self.latest[rows], values)
+        previous = np.maximum(self.latest[rows], 0)
+        changed_repo, changed_metric = np.nonzero(
+            (values != self.latest[rows]) & (values >= 0)
+        )
+
+        crawl = len(self.crawl_times)
+        self.crawl_times = np.append(self.crawl_times, taken_at)
+        self.change_crawl = np.concatenate(
+            [self.change_crawl, np.full(len(changed_repo), crawl, dtype=np.int32)]
+        )
+        self.change_repo = np.concatenate([self.change_repo, rows[changed_repo]])
+        self.change_metric = np.concatenate(
+            [self.change_metric, changed_metric.astype(np.int8)]
+        )
+        self.change_delta = np.concatenate(
+            [
+                self.change_delta,
+                values[changed_repo, changed_metric]
+                - previous[changed_repo, changed_metric],
+            ]
+        )
+        self.latest[rows] = values
+        return len(changed_repo)
+
+    def as_of(self, when: float) -> tuple[np.ndarray, np.ndarray]:
+        """Values of every repo and metric at the last crawl not after when, as (values, known)"""
+        n_crawls = np.searchsorted(self.crawl_times, when, side="right")
+        # changes are stored in crawl order, so the crawls up to when are a prefix
+        n_changes = np.searchsorted(self.change_crawl, n_crawls, side="left")
+        key = (
+            self.change_repo[:n_changes].astype(np.int64) * len(SNAPSHOT_METRICS)
+            + self.change_metric[:n_changes]
+        )
+        size = len(self.repos) * len(SNAPSHOT_METRICS)
+        values = np.bincount(
+            key, weights=self.change_delta[:n_changes], minlength=size
+        ).astype(np.int64)
+        known = np.bincount(key, minlength=size) > 0
+        shape = (len(self.repos), len(SNAPSHOT_METRICS))
+        return values.reshape(shape), known.reshape(shape)
+
+    def growth_rate(
+        self, start: float, end: float, metric: str = "stargazers_count"
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Change per day of a metric between two dates, NaN for repos unknown at start"""
+        m = SNAPSHOT_METRICS.index(metric)
+        start_values, start_known = self.as_of(start)
+        end_values, _ = self.as_of(end)
+        days = max(end - start, 1) / 86400
+        rate = (end_values[:, m] - start_values[:, m]) / days
+        rate[~start_known[:, m]] = np.nan
+        return np.array(self.repos, dtype=str), rate
+
+    def history(self, full_name: str) -> dict[str, np.ndarray]:
+        """Crawl times and values of one repo at the crawls that changed it"""
+        changes = np.nonzero(self.change_repo == self.repo_index[full_name])[0]
+        crawls = np.unique(self.change_crawl[changes])
+        history = {"taken_at": self.crawl_times[crawls]}
+        for m, metric in enumerate(SNAPSHOT_METRICS):
+            deltas = np.zeros(len(crawls), dtype=np.int64)
+            own = changes[self.change_metric[changes] == m]
+            np.add.at(
+                deltas,
+                np.searchsorted(crawls, self.change_crawl[own]),
+                self.change_delta[own],
+            )
+            history[metric] = np.cumsum(deltas)
+        return history
+
+
+def record_crawl(data_dicts: list[dict], path: str = SNAPSHOT_PATH) -> int:
+    """Record the counters of a crawl in the snapshot store at path"""
+    with _record_lock:
+        store = SnapshotStore(path)
+        n_changes = store.record(data_dicts)
+        store.save()
+    print(f"recorded {n_changes} changed counters in {path}")
+    return n_changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="snapshot_store",
+        description="Show the star growth rate of the crawled repos between two dates",
+    )
+    parser.add_argument(
+        "start", type=lambda s: time.mktime(time.strptime(s, "%Y-%m-%d"))
+    )
+    parser.add_argument(
+        "-e",
+        "--end",
+        default=time.time(),
+        type=lambda s: time.mktime(time.strptime(s, "%Y-%m-%d")),
+    )
+    parser.add_argument("-m", "--metric", default="stargazers_count")
+    parser.add_argument("-n", "--top", default=20, type=int)
+    parser.add_argument("-p", "--path", default=SNAPSHOT_PATH)
+    args = parser.parse_args()
+    repos, rate = SnapshotStore(args.path).growth_rate(
+        args.start, args.end, args.metric
+    )
+    order = np.argsort(np.nan_to_num(rate, nan=-np.inf))[::-1][: args.top]
+    for i in order:
+        print(f"{repos[i]}: {rate[i]:.2f} {args.metric}/day")
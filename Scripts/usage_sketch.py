@@ -0,0 +1,128 @@
+"""Bounded memory streaming counters for model usage"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+class SpaceSaving:
+    """Space-Saving heavy hitters: at most capacity counters, each count overestimates by at most its error"""
+
+    def __init__(self, capacity: int = 200):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def update(self, item: str, n: int = 1) -> None:
+        if item in self.counts:
+            self.counts[item] += n
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = n
+            self.errors[item] = 0
+        else:
+            # replace the smallest counter, the new item inherits its count as error
+            victim = min(self.counts, key=self.counts.get)
+            floor = self.counts.pop(victim)
+            self.errors.pop(victim)
+            self.counts[item] = floor + n
+            self.errors[item] = floor
+
+    def top(self, k: int) -> list[tuple[str, int, int]]:
+        """The k items with the highest counts as (item, count, max overestimation)"""
+        items = sorted(self.counts, key=self.counts.get, reverse=True)[:k]
+        return [(item, self.counts[item], self.errors[item]) for item in items]
+
+    def to_dict(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "counts": self.counts,
+            "errors": self.errors,
+        }
+
+    @classmethod
+    def from_dict(cls, dict):
+        obj = cls(dict["capacity"])
+        obj.counts = dict["counts"]
+        obj.errors = dict["errors"]
+        return obj
+
+
+class CountMinSketch:
+    """Count-min sketch giving an upper bound of the count of any item in width x depth counters"""
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+
+    def _indexes(self, item: str) -> np.ndarray:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=8 * self.depth)
+        return (
+            np.frombuffer(digest.digest(), dtype=np.uint64) % np.uint64(self.width)
+        ).astype(np.intp)
+
+    def update(self, item: str, n: int = 1) -> None:
+        self.table[np.arange(self.depth), self._indexes(item)] += n
+
+    def estimate(self, item: str) -> int:
+        return int(self.table[np.arange(self.depth), self._indexes(item)].min())
+
+    def to_dict(self) -> dict:
+        return {"width": self.width, "depth": self.depth, "table": self.table.tolist()}
+
+    @classmethod
+    def from_dict(cls, dict):
+        obj = cls(dict["width"], dict["depth"])
+        obj.table = np.array(dict["table"], dtype=np.int64)
+        return obj
+
+
+class ModelUsageStream:
+    """Incremental top-k of the models found by the model collection, fed with each (repo, model) pair once.
+
+    Provider usage is not streamed, the model collection does not see the library imports it is
+    counted from, show_library_imports counts it on the combined dataset.
+    """
+
+    def __init__(self, capacity: int = 200):
+        self.models = SpaceSaving(capacity)
+        self.sketch = CountMinSketch()
+        self.n_updates = 0
+
+    def add(self, model: str) -> None:
+        """Count a model found for the first time in a repo"""
+        self.n_updates += 1
+        self.models.update(model)
+        self.sketch.update(model)
+
+    def top_models(self, k: int = 20) -> list[tuple[str, int]]:
+        """Top k models, with counts tightened by the count-min estimate"""
+        return [
+            (model, min(count, self.sketch.estimate(model)))
+            for model, count, _ in self.models.top(k)
+        ]
+
+    def save(self, path: str) -> None:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "models": self.models.to_dict(),
+                    "sketch": self.sketch.to_dict(),
+                    "n_updates": self.n_updates,
+                },
+                f,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "r") as f:
+            dict = json.load(f)
+        obj = cls(dict["models"]["capacity"])
+        obj.models = SpaceSaving.from_dict(dict["models"])
+        obj.sketch = CountMinSketch.from_dict(dict["sketch"])
+        obj.n_updates = dict["n_updates"]
+        return obj
@@ -0,0 +1,309 @@
+"""Confirm the code search hits by fetching the matched files and looking for real SDK imports and model call sites"""
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+GITHUB_RAW_URL = os.getenv("GITHUB_RAW_URL", "https://raw.githubusercontent.com")
+BLOB_CACHE_DIR = "Data/.blob_cache"
+HEADERS = {"Authorization": f"Bearer {os.getenv('GITHUB_TOKEN')}"}
+
+# import prefixes of the SDK of each provider, by language
+SDK_IMPORTS = {
+    "python": {
+        "OpenAI": ["openai"],
+        "Anthropic": ["anthropic"],
+        "Google": ["google.genai", "google.generativeai", "vertexai"],
+        "Mistral": ["mistralai"],
+        "xAI": ["xai_sdk"],
+    },
+    "java": {
+        "OpenAI": ["com.openai", "com.theokanning.openai"],
+        "Anthropic": ["com.anthropic"],
+        "Google": ["com.google.genai", "com.google.cloud.vertexai"],
+        "Mistral": ["ai.mistral"],
+        "xAI": [],
+    },
+    "go": {
+        "OpenAI": ["github.com/openai/openai-go", "github.com/sashabaranov/go-openai"],
+        "Anthropic": ["github.com/anthropics/anthropic-sdk-go"],
+        "Google": ["google.golang.org/genai", "github.com/google/generative-ai-go"],
+        "Mistral": ["github.com/gage-technologies/mistral-go"],
+        "xAI": [],
+    },
+}
+
+VENDORED_DIRS = ["vendor/", "node_modules/", "site-packages/", "third_party/"]
+
+TOKEN_RE = re.compile(
+    r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+    |(?P<string>"(?:\\.|[^"\\\n])*"|`[^`]*`)
+    |(?P<char>'(?:\\.|[^'\\\n])+')
+    |(?P<ident>[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*)
+    |(?P<punct>:=|[()=;{},])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_local = threading.local()
+
+
+def session(pool_size: int) -> requests.Session:
+    """One session per thread, with a connection pool per host"""
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        _local.session.mount("https://", adapter)
+        _local.session.mount("http://", adapter)
+    return _local.session
+
+
+def blob_cache_path(full_name: str, file_path: str, cache_dir: str) -> str:
+    key = hashlib.sha256(f"{full_name}/{file_path}".encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, key[:2], key)
+
+
+def fetch_blob(
+    full_name: str, file_path: str, cache_dir: str = BLOB_CACHE_DIR, pool_size: int = 16
+) -> str | None:
+    """Content of a file of the default branch, None if it no longer exists"""
+    cache_path = blob_cache_path(full_name, file_path, cache_dir)
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return f.read()
+    if os.path.exists(f"{cache_path}.missing"):
+        return None
+
+    response = session(pool_size).get(
+        f"{GITHUB_RAW_URL}/{full_name}/HEAD/{file_path}", headers=HEADERS, timeout=30
+    )
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    if response.status_code == 404:
+        open(f"{cache_path}.missing", "w").close()
+        return None
+    response.raise_for_status()
+    content = response.content.decode("utf-8", errors="replace")
+    with open(f"{cache_path}.tmp", "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(f"{cache_path}.tmp", cache_path)
+    return content
+
+
+def analyze_python(source: str) -> tuple[set[str], set[str]]:
+    """Imported modules and string arguments of calls, resolving module level string constants"""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return set(), set()
+    imports = set()
+    constants = {}
+    call_args = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            imports.add(node.module)
+            imports.update(f"{node.module}.{alias.name}" for alias in node.names)
+        elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and isinstance(node.value.value, str):
+                    constants[target.id] = node.value.value
+        elif isinstance(node, ast.Call):
+            call_args += node.args + [keyword.value for keyword in node.keywords]
+    strings = set()
+    for arg in call_args:
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+            strings.add(arg.value)
+        elif isinstance(arg, ast.Name) and arg.id in constants:
+            strings.add(constants[arg.id])
+    return imports, strings
+
+
+def analyze_tokens(source: str) -> tuple[set[str], set[str]]:
+    """Imports and string arguments of calls of Java and Go sources, comments excluded"""
+    tokens = [
+        (match.lastgroup, match.group())
+        for match in TOKEN_RE.finditer(source)
+        if match.lastgroup != "comment"
+    ]
+    imports = set()
+    constants = {}
+    strings = set()
+    # for every open parenthesis, whether it opens the arguments of a call
+    parens = []
+    i = 0
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if kind == "ident" and text == "import":
+            # java: import a.b.C; go: import "x", import alias "x" or import ( ... )
+            j = i + 1
+            grouped = j < len(tokens) and tokens[j][1] == "("
+            while j < len(tokens) and tokens[j][1] not in (";", ")"):
+                if tokens[j][0] == "string":
+                    imports.add(tokens[j][1][1:-1])
+                elif tokens[j][0] == "ident" and tokens[j][1] != "static":
+                    imports.add(tokens[j][1])
+                j += 1
+                if not grouped and tokens[j - 1][0] == "string":
+                    break
+            # skip the closing ; or ) of the import
+            if j < len(tokens) and tokens[j][1] in (";", ")"):
+                j += 1
+            i = j
+            continue
+        if kind == "punct" and text == "(":
+            parens.append(i > 0 and tokens[i - 1][0] == "ident")
+        elif kind == "punct" and text == ")":
+            if parens:
+                parens.pop()
+        elif kind == "string":
+            value = text[1:-1]
+            if (
+                i >= 2
+                and tokens[i - 1][1] in ("=", ":=")
+                and tokens[i - 2][0] == "ident"
+            ):
+                constants[tokens[i - 2][1]] = value
+            if parens and parens[-1]:
+                strings.add(value)
+        elif kind == "ident" and parens and parens[-1] and text in constants:
+            strings.add(constants[text])
+        i += 1
+    return imports, strings
+
+
+def analyze(args: tuple[str, str | None]) -> tuple[set[str], set[str]] | None:
+    """Imports and call string arguments of a source, None if it could not be fetched"""
+    language, source = args
+    if source is None:
+        return None
+    if language == "python":
+        return analyze_python(source)
+    return analyze_tokens(source)
+
+
+def imports_sdk(imports: set[str], prefixes: list[str]) -> bool:
+    return any(
+        module == prefix
+        or module.startswith(f"{prefix}.")
+        or module.startswith(f"{prefix}/")
+        for module in imports
+        for prefix in prefixes
+    )
+
+
+def verify_collection(
+    data_path: str,
+    language: str,
+    kind: str,
+    workers: int = 16,
+    cache_dir: str = BLOB_CACHE_DIR,
+) -> tuple[list[dict], dict[str, int]]:
+    """Keep the (repo, file, label) hits confirmed by the content of the file.
+
+    kind is "library", whose labels are providers confirmed by an import of their SDK,
+    or "model", whose labels are model names confirmed by a call taking them as argument.
+    """
+    with open(data_path, "r", encoding="utf-8") as f:
+        repo_dicts = json.load(f)
+    files = sorted(
+        {
+            (repo_dict["full_name"], file_path)
+            for repo_dict in repo_dicts
+            for paths in repo_dict["labels"].values()
+            for file_path in paths
+            if not any(vendored in file_path for vendored in VENDORED_DIRS)
+        }
+    )
+
+    def fetch(file):
+        try:
+            return fetch_blob(*file, cache_dir=cache_dir, pool_size=workers)
+        except requests.exceptions.RequestException as e:
+            print(f"Could not fetch {file[0]}/{file[1]}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        sources = list(pool.map(fetch, files))
+    with ProcessPoolExecutor() as pool:
+        results = dict(
+            zip(
+                files,
+                pool.map(
+                    analyze,
+                    [(language, source) for source in sources],
+                    chunksize=64,
+                ),
+            )
+        )
+
+    stats = {"hits": 0, "confirmed": 0, "vendored": 0, "unavailable": 0}
+    verified = []
+    for repo_dict in repo_dicts:
+        labels = {}
+        for label, paths in repo_dict["labels"].items():
+            for file_path in paths:
+                stats["hits"] += 1
+                if (repo_dict["full_name"], file_path) not in results:
+                    stats["vendored"] += 1
+                    continue
+                result = results[(repo_dict["full_name"], file_path)]
+                if result is None:
+                    stats["unavailable"] += 1
+                    continue
+                imports, strings = result
+                if kind == "library":
+                    confirmed = imports_sdk(
+                        imports, SDK_IMPORTS[language].get(label, [])
+                    )
+                else:
+                    confirmed = label in strings
+                if confirmed:
+                    stats["confirmed"] += 1
+                    labels.setdefault(label, []).append(file_path)
+        if labels:
+            verified.append({**repo_dict, "labels": labels})
+    return verified, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="verify_usage",
+        description="Filter the code search collections to the files that really import the SDKs or call the models",
+    )
+    parser.add_argument("language", choices=list(SDK_IMPORTS))
+    parser.add_argument("-w", "--workers", default=16, type=int)
+    parser.add_argument("--cache-dir", default=BLOB_CACHE_DIR)
+    args = parser.parse_args()
+    for kind in ["library", "model"]:
+        data_path = f"Data/collected_repos_{args.language}_{kind}.json"
+        if not os.path.exists(data_path):
+            print(f"{data_path} not found, skipping.")
+            continue
+        verified, stats = verify_collection(
+            data_path,
+            args.language,
+            kind,
+            workers=args.workers,
+            cache_dir=args.cache_dir,
+        )
+        with open(
+            f"Data/collected_repos_{args.language}_{kind}_verified.json",
+            "w",
+            encoding="utf-8",
+        ) as f:
+            json.dump(verified, f, indent=2)
+        print(
+            f"{data_path}: {stats['confirmed']}/{stats['hits']} hits confirmed, "
+            f"{stats['vendored']} vendored, {stats['unavailable']} unavailable, "
+            f"{len(verified)} repos kept"
+        )
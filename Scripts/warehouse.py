@@ -0,0 +1,317 @@
+"""Local SQLite warehouse of the collected data, loaded incrementally from the JSON files under Data/"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from records import load_records
+
+WAREHOUSE_PATH = "Data/warehouse.sqlite"
+
+METRIC_COLUMNS = [
+    "stargazers_count",
+    "open_issues_count",
+    "size",
+    "subscribers_count",
+    "network_count",
+]
+
+REPO_COLUMNS = [
+    "id",
+    "name",
+    "full_name",
+    "html_url",
+    "description",
+    "created_at",
+    "license",
+    "owner_login",
+    "owner_type",
+    "archived",
+    *METRIC_COLUMNS,
+]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS repos (
+    language TEXT NOT NULL,
+    id INTEGER,
+    name TEXT,
+    full_name TEXT NOT NULL,
+    html_url TEXT,
+    description TEXT,
+    created_at TEXT,
+    created_month TEXT,
+    license TEXT,
+    owner_login TEXT,
+    owner_type TEXT,
+    archived INTEGER,
+    {", ".join(f"{m} REAL" for m in METRIC_COLUMNS)},
+    topics TEXT,
+    is_llm INTEGER NOT NULL,
+    PRIMARY KEY (language, full_name)
+);
+CREATE INDEX IF NOT EXISTS repos_full_name ON repos (full_name);
+CREATE INDEX IF NOT EXISTS repos_language_month ON repos (language, created_month);
+
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY,
+    full_name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    UNIQUE (full_name, path)
+);
+
+CREATE TABLE IF NOT EXISTS labels (
+    collection TEXT NOT NULL,
+    file_id INTEGER NOT NULL REFERENCES files (file_id),
+    label TEXT NOT NULL,
+    PRIMARY KEY (collection, file_id, label)
+);
+CREATE INDEX IF NOT EXISTS labels_label ON labels (label);
+
+CREATE TABLE IF NOT EXISTS tags (
+    language TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (language, full_name, tag)
+);
+CREATE INDEX IF NOT EXISTS tags_full_name ON tags (full_name);
+
+CREATE TABLE IF NOT EXISTS samples (
+    language TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    full_name TEXT,
+    created_at TEXT,
+    created_month TEXT,
+    {", ".join(f"{m} REAL" for m in METRIC_COLUMNS)},
+    PRIMARY KEY (language, position)
+);
+CREATE INDEX IF NOT EXISTS samples_full_name ON samples (full_name);
+
+CREATE TABLE IF NOT EXISTS ingested (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    loaded_at REAL NOT NULL
+);
+"""
+
+
+def connect(path: str = WAREHOUSE_PATH) -> sqlite3.Connection:
+    """Open the warehouse, creating the schema if needed"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def needs_loading(conn: sqlite3.Connection, path: str) -> str | None:
+    """Content hash of the file if it changed since it was last loaded, None otherwise"""
+    sha = file_sha256(path)
+    row = conn.execute("SELECT sha256 FROM ingested WHERE path = ?", (path,)).fetchone()
+    if row and row[0] == sha:
+        return None
+    return sha
+
+
+def mark_loaded(conn: sqlite3.Connection, path: str, sha: str) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO ingested (path, sha256, loaded_at) VALUES (?, ?, ?)",
+        (path, sha, time.time()),
+    )
+
+
+def load_metadata(conn: sqlite3.Connection, path: str, language: str) -> int:
+    """Load a keyword_search metadata file, return the number of rows or 0 if unchanged"""
+    # imported here, the graph modules bring matplotlib and scipy with them
+    from keyword_graphs import is_llm_repo
+
+    sha = needs_loading(conn, path)
+    if sha is None:
+        return 0
+    data_dicts = load_records(path)
+    with conn:
+        conn.execute("DELETE FROM repos WHERE language = ?", (language,))
+        conn.executemany(
+            f"""INSERT OR REPLACE INTO repos
+            (language, {", ".join(REPO_COLUMNS)}, created_month, topics, is_llm)
+            VALUES ({", ".join("?" * (len(REPO_COLUMNS) + 4))})""",
+            (
+                (
+                    language,
+                    *(getattr(d, column) for column in REPO_COLUMNS),
+                    (d.created_at or "")[:7] or None,
+                    json.dumps(d.topics or []),
+                    is_llm_repo(d),
+                )
+                for d in data_dicts
+            ),
+        )
+        mark_loaded(conn, path, sha)
+    return len(data_dicts)
+
+
+def load_collection(conn: sqlite3.Connection, path: str, collection: str) -> int:
+    """Load a library_model_search collection as files and their labels"""
+    sha = needs_loading(conn, path)
+    if sha is None:
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        repo_dicts = json.load(f)
+    rows = [
+        (repo_dict["full_name"], file_path, label)
+        for repo_dict in repo_dicts
+        for label, paths in repo_dict.get("labels", {}).items()
+        for file_path in paths
+    ]
+    with conn:
+        conn.execute("DELETE FROM labels WHERE collection = ?", (collection,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO files (full_name, path) VALUES (?, ?)",
+            ((full_name, file_path) for full_name, file_path, _ in rows),
+        )
+        conn.executemany(
+            """INSERT OR IGNORE INTO labels (collection, file_id, label)
+            SELECT ?, file_id, ? FROM files WHERE full_name = ? AND path = ?""",
+            (
+                (collection, label, full_name, file_path)
+                for full_name, file_path, label in rows
+            ),
+        )
+        # files no longer labelled by any collection, dropped from the reloaded one
+        conn.execute(
+            "DELETE FROM files WHERE file_id NOT IN (SELECT file_id FROM labels)"
+        )
+        mark_loaded(conn, path, sha)
+    return len(repo_dicts)
+
+
+def load_tags(conn: sqlite3.Connection, path: str, language: str) -> int:
+    """Load the tags of a combined collection"""
+    sha = needs_loading(conn, path)
+    if sha is None:
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        combined_repos = json.load(f)
+    with conn:
+        conn.execute("DELETE FROM tags WHERE language = ?", (language,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO tags (language, full_name, tag) VALUES (?, ?, ?)",
+            (
+                (language, combined_repo["fullname"], tag)
+                for combined_repo in combined_repos
+                for tag in combined_repo["tags"]
+            ),
+        )
+        mark_loaded(conn, path, sha)
+    return len(combined_repos)
+
+
+def load_samples(conn: sqlite3.Connection, path: str, language: str) -> int:
+    """Load an attribute_mining sample, keeping the order of the sampled repos"""
+    sha = needs_loading(conn, path)
+    if sha is None:
+        return 0
+    data_dicts = load_records(path)
+    with conn:
+        conn.execute("DELETE FROM samples WHERE language = ?", (language,))
+        conn.executemany(
+            f"""INSERT INTO samples
+            (language, position, full_name, created_at, created_month, {", ".join(METRIC_COLUMNS)})
+            VALUES ({", ".join("?" * (len(METRIC_COLUMNS) + 5))})""",
+            (
+                (
+                    language,
+                    i,
+                    d.full_name,
+                    d.created_at,
+                    (d.created_at or "")[:7] or None,
+                    *(getattr(d, m) for m in METRIC_COLUMNS),
+                )
+                for i, d in enumerate(data_dicts)
+            ),
+        )
+        mark_loaded(conn, path, sha)
+    return len(data_dicts)
+
+
+def load_all(conn: sqlite3.Connection, data_dir: str = "Data") -> dict[str, int]:
+    """Load every collector output found in data_dir, skipping the files already loaded"""
+    loaded = {}
+    for path in sorted(glob.glob(os.path.join(data_dir, "*_repo_metadata.json"))):
+        language = os.path.basename(path)[: -len("_repo_metadata.json")]
+        loaded[path] = load_metadata(conn, path, language)
+    for path in sorted(glob.glob(os.path.join(data_dir, "collected_repos_*.json"))):
+        name = os.path.basename(path)[len("collected_repos_") : -len(".json")]
+        if (
+            name.removesuffix("_verified")
+            .removesuffix("_bulk")
+            .endswith(("_library", "_model"))
+        ):
+            loaded[path] = load_collection(conn, path, name)
+        else:
+            loaded[path] = load_tags(conn, path, name)
+    for path in sorted(glob.glob(os.path.join(data_dir, "sampled_repo_*.json"))):
+        language = os.path.basename(path)[len("sampled_repo_") : -len(".json")]
+        loaded[path] = load_samples(conn, path, language)
+    return loaded
+
+
+def monthly_llm_counts(
+    conn: sqlite3.Connection, languages: list[str]
+) -> dict[str, np.ndarray]:
+    """Count projects and LLM projects by (language, month), grouped by SQLite.
+
+    Returns a tidy table of equal length columns: language, month, projects, llm_projects,
+    sorted by language then month and holding only the groups that have projects.
+    """
+    names = {language.lower(): language for language in languages}
+    rows = []
+    if names:
+        rows = conn.execute(
+            f"""SELECT language, created_month, COUNT(*), SUM(is_llm) FROM repos
+        WHERE created_month IS NOT NULL AND language IN ({", ".join("?" * len(names))})
+        GROUP BY language, created_month""",
+            list(names),
+        ).fetchall()
+    # sort on the names given by the caller
+    rows.sort(key=lambda row: (names[row[0]], row[1]))
+    return {
+        "language": np.array([names[row[0]] for row in rows], dtype=str),
+        "month": np.array([row[1] for row in rows], dtype="datetime64[M]"),
+        "projects": np.array([row[2] for row in rows], dtype=int),
+        "llm_projects": np.array([row[3] for row in rows], dtype=int),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="warehouse",
+        description="Load the collected JSON data into a local SQLite warehouse",
+    )
+    parser.add_argument("-d", "--data-dir", default="Data")
+    parser.add_argument("-w", "--warehouse", default=WAREHOUSE_PATH)
+    parser.add_argument("-q", "--query", help="run an SQL query and print the rows")
+    args = parser.parse_args()
+    conn = connect(args.warehouse)
+    start = time.perf_counter()
+    for path, n in load_all(conn, args.data_dir).items():
+        print(f"{path}: {f'{n} rows loaded' if n else 'unchanged'}")
+    print(f"loaded in {time.perf_counter() - start:.2f}s")
+    if args.query:
+        for row in conn.execute(args.query):
+            print(row)
+    conn.close()